@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+import db_writer
+import llm_client
+from db import get_or_create_model
+from engine import TarsEngine, load_tools
+from llm_client import make_async_client
+from config import get_config
+
+## Headless batch mode: python tars.py --batch prompts.jsonl --concurrency 8 --out results.jsonl
+## Every line of the input is answered in a conversation of its own (a TarsEngine with its own session), with the
+## same tool rounds and limits as a chat. Up to concurrency prompts run at once over one shared client and worker
+## pool. Results are written as each prompt finishes, in the order they finish, "index" is the input line.
+##
+## Input lines: {"prompt": "...", "id": ...} (other fields are ignored) or a plain JSON string.
+## Output lines: {"index", "id", "prompt", "ok", "reply", "error", "tools", "latency_ms", "session_id"}
+
+console = Console()
+
+
+def read_prompts(path: str):
+    """
+    Yields (index, id, prompt, error) for every non empty line, index counts from 1. Read lazily, so a large
+    file is never held in memory.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                yield index, None, None, f"Invalid JSON: {e}"
+                continue
+            if isinstance(item, str):
+                item = {"prompt": item}
+            prompt = item.get("prompt") if isinstance(item, dict) else None
+            if not isinstance(prompt, str) or not prompt.strip():
+                yield index, None, None, "No prompt on this line"
+                continue
+            yield index, item.get("id", index), prompt, None
+
+
+def _tools_called(messages) -> list:
+    return [message["name"] for message in messages if isinstance(message, dict) and message.get("role") == "tool"]
+
+
+def _percentiles(values) -> dict:
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        "p50_ms": round(statistics.median(values), 1),
+        "p95_ms": round(values[max(int(len(values) * 0.95) - 1, 0)], 1),
+        "p99_ms": round(values[max(int(len(values) * 0.99) - 1, 0)], 1),
+        "max_ms": round(values[-1], 1),
+    }
+
+
+async def run_batch(path: str, out: str, concurrency: int = 4) -> dict:
+    """
+    Answers every prompt of a JSONL file, concurrency of them at a time.
+    Args:
+        path (str): Input JSONL.
+        out (str): Results JSONL, overwritten.
+        concurrency (int, optional): Prompts answered at the same time.
+    Returns:
+        dict: Report with items, ok, failed, elapsed_s, items_per_s and latency percentiles.
+    """
+    config = get_config()
+    model = os.getenv("model")
+    executor = ThreadPoolExecutor(max_workers=concurrency * config.general.max_parallel_tools, thread_name_prefix="tars-batch")
+    loop = asyncio.get_running_loop()
+    model_id = await loop.run_in_executor(executor, get_or_create_model, "groq", model)
+    # A connection per running prompt, hedged requests get some spare ones.
+    client = make_async_client(max_connections=2 * concurrency)
+    tools = load_tools()
+    prompts = read_prompts(path)
+    latencies = []
+    counts = {"ok": 0, "failed": 0}
+
+    with open(out, "w", encoding="utf-8") as results, console.status("[green dim]Running the batch[/green dim]", spinner="dots") as status:
+        def write(result):
+            results.write(json.dumps(result, ensure_ascii=False) + "\n")
+            results.flush()
+            counts["ok" if result["ok"] else "failed"] += 1
+            status.update(f"[green dim]Running the batch: {counts['ok']} done, {counts['failed']} failed[/green dim]")
+
+        async def answer(index, item_id, prompt):
+            engine = TarsEngine(client=client, model=model, model_id=model_id, tools=tools, executor=executor)
+            result = {"index": index, "id": item_id, "prompt": prompt, "ok": True, "reply": None, "error": None}
+            start = time.perf_counter()
+            try:
+                await engine.start_session(title=f"batch {os.path.basename(path)} #{index}")
+                result["reply"] = await engine.turn(prompt)
+            except Exception as e:
+                result.update(ok=False, error=f"{e.__class__.__name__}: {e}")
+            latency_ms = (time.perf_counter() - start) * 1000
+            result.update(tools=_tools_called(engine.messages), latency_ms=round(latency_ms, 1), session_id=engine.session_id)
+            await engine.end()
+            if result["ok"]:
+                latencies.append(latency_ms)
+            write(result)
+
+        async def worker():
+            # The workers share one iterator, the next line is read when a worker is free.
+            for index, item_id, prompt, error in prompts:
+                if error:
+                    write({"index": index, "id": None, "prompt": None, "ok": False, "reply": None, "error": error})
+                    continue
+                await answer(index, item_id, prompt)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    await loop.run_in_executor(executor, db_writer.flush)
+    executor.shutdown(wait=False)
+    items = counts["ok"] + counts["failed"]
+    return {
+        "items": items,
+        "ok": counts["ok"],
+        "failed": counts["failed"],
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "items_per_s": round(items / elapsed, 2) if elapsed else None,
+        "latency": _percentiles(latencies),
+        "llm": dict(llm_client.stats),
+    }
+
+
+def print_report(report: dict, out: str):
+    console.print(
+        f"[green]{report['items']} prompts in {report['elapsed_s']:.1f} s at concurrency {report['concurrency']}, "
+        f"{report['items_per_s']} prompts/s. {report['ok']} answered, {report['failed']} failed.[/green]"
+    )
+    if report["latency"]:
+        latency = report["latency"]
+        console.print(f"[grey50]Latency per prompt: p50 {latency['p50_ms']:.0f} ms, p95 {latency['p95_ms']:.0f} ms, "
+                      f"p99 {latency['p99_ms']:.0f} ms, max {latency['max_ms']:.0f} ms[/grey50]")
+    llm = report["llm"]
+    console.print(f"[grey50]Model requests: {llm['requests']}, retries {llm['retries']}, fallbacks {llm['fallbacks']}, failures {llm['failures']}[/grey50]")
+    console.print(f"[grey50]Results: {out}[/grey50]")
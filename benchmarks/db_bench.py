@@ -0,0 +1,163 @@
+"""
+Synthetic-load benchmark for the db.py persistence layer.
+
+Generates realistic sessions (user, assistant and tool turns with their tool_calls rows) through the real
+save_* functions, then measures insert throughput, read latency of the history functions, the cost of
+update_session_messag_Count and the size of the database. Results are written as JSON so runs can be compared.
+
+Usage:
+    python benchmarks/db_bench.py                       # 10k rows
+    python benchmarks/db_bench.py --rows 10k 1m 10m     # one fresh database per size
+    python benchmarks/db_bench.py --rows 1m --keep-db bench.db --out db_bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+TOOLS = ["get_weather", "web_search", "wiki_summary", "news_search", "get_datetime", "read_file_content"]
+WORDS = (
+    "the weather in tokyo is mild today rocket launch schedule python programming language black hole "
+    "interstellar gargantua news headlines market stocks summary file downloads folder meeting notes"
+).split()
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def tool_response(rng):
+    """Mostly small JSON results, now and then a large one like wiki_content or a PDF read."""
+    if rng.random() < 0.1:
+        return json.dumps({"title": sentence(rng, 3), "content": sentence(rng, 1500)})
+    return json.dumps([{"title": sentence(rng, 6), "body": sentence(rng, 30)} for _ in range(3)])
+
+
+def batch_item(save, *args, **kwargs):
+    """One save_* call inside db.batch(), in its own savepoint like db_writer, a failing save rolls back to it."""
+    with db.batch_item():
+        return save(*args, **kwargs)
+
+
+def generate(rows, seed, turns_per_session=20):
+    """
+    Fill the current db.db_file with about `rows` conversation rows.
+    Every turn is a user message, a tool call with its response in 40% of turns, and an assistant message.
+    Returns:
+        dict: rows written, elapsed seconds and rows per second.
+    """
+    rng = random.Random(seed)
+    model_id = db.get_or_create_model("groq", "benchmark-model")
+    written = 0
+    start = time.perf_counter()
+    while written < rows:
+        session_id = db.create_new_session(model_id)
+        with db.batch():
+            for _ in range(turns_per_session):
+                cid = batch_item(db.save_user_message, sentence(rng, 12), session_id, model_id=model_id)
+                written += 1
+                if rng.random() < 0.4:
+                    tool = rng.choice(TOOLS)
+                    tid = batch_item(db.save_tool_call, tool, json.dumps({"topic": sentence(rng, 3)}), session_id, cid)
+                    batch_item(db.save_tool_response, tid, tool_response(rng), session_id, model_id)
+                    written += 1
+                batch_item(db.save_assistant_message, sentence(rng, 40), session_id, model_id=model_id)
+                written += 1
+                if written >= rows:
+                    break
+        db.end_session(session_id)
+    elapsed = time.perf_counter() - start
+    return {"rows": written, "seconds": round(elapsed, 3), "rows_per_second": round(written / elapsed, 1)}
+
+
+def measure(func, repeat):
+    """Latency of func() in milliseconds over `repeat` calls."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "calls": repeat,
+        "mean_ms": round(statistics.mean(timings), 4),
+        "p50_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(timings[max(int(repeat * 0.95) - 1, 0)], 4),
+        "max_ms": round(timings[-1], 4),
+    }
+
+
+def file_size():
+    """Size of the database after checkpointing the WAL into it."""
+    db.get_connection().execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    return os.path.getsize(db.db_file)
+
+
+def run_size(label, rows, repeat, seed):
+    print(f"[{label}] generating {rows} rows ...", flush=True)
+    result = {"size": label, "insert": generate(rows, seed)}
+    conn = db.get_connection()
+    last_session = conn.execute("SELECT MAX(id) FROM sessions").fetchone()[0]
+    rng = random.Random(seed)
+    sessions = [rng.randint(1, last_session) for _ in range(repeat)]
+    picks = iter(sessions * 2)
+
+    result["get_last_messages"] = measure(lambda: db.get_last_messages(20), repeat)
+    result["get_session_messages"] = measure(lambda: db.get_session_messages(next(picks), limit=20), repeat)
+    result["get_all_session"] = measure(lambda: db.get_all_session(20), repeat)
+    result["update_session_messag_Count"] = measure(lambda: db.update_session_messag_Count(next(picks)), repeat)
+    # Hot path cost of one more message at this size, it should not grow with the table.
+    result["save_user_message"] = measure(lambda: db.save_user_message("one more message", last_session), repeat)
+    result["db_file_bytes"] = file_size()
+    result["blob_store"] = db.blob_report()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic-load benchmark of db.py.")
+    parser.add_argument("--rows", nargs="+", default=["10k"], help=f"Sizes to run: {', '.join(SIZES)} or a number of rows.")
+    parser.add_argument("--repeat", type=int, default=200, help="Calls per latency measurement.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="db_bench.json", help="Where to write the JSON report.")
+    parser.add_argument("--keep-db", default=None, help="Keep the generated database of the last size at this path.")
+    args = parser.parse_args()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "blob_codec": db.BLOB_CODEC,
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for label in args.rows:
+            rows = SIZES.get(label.lower()) or int(label)
+            db.close_connections()
+            db.db_file = args.keep_db if args.keep_db else os.path.join(tmp, f"bench_{label}.db")
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db.db_file + suffix):
+                    os.remove(db.db_file + suffix)
+            db.create_tables()
+            result = run_size(label, rows, args.repeat, args.seed)
+            report["results"].append(result)
+            print(json.dumps(result, indent=2))
+        db.close_connections()
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
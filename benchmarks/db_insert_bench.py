@@ -0,0 +1,97 @@
+"""
+Micro-benchmark for per-insert latency of db.py.
+
+Compares the old behaviour (a new sqlite3 connection per call, default rollback journal)
+with the pooled WAL connection that db.get_connection() returns now.
+
+Usage:
+    python benchmarks/db_insert_bench.py --inserts 2000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+
+
+def old_get_connection():
+    """Connection factory exactly as db.get_connection() worked before pooling."""
+    conn = sqlite3.connect(db.db_file, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_key = ON;")
+    return conn
+
+
+def old_save_user_message(text, session_id, model_id=None):
+    """save_user_message + update_session_messag_Count the way they ran before: two connections per insert."""
+    conn = old_get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO conversations(session_id, role, content, model_id) VALUES (?, 'user', ?, ?)",
+        (session_id, text, model_id)
+    )
+    conn.commit()
+    cid = cursor.lastrowid
+    conn.close()
+
+    conn = old_get_connection()
+    row = conn.execute(
+        "SELECT COUNT(*) AS count FROM conversations WHERE session_id = ? AND role IN ('user', 'assistant')",
+        (session_id,)
+    ).fetchone()
+    conn.execute("UPDATE sessions SET message_count = ? WHERE id = ?", (row["count"], session_id))
+    conn.commit()
+    conn.close()
+    return cid
+
+
+def run(save, session_id, inserts):
+    timings = []
+    for i in range(inserts):
+        start = time.perf_counter()
+        save(f"benchmark message {i}", session_id, model_id=None)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<28} mean {statistics.mean(timings):7.3f} ms   p50 {statistics.median(timings):7.3f} ms   p95 {p95:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-insert latency of db.py before and after connection pooling.")
+    parser.add_argument("--inserts", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Separate files: journal_mode=WAL is persistent, it would leak into the "before" run.
+        db.db_file = os.path.join(tmp, "before.db")
+        db.create_tables()
+        db.close_connections()
+        conn = old_get_connection()
+        conn.execute("PRAGMA journal_mode = DELETE;")
+        session_id = conn.execute("INSERT INTO sessions (is_active) VALUES (1)").lastrowid
+        conn.commit()
+        conn.close()
+        before = run(old_save_user_message, session_id, args.inserts)
+
+        db.db_file = os.path.join(tmp, "after.db")
+        db.create_tables()
+        after = run(db.save_user_message, db.create_new_session(None), args.inserts)
+        db.close_connections()
+
+    print(f"{args.inserts} inserts per run")
+    report("before (connect per call)", before)
+    report("after (pooled, WAL)", after)
+    print(f"speedup: {statistics.mean(before) / statistics.mean(after):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Local stand-in for the Groq (OpenAI compatible) chat completions API, for offline tests and benchmarks.
+
+Replies come from a script of rules. The first rule whose "when" and "match" fit the request answers it:
+
+    [
+      {"when": "user", "match": "weather", "tool_calls": [{"name": "get_weather", "arguments": {"place": "Tokyo"}}]},
+      {"when": "tool", "content": "It is sunny."},
+      {"match": "slow", "content": "Finally.", "latency_ms": 2000},
+      {"match": "flaky", "status": 429, "retry_after": 1, "times": 2},
+      {"content": "Hello!"}
+    ]
+
+- when: "user" if the last message is a user message, "tool" if it is a tool result. Leave it out to match both.
+- match: regular expression searched in the last user message (case insensitive).
+- content / tool_calls: the reply. tool_calls arguments may be a dict or a JSON string.
+- status, retry_after, times: answer with an error status instead, the first `times` matching requests only.
+- latency_ms: time before the first byte. chunk_ms: delay between stream chunks.
+Without a matching rule the server echoes the last user message, or says "Done." after tool results.
+stream=true requests get server-sent events in the same chunk format Groq uses.
+
+Point Tars at it with groq_base_url in .env (or the environment):
+    python benchmarks/fake_groq.py --port 8765 --script rules.json
+    groq_base_url=http://127.0.0.1:8765 python tars.py
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+## Defaults for rules without their own values.
+LATENCY_MS = 100
+CHUNK_MS = 5
+CHUNK_CHARS = 12
+
+_ids = itertools.count(1)
+
+
+def _last_user(messages):
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content") or ""
+    return ""
+
+
+class Script:
+    """
+    Rules of a fake server, thread safe. Keeps count of the requests it answered.
+    """
+    def __init__(self, rules=None, latency_ms=LATENCY_MS, chunk_ms=CHUNK_MS):
+        self.rules = [dict(rule) for rule in rules or []]
+        self.latency_ms = latency_ms
+        self.chunk_ms = chunk_ms
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def reply(self, body):
+        """
+        Returns:
+            dict: The rule that answers this request, with defaults filled in.
+        """
+        messages = body.get("messages", [])
+        last_role = messages[-1].get("role") if messages else "user"
+        when = "tool" if last_role == "tool" else "user"
+        question = _last_user(messages)
+        with self.lock:
+            self.requests.append({"model": body.get("model"), "when": when, "tool_choice": body.get("tool_choice")})
+            for rule in self.rules:
+                if rule.get("when", when) != when:
+                    continue
+                if "match" in rule and not re.search(rule["match"], question, re.IGNORECASE):
+                    continue
+                if "status" in rule:
+                    if rule.get("times", 1) <= 0:
+                        continue
+                    rule["times"] = rule.get("times", 1) - 1
+                # tool_choice="none" forbids tool calls, a final answer is given instead.
+                if rule.get("tool_calls") and body.get("tool_choice") == "none":
+                    continue
+                return {"latency_ms": self.latency_ms, "chunk_ms": self.chunk_ms, **rule}
+        content = "Done." if when == "tool" else f"You said: {question}"
+        return {"latency_ms": self.latency_ms, "chunk_ms": self.chunk_ms, "content": content}
+
+
+def _message(rule):
+    message = {"role": "assistant", "content": rule.get("content")}
+    if rule.get("tool_calls"):
+        message["tool_calls"] = [
+            {
+                "id": f"call_{next(_ids)}",
+                "type": "function",
+                "function": {
+                    "name": call["name"],
+                    "arguments": call["arguments"] if isinstance(call.get("arguments"), str) else json.dumps(call.get("arguments", {})),
+                },
+            }
+            for call in rule["tool_calls"]
+        ]
+        message["content"] = None
+    return message
+
+
+def _chunks(message):
+    """
+    The deltas a streamed response of message is made of, split like Groq splits them.
+    """
+    yield {"role": "assistant", "content": ""}
+    content = message.get("content") or ""
+    for start in range(0, len(content), CHUNK_CHARS):
+        yield {"content": content[start:start + CHUNK_CHARS]}
+    for index, call in enumerate(message.get("tool_calls") or []):
+        yield {"tool_calls": [{"index": index, "id": call["id"], "type": "function", "function": {"name": call["function"]["name"], "arguments": ""}}]}
+        arguments = call["function"]["arguments"]
+        for start in range(0, len(arguments), CHUNK_CHARS):
+            yield {"tool_calls": [{"index": index, "function": {"arguments": arguments[start:start + CHUNK_CHARS]}}]}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    script = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        rule = self.script.reply(body)
+        time.sleep(rule["latency_ms"] / 1000)
+
+        if "status" in rule:
+            headers = {"retry-after": str(rule["retry_after"])} if "retry_after" in rule else {}
+            self._send_json(rule["status"], {"error": {"message": "Scripted error", "type": "fake_error"}}, headers)
+            return
+
+        message = _message(rule)
+        finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+        base = {"id": f"chatcmpl-{next(_ids)}", "created": int(time.time()), "model": body.get("model")}
+        if not body.get("stream"):
+            self._send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("cache-control", "no-cache")
+        self.send_header("connection", "close")
+        self.end_headers()
+        for delta in _chunks(message):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(rule["chunk_ms"] / 1000)
+        last = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+        self.wfile.write(f"data: {json.dumps(last)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once, the default backlog of 5 would refuse them.
+    request_queue_size = 1024
+
+
+def start_server(script: Script, host="127.0.0.1", port=0):
+    """
+    Serves script in a background thread.
+    Returns:
+        tuple: (server, base_url). Stop it with server.shutdown().
+    """
+    handler = type("ScriptedHandler", (_Handler,), {"script": script})
+    server = _Server((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="fake-groq", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Groq / OpenAI compatible chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--script", default=None, help="JSON file with the list of rules.")
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--chunk-ms", type=float, default=CHUNK_MS)
+    args = parser.parse_args()
+
+    rules = []
+    if args.script:
+        with open(args.script, "r") as f:
+            rules = json.load(f)
+    server, url = start_server(Script(rules, args.latency_ms, args.chunk_ms), args.host, args.port)
+    print(f"Fake Groq server on {url} ({len(rules)} rules), set groq_base_url={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Startup import time benchmark and guard.
+
+Imports main.py (what a text-only session loads before the mode prompt) in fresh interpreters with
+python -X importtime, against a temporary database and a fake API key, and parses the timings Python prints.
+Fails (exit code 1) when the median import time is over --max-ms or when one of the tool dependencies that
+supporter.py loads lazily (yt_dlp, wikipedia, ddgs, docx, pypdf, speedtest, pytz) was imported at startup.
+
+Usage:
+    python benchmarks/import_bench.py
+    python benchmarks/import_bench.py --runs 7 --max-ms 800 --top 15 --out import_bench.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+## Tool dependencies that must only be imported when one of their tools is called.
+LAZY_MODULES = ["yt_dlp", "wikipedia", "ddgs", "docx", "pypdf", "speedtest", "pytz"]
+
+STARTUP = "import db; db.db_file = {db_file!r}; import {target}"
+
+
+def parse_importtime(stderr: str):
+    """
+    The entries of -X importtime output.
+    Returns:
+        list: (module, depth, self_us, cumulative_us) in the order Python printed them, children before parents.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def run_once(target, db_file):
+    env = {**os.environ, "groq_api": "fake", "model": "fake-model", "PYTHONDONTWRITEBYTECODE": "1"}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP.format(db_file=db_file, target=target)],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"import {target} failed:\n{result.stderr[-2000:]}")
+    entries = parse_importtime(result.stderr)
+    return {
+        "wall_ms": wall_ms,
+        "import_ms": sum(cumulative for _, depth, _, cumulative in entries if depth == 0) / 1000,
+        "modules": {name: cumulative / 1000 for name, depth, _, cumulative in entries},
+        "top_level": {name: cumulative / 1000 for name, depth, _, cumulative in entries if depth <= 1},
+    }
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Import time of Tars startup, with a budget guard.")
+    parser.add_argument("--target", default="main", help="Module to import, main is what tars.py loads for text mode.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=1000, help="Budget for the median import time, 0 to skip.")
+    parser.add_argument("--top", type=int, default=10, help="How many of the slowest imports to list.")
+    parser.add_argument("--out", default=None, help="Write the report as JSON.")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="tars-import-")
+    db_file = os.path.join(tmp, "bench.db")
+    # The first run creates the database and the bytecode caches, it is not measured.
+    run_once(args.target, db_file)
+    runs = [run_once(args.target, db_file) for _ in range(args.runs)]
+
+    import_ms = [run["import_ms"] for run in runs]
+    wall_ms = [run["wall_ms"] for run in runs]
+    slowest = {}
+    for run in runs:
+        for name, ms in run["top_level"].items():
+            slowest.setdefault(name, []).append(ms)
+    slowest = sorted(((statistics.median(values), name) for name, values in slowest.items()), reverse=True)[:args.top]
+    eager = [name for name in LAZY_MODULES if any(name in run["modules"] for run in runs)]
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target": args.target,
+        "runs": args.runs,
+        "import_ms": {"median": round(statistics.median(import_ms), 1), "min": round(min(import_ms), 1), "max": round(max(import_ms), 1)},
+        "wall_ms": {"median": round(statistics.median(wall_ms), 1), "min": round(min(wall_ms), 1), "max": round(max(wall_ms), 1)},
+        "slowest": [{"module": name, "cumulative_ms": round(ms, 1)} for ms, name in slowest],
+        "eager_tool_modules": eager,
+        "max_ms": args.max_ms,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"import {args.target}: median {report['import_ms']['median']:.1f} ms "
+          f"(min {report['import_ms']['min']:.1f}, max {report['import_ms']['max']:.1f}), "
+          f"process wall time median {report['wall_ms']['median']:.1f} ms over {args.runs} runs")
+    print(f"{'module':<40}{'cumulative ms':>15}")
+    for ms, name in slowest:
+        print(f"{name:<40}{ms:>15.1f}")
+
+    failed = False
+    if eager:
+        print(f"FAIL: imported at startup but should load on first use: {', '.join(eager)}")
+        failed = True
+    if args.max_ms and report["import_ms"]["median"] > args.max_ms:
+        print(f"FAIL: median import time {report['import_ms']['median']:.1f} ms is over the budget of {args.max_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,133 @@
+"""
+Tool routing benchmark over a recorded prompt corpus.
+
+For every prompt of the corpus (JSON lines with "prompt", the "tools" a good answer needs and optionally
+"unwanted" tools that must not be offered for it) the request
+main.py would send is built twice, with all of tools.json and with the tools tool_router.route_tools picks,
+and its prompt tokens are counted with context_window.count_tokens. Reports the token reduction, the routing
+latency, the recall: how often every tool the prompt needs was offered, and the precision: how many of the
+tools offered beyond the core set the prompt needs. A miss is not fatal in Tars (the tool is added when the
+model asks for it) but costs a second request, an extra tool costs prompt tokens on every request.
+Exits with 1 when a prompt was offered one of its unwanted tools.
+
+Usage:
+    python benchmarks/router_bench.py
+    python benchmarks/router_bench.py --corpus benchmarks/router_prompts.jsonl --repeat 200 --out router_bench.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from context_window import count_tokens, message_tokens
+from tool_router import route_tools, tool_name, ToolIndex, CORE_TOOLS, LEXICAL_TOOLS
+from supporter import SYSTEM_PROMPT
+
+
+def request_tokens(messages, tools):
+    return sum(message_tokens(message) for message in messages) + (count_tokens(json.dumps(tools)) if tools else 0)
+
+
+def summary(values):
+    values = sorted(values)
+    return {
+        "mean": round(statistics.mean(values), 3),
+        "p50": round(statistics.median(values), 3),
+        "p95": round(values[max(int(len(values) * 0.95) - 1, 0)], 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Prompt tokens and latency of tool routing.")
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "benchmarks", "router_prompts.jsonl"))
+    parser.add_argument("--tools", default=os.path.join(ROOT, "tools.json"))
+    parser.add_argument("--repeat", type=int, default=100, help="Routing calls per prompt for the latency.")
+    parser.add_argument("--lexical", type=int, default=LEXICAL_TOOLS)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    with open(args.tools, "r") as f:
+        tools = json.load(f)
+    with open(args.corpus, "r") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    start = time.perf_counter()
+    ToolIndex(tools)
+    index_ms = (time.perf_counter() - start) * 1000
+
+    rows = []
+    for item in corpus:
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": item["prompt"]}]
+        routed = route_tools(messages, tools, item["prompt"], CORE_TOOLS, 2, args.lexical)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            route_tools(messages, tools, item["prompt"], CORE_TOOLS, 2, args.lexical)
+        route_us = (time.perf_counter() - start) / args.repeat * 1e6
+        offered = {tool_name(tool) for tool in routed}
+        missing = [name for name in item.get("tools", []) if name not in offered]
+        extra = sorted(offered - set(CORE_TOOLS) - set(item.get("tools", [])))
+        unwanted = [name for name in item.get("unwanted", []) if name in offered]
+        full = request_tokens(messages, tools)
+        reduced = request_tokens(messages, routed)
+        rows.append({
+            "prompt": item["prompt"],
+            "tools_offered": len(routed),
+            "full_tokens": full,
+            "routed_tokens": reduced,
+            "reduction_pct": 100 * (full - reduced) / full,
+            "route_us": route_us,
+            "missing": missing,
+            "extra": extra,
+            "unwanted": unwanted,
+        })
+
+    full_total = sum(row["full_tokens"] for row in rows)
+    routed_total = sum(row["routed_tokens"] for row in rows)
+    misses = [row for row in rows if row["missing"]]
+    # Precision over the routed tools only, the core tools are offered with every request by design.
+    needed = sum(len({name for name in item.get("tools", []) if name not in CORE_TOOLS} - set(row["missing"])) for row, item in zip(rows, corpus))
+    extra_total = sum(len(row["extra"]) for row in rows)
+    wrong = [row for row in rows if row["unwanted"]]
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "prompts": len(rows),
+        "tools": len(tools),
+        "index_build_ms": round(index_ms, 3),
+        "prompt_tokens_full": full_total,
+        "prompt_tokens_routed": routed_total,
+        "reduction_pct": round(100 * (full_total - routed_total) / full_total, 1),
+        "tools_offered": summary([row["tools_offered"] for row in rows]),
+        "route_us": summary([row["route_us"] for row in rows]),
+        "recall_pct": round(100 * (len(rows) - len(misses)) / len(rows), 1),
+        "misses": [{"prompt": row["prompt"], "missing": row["missing"]} for row in misses],
+        "precision_pct": round(100 * needed / (needed + extra_total), 1) if needed + extra_total else 100.0,
+        "extra_tools": summary([len(row["extra"]) for row in rows]),
+        "unwanted": [{"prompt": row["prompt"], "unwanted": row["unwanted"]} for row in wrong],
+        "rows": rows,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{len(rows)} prompts, {len(tools)} tools, index built in {index_ms:.2f} ms")
+    print(f"prompt tokens: {full_total} with all tools, {routed_total} routed ({report['reduction_pct']}% less)")
+    print(f"tools offered: mean {report['tools_offered']['mean']:.1f}, max {report['tools_offered']['max']:.0f}")
+    print(f"routing: p50 {report['route_us']['p50']:.1f} us, p95 {report['route_us']['p95']:.1f} us per request")
+    print(f"recall: {report['recall_pct']}% of prompts were offered every tool they need")
+    for row in misses:
+        print(f"  missed {', '.join(row['missing'])}: {row['prompt']}")
+    print(f"precision: {report['precision_pct']}% of the tools offered beyond the core set were needed, "
+          f"{extra_total} extra tools in all, max {report['extra_tools']['max']:.0f} for one prompt")
+    for row in wrong:
+        print(f"  offered unwanted {', '.join(row['unwanted'])}: {row['prompt']}")
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_bench()
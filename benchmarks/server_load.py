@@ -0,0 +1,223 @@
+"""
+Load test of server.py against the local fake LLM, fully offline.
+
+Starts benchmarks/fake_groq.py in process and server.py as a subprocess (temporary database, fake API key),
+then drives many simulated clients at once. Every client opens a WebSocket connection (or an HTTP session with
+--http) as one of --users users and sends --turns messages one after the other. Some messages ask for the time,
+which makes the fake model call the get_datetime tool, so the shared tool pool is used too.
+Reports turn latency, time to the first streamed delta, throughput and how many turns the server refused
+(per user limit 429, busy 503). The server's own spans (tracing) show how much of the latency was spent
+waiting for a turn slot: client latency minus the server's turn time.
+
+Usage:
+    python benchmarks/server_load.py --clients 300 --turns 3
+    python benchmarks/server_load.py --clients 500 --users 100 --max-turns 32 --latency-ms 300 --http --out server_load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_groq import Script, start_server
+
+RULES = [
+    {"when": "user", "match": "time", "tool_calls": [{"name": "get_datetime", "arguments": {}}]},
+    {"when": "tool", "content": "It is a quarter past three in the afternoon, a good time for a short break."},
+    {"when": "user", "content": "Sure. Here is a short answer, streamed in a few chunks so the client sees deltas arrive."},
+]
+PROMPTS = ["hello there", "what time is it?", "tell me something nice", "and what time is it now?"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(http, url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with http.get(f"{url}/health") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server.py did not start")
+
+
+async def ws_client(http, url, user, turns, results):
+    async with http.ws_connect(f"{url}/ws", params={"user": user}) as ws:
+        first = await ws.receive_json()
+        if first.get("type") != "session":
+            results.append({"outcome": first.get("status", "error")})
+            return
+        for index in range(turns):
+            start = time.perf_counter()
+            first_delta = None
+            await ws.send_json({"content": PROMPTS[index % len(PROMPTS)]})
+            while True:
+                event = await ws.receive_json()
+                if event["type"] == "delta" and first_delta is None:
+                    first_delta = time.perf_counter() - start
+                elif event["type"] == "reply":
+                    results.append({"outcome": "ok", "latency": time.perf_counter() - start, "first_delta": first_delta})
+                    break
+                elif event["type"] == "error":
+                    results.append({"outcome": event.get("status", "error")})
+                    break
+
+
+async def http_client(http, url, user, turns, results):
+    async with http.post(f"{url}/sessions", json={"user": user}) as response:
+        if response.status != 200:
+            results.append({"outcome": response.status})
+            return
+        token = (await response.json())["token"]
+    for index in range(turns):
+        start = time.perf_counter()
+        async with http.post(f"{url}/sessions/{token}/messages", json={"content": PROMPTS[index % len(PROMPTS)]}) as response:
+            if response.status == 200:
+                await response.json()
+                results.append({"outcome": "ok", "latency": time.perf_counter() - start, "first_delta": None})
+            else:
+                results.append({"outcome": response.status})
+    async with http.delete(f"{url}/sessions/{token}"):
+        pass
+
+
+async def client(http, url, user, turns, results, use_http):
+    try:
+        if use_http:
+            await http_client(http, url, user, turns, results)
+        else:
+            await ws_client(http, url, user, turns, results)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+        results.append({"outcome": e.__class__.__name__})
+
+
+def summary(values):
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        "p50_ms": round(statistics.median(values) * 1000, 1),
+        "p95_ms": round(values[max(int(len(values) * 0.95) - 1, 0)] * 1000, 1),
+        "p99_ms": round(values[max(int(len(values) * 0.99) - 1, 0)] * 1000, 1),
+        "max_ms": round(values[-1] * 1000, 1),
+    }
+
+
+async def run(args, url):
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+        await wait_ready(http, url)
+        results = []
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            client(http, url, f"user{index % args.users}", args.turns, results, args.http)
+            for index in range(args.clients)
+        ])
+        elapsed = time.perf_counter() - start
+        async with http.get(f"{url}/health") as response:
+            health = await response.json()
+    return results, elapsed, health
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Many simulated clients against server.py and a fake LLM.")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3, help="Messages per client, sent one after the other.")
+    parser.add_argument("--users", type=int, default=100, help="Clients share these user names, client i is user i %% users.")
+    parser.add_argument("--http", action="store_true", help="HTTP sessions instead of WebSocket connections.")
+    parser.add_argument("--max-turns", type=int, default=None, help="server.py --max-turns.")
+    parser.add_argument("--per-user-turns", type=int, default=None, help="server.py --per-user-turns.")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Fake LLM time to first byte.")
+    parser.add_argument("--chunk-ms", type=float, default=5, help="Fake LLM delay between stream chunks.")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds a client waits for a reply.")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    script = Script(RULES, latency_ms=args.latency_ms, chunk_ms=args.chunk_ms)
+    fake, fake_url = start_server(script)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    tmp = tempfile.mkdtemp(prefix="tars-load-")
+    command = [sys.executable, os.path.join(ROOT, "server.py"), "--port", str(port), "--db", os.path.join(tmp, "load.db")]
+    if args.max_turns:
+        command += ["--max-turns", str(args.max_turns)]
+    if args.per_user_turns:
+        command += ["--per-user-turns", str(args.per_user_turns)]
+    env = {**os.environ, "groq_api": "fake", "model": "fake-model", "groq_base_url": fake_url}
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        results, elapsed, health = asyncio.run(run(args, url))
+    finally:
+        server.terminate()
+        try:
+            _, errors = server.communicate(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            _, errors = server.communicate()
+        fake.shutdown()
+
+    import db
+    db.db_file = os.path.join(tmp, "load.db")
+    server_stages = {row["stage"]: row for row in db.span_stats()}
+
+    ok = [result for result in results if result["outcome"] == "ok"]
+    outcomes = {}
+    for result in results:
+        outcomes[str(result["outcome"])] = outcomes.get(str(result["outcome"]), 0) + 1
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "transport": "http" if args.http else "websocket",
+        "clients": args.clients,
+        "users": args.users,
+        "turns_per_client": args.turns,
+        "fake_latency_ms": args.latency_ms,
+        "elapsed_s": round(elapsed, 2),
+        "turns_per_s": round(len(ok) / elapsed, 1),
+        "outcomes": outcomes,
+        "latency": summary([result["latency"] for result in ok]),
+        "first_delta": summary([result["first_delta"] for result in ok if result["first_delta"] is not None]),
+        "llm_requests": len(script.requests),
+        "server_stages": server_stages,
+        "server_health": health,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{args.clients} {report['transport']} clients ({args.users} users) x {args.turns} turns in {elapsed:.1f} s, "
+          f"{report['turns_per_s']} turns/s, {len(script.requests)} LLM requests")
+    print(f"outcomes: {', '.join(f'{key} {value}' for key, value in sorted(outcomes.items()))}")
+    for name in ["latency", "first_delta"]:
+        if report[name]:
+            row = report[name]
+            print(f"{name:<12} p50 {row['p50_ms']:.1f} ms  p95 {row['p95_ms']:.1f} ms  p99 {row['p99_ms']:.1f} ms  max {row['max_ms']:.1f} ms")
+    for stage in ["turn", "llm", "tool", "db"]:
+        if stage in server_stages:
+            row = server_stages[stage]
+            print(f"server {stage:<5} p50 {row['p50_ms']:.1f} ms  p95 {row['p95_ms']:.1f} ms  ({row['count']} spans)")
+    print(f"server: {health}")
+    if errors and errors.strip():
+        print("server stderr:")
+        print(errors.strip()[-2000:])
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,263 @@
+"""
+End-to-end turn latency benchmark, fully offline.
+
+Starts benchmarks/fake_groq.py in process, points main.py at it and at a temporary database, replaces the tools
+with stubs of a fixed duration and drives the real get_ai / tool_calling path through scripted turns:
+plain chat, one tool, two tools in parallel and a large document that has to be shaped.
+Every turn's wall time is split into stages measured on the turn's own thread:
+
+    llm       waiting for the fake server (request and stream)
+    tools     waiting for tool calls
+    db        submit() / flush() of conversation logging
+    settings  config.get_config()
+    context   fit_context() and shape_result()
+    render    Markdown / Panel building, Live updates and printing (to a buffer, not the terminal)
+    other     everything else
+
+Usage:
+    python benchmarks/turn_bench.py --turns 40
+    python benchmarks/turn_bench.py --turns 40 --no-stream --sync-db --latency-ms 300 --out turn_bench.json
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_groq import Script, start_server
+
+STAGES = ["llm", "tools", "db", "settings", "context", "render", "other"]
+
+PROMPTS = [
+    "hello there, how are you?",
+    "what's the weather in Tokyo?",
+    "give me the news and weather for India",
+    "tell me everything wiki has about black holes and how they evaporate",
+]
+
+REPLY = (
+    "Here is what I found:\n\n"
+    "- **Temperature:** 21 °C, light wind from the west\n"
+    "- **Headlines:** markets steady, a rocket launch is scheduled for Friday\n"
+    "- **Black holes** lose mass through *Hawking radiation*, very slowly for large ones.\n\n"
+    "Let me know if you want more details on any of these."
+)
+
+RULES = [
+    {"when": "user", "match": "news and weather", "tool_calls": [
+        {"name": "get_news", "arguments": {"category": "general", "country": "in"}},
+        {"name": "get_weather", "arguments": {"place": "India"}},
+    ]},
+    {"when": "user", "match": "weather", "tool_calls": [{"name": "get_weather", "arguments": {"place": "Tokyo"}}]},
+    {"when": "user", "match": "wiki", "tool_calls": [{"name": "wiki_content", "arguments": {"word": "Black hole"}}]},
+    {"when": "tool", "content": REPLY},
+    {"when": "user", "content": REPLY},
+]
+
+
+def stub_tools(tool_ms):
+    """
+    Tools with a fixed duration and realistic result sizes, wiki_content returns a ~60 KB document.
+    """
+    def pause():
+        time.sleep(tool_ms / 1000)
+
+    def get_weather(place=None):
+        pause()
+        return {"time": "2025-01-01T12:00", "temperature": 21.0, "windspeed": 9.4, "weathercode": 1, "place": place}
+
+    def get_news(category, country, save_file=False):
+        pause()
+        return {"category": category, "country": country.upper(), "top_stories": [
+            {"title": f"Headline {i}", "description": "Markets steady as a rocket launch nears. " * 3, "source": "Wire"}
+            for i in range(5)
+        ]}
+
+    def wiki_content(word):
+        pause()
+        paragraphs = [
+            f"Paragraph {i} about {word}: stars, galaxies, gravity, event horizon and spacetime curvature. " * 8
+            for i in range(80)
+        ]
+        paragraphs[57] = "Black holes evaporate through Hawking radiation, losing mass very slowly over time. " * 4
+        return {"title": word, "content": "\n\n".join(paragraphs)}
+
+    return {"get_weather": get_weather, "get_news": get_news, "wiki_content": wiki_content}
+
+
+class Stages:
+    """
+    Exclusive time per stage on the benchmark thread. A stage nested in another (db writes during a tool round)
+    is counted only once, in the inner stage.
+    """
+    def __init__(self):
+        self.owner = threading.current_thread()
+        self.stack = []
+        self.turn = defaultdict(float)
+
+    def add(self, name, seconds):
+        self.turn[name] += seconds
+        if self.stack:
+            self.stack[-1] += seconds
+
+    def wrap(self, name, func):
+        def timed(*args, **kwargs):
+            if threading.current_thread() is not self.owner:
+                return func(*args, **kwargs)
+            self.stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = self.stack.pop()
+                self.turn[name] += elapsed - children
+                if self.stack:
+                    self.stack[-1] += elapsed
+        return timed
+
+    def wrap_stream(self, stream):
+        """
+        Chunks of a streamed response arrive while main.py renders, only the waits for them count as llm.
+        """
+        iterator = iter(stream)
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                self.add("llm", time.perf_counter() - start)
+                return
+            self.add("llm", time.perf_counter() - start)
+            yield chunk
+
+
+def instrument(main, stages):
+    completions = main.client.chat.completions
+    create = completions.create
+
+    def timed_create(**kwargs):
+        response = stages.wrap("llm", create)(**kwargs)
+        return stages.wrap_stream(response) if kwargs.get("stream") else response
+    completions.create = timed_create
+
+    main.get_config = stages.wrap("settings", main.get_config)
+    main.submit = stages.wrap("db", main.submit)
+    main.flush = stages.wrap("db", main.flush)
+    main._run_tool_round = stages.wrap("tools", main._run_tool_round)
+    main.fit_context = stages.wrap("context", main.fit_context)
+    main.shape_result = stages.wrap("context", main.shape_result)
+    main.Markdown = stages.wrap("render", main.Markdown)
+    main.Panel = stages.wrap("render", main.Panel)
+
+    class TimedLive(main.Live):
+        start = stages.wrap("render", main.Live.start)
+        stop = stages.wrap("render", main.Live.stop)
+        update = stages.wrap("render", main.Live.update)
+    main.Live = TimedLive
+    main.console.print = stages.wrap("render", main.console.print)
+
+
+def summary(values):
+    values = sorted(values)
+    return {
+        "mean_ms": round(statistics.mean(values), 3),
+        "p50_ms": round(statistics.median(values), 3),
+        "p95_ms": round(values[max(int(len(values) * 0.95) - 1, 0)], 3),
+        "max_ms": round(values[-1], 3),
+    }
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Offline end-to-end turn latency of main.get_ai.")
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=150, help="Fake server time to first byte.")
+    parser.add_argument("--chunk-ms", type=float, default=2, help="Fake server delay between stream chunks.")
+    parser.add_argument("--tool-ms", type=float, default=50, help="Duration of every stub tool call.")
+    parser.add_argument("--no-stream", action="store_true", help="Turn [general] stream_responses off.")
+    parser.add_argument("--sync-db", action="store_true", help="Write logs on the turn thread instead of the background writer.")
+    parser.add_argument("--out", default="turn_bench.json")
+    args = parser.parse_args()
+
+    script = Script(RULES, latency_ms=args.latency_ms, chunk_ms=args.chunk_ms)
+    server, url = start_server(script)
+    tmp = tempfile.mkdtemp(prefix="tars-bench-")
+    os.environ.update({"groq_api": "fake", "model": "fake-model", "groq_base_url": url})
+    os.chdir(ROOT)
+
+    import db
+    db.db_file = os.path.join(tmp, "bench.db")
+    import main
+    from rich.console import Console
+    from rich.markdown import Markdown
+    from rich.panel import Panel
+
+    if args.sync_db:
+        main.stop_writer()
+    config = main.get_config()
+    config.general.stream_responses = not args.no_stream
+    config.general.display_function_response = 1
+    config.cache.enabled = False
+    main.get_config = lambda: config
+    main.console = Console(file=io.StringIO(), force_terminal=True, width=100)
+    main.available_functions.update(stub_tools(args.tool_ms))
+    main.current_session_id = db.create_new_session(main.model_id)
+
+    stages = Stages()
+    instrument(main, stages)
+    render = stages.wrap("render", main.console.print)
+
+    turns = []
+    for index in range(args.turns):
+        prompt = PROMPTS[index % len(PROMPTS)]
+        stages.turn = defaultdict(float)
+        start = time.perf_counter()
+        reply = main.get_ai(lambda: prompt)
+        # What tars.py does with the reply
+        render(Panel(Markdown(reply), title="[white]Tars[/white]", title_align="left", border_style="green"))
+        total = time.perf_counter() - start
+        measured = {stage: stages.turn[stage] * 1000 for stage in STAGES if stage != "other"}
+        measured["other"] = total * 1000 - sum(measured.values())
+        turns.append({"prompt": prompt, "total_ms": total * 1000, **{f"{stage}_ms": value for stage, value in measured.items()}})
+        # Keep the conversation short, the benchmark measures turns and not context growth.
+        del main.Chat_completion[1:]
+
+    main.flush()
+    server.shutdown()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "turns": args.turns,
+        "stream": not args.no_stream,
+        "write_behind": not args.sync_db,
+        "fake_latency_ms": args.latency_ms,
+        "tool_ms": args.tool_ms,
+        "llm_requests": len(script.requests),
+        "total": summary([turn["total_ms"] for turn in turns]),
+        "stages": {stage: summary([turn[f"{stage}_ms"] for turn in turns]) for stage in STAGES},
+        "by_prompt": {
+            prompt: summary([turn["total_ms"] for turn in turns if turn["prompt"] == prompt])
+            for prompt in PROMPTS if any(turn["prompt"] == prompt for turn in turns)
+        },
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{args.turns} turns, {len(script.requests)} LLM requests, stream={report['stream']}, write_behind={report['write_behind']}")
+    print(f"{'stage':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage in STAGES + ["total"]:
+        row = report["total"] if stage == "total" else report["stages"][stage]
+        print(f"{stage:<10}{row['mean_ms']:>10.2f}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}")
+    print(f"Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,305 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from rich.console import Console
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+    import tomlkit
+
+## Typed view of settings.toml. The file is parsed once and parsed again only when its modification time changes,
+## so get_config() is cheap enough to call on every turn and edits to settings.toml apply without a restart.
+## Values that are missing or invalid fall back to the defaults below, with a warning.
+
+settings_file = os.path.join(os.path.dirname(__file__), "settings.toml")
+## The file's mtime is checked at most this often.
+RELOAD_CHECK_SECONDS = 1.0
+
+console = Console()
+
+
+@dataclass
+class GeneralSettings:
+    ## 1 shows the tool call and its response, 2 only the call, 3 nothing.
+    display_function_response: int = field(default=1, metadata={"choices": (1, 2, 3)})
+    display_summeraize: bool = False
+    default_mode: int = field(default=1, metadata={"choices": (1, 2, 3)})
+    stream_responses: bool = True
+    max_parallel_tools: int = field(default=4, metadata={"min": 1})
+
+
+@dataclass
+class DatabaseSettings:
+    ## Paths are relative to the Tars folder. Read once at startup.
+    path: str = "tars.db"
+    archive_path: str = "tars_archive.db"
+    write_behind: bool = True
+    auto_archive: bool = False
+    archive_after_days: int = field(default=30, metadata={"min": 1})
+
+
+@dataclass
+class ContextSettings:
+    max_tokens: int = field(default=16000, metadata={"min": 1000})
+    show_usage: bool = False
+    ## tars.py --resume loads recent messages up to this many tokens, reading resume_page_size rows at a time.
+    resume_tokens: int = field(default=4000, metadata={"min": 0})
+    resume_page_size: int = field(default=50, metadata={"min": 1})
+
+
+@dataclass
+class SummarySettings:
+    ## Background summarization, see summarizer.py.
+    enabled: bool = True
+    chunk_turns: int = field(default=4, metadata={"min": 1})
+    keep_turns: int = field(default=2, metadata={"min": 0})
+    max_message_chars: int = field(default=2000, metadata={"min": 100})
+    ## Blank uses the chat model.
+    model: str = ""
+
+
+@dataclass
+class CacheSettings:
+    enabled: bool = False
+    ttl_hours: float = field(default=24.0, metadata={"min": 0})
+    max_entries: int = field(default=1000, metadata={"min": 1})
+    max_mb: float = field(default=50.0, metadata={"min": 0})
+    bypass_tools: list = field(default_factory=lambda: [
+        "get_datetime", "get_dt_by_place", "get_weather", "get_news", "news_search", "web_search", "sptest",
+        "list_files_in_directory", "list_files_by_types", "recursive_file_search", "read_file_content",
+        "manage_memory", "search_history",
+    ])
+
+
+@dataclass
+class AgentSettings:
+    max_rounds: int = field(default=6, metadata={"min": 1})
+    turn_timeout: float = field(default=90.0, metadata={"min": 1})
+
+
+@dataclass
+class RouterSettings:
+    ## Send only the tool schemas relevant to the message, see tool_router.route_tools.
+    enabled: bool = True
+    core: list = field(default_factory=lambda: ["get_datetime", "web_search"])
+    sticky_turns: int = field(default=2, metadata={"min": 0})
+    lexical_tools: int = field(default=3, metadata={"min": 0})
+
+
+@dataclass
+class LLMSettings:
+    ## Seconds a request may take before it is retried.
+    timeout: float = field(default=60.0, metadata={"min": 1})
+    max_retries: int = field(default=3, metadata={"min": 0})
+    backoff_base: float = field(default=0.5, metadata={"min": 0})
+    backoff_max: float = field(default=20.0, metadata={"min": 0})
+    hedge: bool = False
+    hedge_percentile: float = field(default=95.0, metadata={"min": 50, "max": 100})
+    hedge_min_samples: int = field(default=20, metadata={"min": 1})
+
+
+@dataclass
+class TracingSettings:
+    ## Record the timings of every turn in the spans table, shown by /stats.
+    enabled: bool = True
+
+
+@dataclass
+class ServerSettings:
+    ## server.py, read once at startup.
+    host: str = "127.0.0.1"
+    port: int = field(default=8080, metadata={"min": 1, "max": 65535})
+    ## Open conversations (WebSocket connections plus HTTP sessions).
+    max_sessions: int = field(default=1000, metadata={"min": 1})
+    ## Turns running at once, more wait for a slot.
+    max_turns: int = field(default=64, metadata={"min": 1})
+    ## Turns that may wait for a slot, and for how long, before the server answers busy.
+    max_waiting: int = field(default=256, metadata={"min": 0})
+    queue_timeout: float = field(default=30.0, metadata={"min": 0})
+    ## Turns one user may have running or waiting at once.
+    per_user_turns: int = field(default=2, metadata={"min": 1})
+    ## Threads for blocking tools and db calls, shared by all conversations.
+    tool_workers: int = field(default=16, metadata={"min": 1})
+    ## HTTP sessions unused this long are ended.
+    session_idle_minutes: float = field(default=30.0, metadata={"min": 1})
+
+
+@dataclass
+class SpeechSettings:
+    model: str = "small.en"
+    language: str = "en"
+    device: str = field(default="cpu", metadata={"choices": ("cpu", "cuda")})
+    compute_type: str = "float32"
+    post_speech_silence_duration: float = field(default=2.0, metadata={"min": 0})
+    silero_sensitivity: float = field(default=0.5, metadata={"min": 0, "max": 1})
+
+
+@dataclass
+class VoiceSettings:
+    model_path: str = "assets/tts_models/en_US-norman-medium.onnx"
+    sample_rate: int = field(default=22050, metadata={"min": 8000})
+
+
+@dataclass
+class ToolSettings:
+    ## Folder under the home directory that downloads go to.
+    download_dir: str = "Downloads"
+    default_place: str = "Tirupati"
+    search_region: str = "wt-wt"
+    safesearch: str = field(default="moderate", metadata={"choices": ("on", "moderate", "off")})
+    max_results: int = field(default=5, metadata={"min": 1})
+    memory_file: str = "memory.md"
+    ## Seconds an HTTP request of a tool may take.
+    http_timeout: float = field(default=15.0, metadata={"min": 1})
+
+
+@dataclass
+class Config:
+    general: GeneralSettings = field(default_factory=GeneralSettings)
+    database: DatabaseSettings = field(default_factory=DatabaseSettings)
+    context: ContextSettings = field(default_factory=ContextSettings)
+    summary: SummarySettings = field(default_factory=SummarySettings)
+    ## Per tool token caps of results sent to the model plus max_tokens for all other tools, see tool_results.result_limit.
+    tool_results: dict = field(default_factory=lambda: {"max_tokens": 1500})
+    cache: CacheSettings = field(default_factory=CacheSettings)
+    agent: AgentSettings = field(default_factory=AgentSettings)
+    router: RouterSettings = field(default_factory=RouterSettings)
+    llm: LLMSettings = field(default_factory=LLMSettings)
+    tracing: TracingSettings = field(default_factory=TracingSettings)
+    server: ServerSettings = field(default_factory=ServerSettings)
+    speech: SpeechSettings = field(default_factory=SpeechSettings)
+    voice: VoiceSettings = field(default_factory=VoiceSettings)
+    tools: ToolSettings = field(default_factory=ToolSettings)
+
+    def path(self, value: str) -> str:
+        """
+        A path from the settings, relative paths are taken from the Tars folder.
+        """
+        return value if os.path.isabs(value) else os.path.join(os.path.dirname(settings_file), value)
+
+
+def _check(section, item, value, warnings):
+    """
+    Validates one value against the type and metadata of its field.
+    Returns:
+        bool: True if the value can be used.
+    """
+    name = f"{section}.{item.name}"
+    expected = item.type
+    if expected is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if expected is int and isinstance(value, bool) or not isinstance(value, expected):
+        warnings.append(f"{name} must be a {expected.__name__}, got {value!r}, using the default")
+        return False
+    choices = item.metadata.get("choices")
+    if choices and value not in choices:
+        warnings.append(f"{name} must be one of {', '.join(map(str, choices))}, got {value!r}, using the default")
+        return False
+    if "min" in item.metadata and value < item.metadata["min"]:
+        warnings.append(f"{name} must be at least {item.metadata['min']}, got {value!r}, using the default")
+        return False
+    if "max" in item.metadata and value > item.metadata["max"]:
+        warnings.append(f"{name} must be at most {item.metadata['max']}, got {value!r}, using the default")
+        return False
+    return True
+
+
+def _section(cls, name, data, warnings):
+    section = cls()
+    if not isinstance(data, dict):
+        warnings.append(f"[{name}] must be a table, using the defaults")
+        return section
+    known = {item.name: item for item in fields(cls)}
+    for key, value in data.items():
+        item = known.get(key)
+        if item is None:
+            warnings.append(f"{name}.{key} is not a known setting, ignored")
+            continue
+        if _check(name, item, value, warnings):
+            setattr(section, key, float(value) if item.type is float else value)
+    return section
+
+
+def parse_config(data: dict):
+    """
+    Builds a Config from the parsed settings.toml.
+    Returns:
+        tuple: (Config, list of warnings about values that were ignored)
+    """
+    warnings = []
+    config = Config()
+    for item in fields(Config):
+        if item.name not in data:
+            continue
+        if item.name == "tool_results":
+            limits = {}
+            for tool, value in data[item.name].items():
+                if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+                    limits[tool] = value
+                else:
+                    warnings.append(f"tool_results.{tool} must be a positive int, got {value!r}, ignored")
+            config.tool_results = {"max_tokens": 1500, **limits}
+            continue
+        setattr(config, item.name, _section(type(getattr(config, item.name)), item.name, data[item.name], warnings))
+    return config, warnings
+
+
+def _read(path):
+    if tomllib is not None:
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path, "r") as f:
+        return tomlkit.load(f).unwrap()
+
+
+_config = None
+_mtime = None
+_checked = 0.0
+_lock = threading.Lock()
+
+
+def get_config() -> Config:
+    """
+    The current settings. Re-reads settings.toml when it changed since the last read, a file that fails to
+    parse keeps the previous settings. Without a settings.toml the defaults are used.
+    """
+    global _config, _mtime, _checked
+    now = time.monotonic()
+    if _config is not None and now - _checked < RELOAD_CHECK_SECONDS:
+        return _config
+    with _lock:
+        _checked = now
+        try:
+            mtime = os.stat(settings_file).st_mtime_ns
+        except FileNotFoundError:
+            if _config is None:
+                console.print("[red] Settings toml file not found, using the default settings.[/red]")
+                _config = Config()
+            return _config
+        if _config is not None and mtime == _mtime:
+            return _config
+        try:
+            config, warnings = parse_config(_read(settings_file))
+        except Exception as e:
+            console.print(f"[red]Error reading settings.toml: {e}[/red]")
+            if _config is None:
+                _config = Config()
+            _mtime = mtime
+            return _config
+        for warning in warnings:
+            console.print(f"[yellow]settings.toml: {warning}[/yellow]")
+        _config = config
+        _mtime = mtime
+        return _config
+
+
+def reload_config() -> Config:
+    """
+    Forces the next get_config() call to check settings.toml.
+    """
+    global _checked
+    _checked = 0.0
+    return get_config()
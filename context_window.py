@@ -0,0 +1,162 @@
+import json
+import math
+import re
+
+## Token budget of one request: system prompt, history and tool schemas together.
+DEFAULT_MAX_TOKENS = 16000
+## Tool results of older turns are cut to this many tokens before whole turns are evicted.
+CONDENSED_TOOL_TOKENS = 200
+## Added after the system prompt once older turns have been dropped.
+TRIMMED_NOTE = "Earlier parts of this conversation were trimmed to save tokens. Use the search_history tool to recall them if needed."
+
+## Overhead the chat format adds per message (role, separators), close to what OpenAI style tokenizers use.
+_MESSAGE_OVERHEAD = 4
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_tools_cache = {}
+
+
+def count_tokens(text) -> int:
+    """
+    Local approximation of a BPE tokenizer: every punctuation mark is a token and words cost
+    one token per 4 characters. Usually within 10-15% of the real count for English text and JSON.
+    """
+    if not text:
+        return 0
+    return sum(math.ceil(len(token) / 4) for token in _TOKEN_PATTERN.findall(str(text)))
+
+
+def _as_dict(message) -> dict:
+    """
+    Messages are dicts, except assistant messages with tool_calls, which are kept as the response objects.
+    """
+    if isinstance(message, dict):
+        return message
+    return message.model_dump(exclude_none=True)
+
+
+def message_tokens(message) -> int:
+    message = _as_dict(message)
+    tokens = _MESSAGE_OVERHEAD + count_tokens(message.get("content"))
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += _MESSAGE_OVERHEAD + count_tokens(function.get("name")) + count_tokens(function.get("arguments"))
+    return tokens
+
+
+def tools_tokens(tools) -> int:
+    """
+    Tokens of the tool schemas, they are sent with every request. Cached per list, a schema list does not change.
+    """
+    if not tools:
+        return 0
+    cached = _tools_cache.get(id(tools))
+    if cached is None or cached[0] is not tools:
+        if len(_tools_cache) >= 512:
+            # Routed subsets are lists of their own, old ones are not kept alive forever.
+            _tools_cache.clear()
+        cached = (tools, count_tokens(json.dumps(tools)))
+        _tools_cache[id(tools)] = cached
+    return cached[1]
+
+
+def _turns(messages):
+    """
+    Splits the history after the leading system messages into turns: a user message with everything up to the
+    next user message. An assistant tool_calls message and its tool results are always in the same turn.
+    Returns:
+        tuple: (number of leading system messages, list of [start, end) index pairs)
+    """
+    head = 0
+    while head < len(messages) and _as_dict(messages[head]).get("role") == "system":
+        head += 1
+    turns = []
+    start = head
+    for index in range(head + 1, len(messages)):
+        if _as_dict(messages[index]).get("role") == "user":
+            turns.append((start, index))
+            start = index
+    if start < len(messages):
+        turns.append((start, len(messages)))
+    return head, turns
+
+
+def _condense(message, max_tokens):
+    """
+    Cuts the content of a tool result to about max_tokens. Returns None if it is short enough already.
+    """
+    content = message.get("content") or ""
+    if count_tokens(content) <= max_tokens:
+        return None
+    return {**message, "content": content[:max_tokens * 4] + " ...[truncated to save tokens]"}
+
+
+def fit_context(messages: list, tools=None, max_tokens: int = DEFAULT_MAX_TOKENS, condensed_tool_tokens: int = CONDENSED_TOOL_TOKENS) -> dict:
+    """
+    Makes messages plus tool schemas fit in max_tokens, changing the list in place so it stops growing.
+    The system prompt and the current (last) turn are always kept. Older turns are handled oldest first:
+    first their tool results are condensed, then whole turns are evicted. A tool_calls message and its tool
+    results are only ever dropped together, so the history stays valid for the API.
+    Args:
+        messages (list): The conversation, like main.Chat_completion.
+        tools (list, optional): Tool schemas sent with the request.
+        max_tokens (int, optional): Budget for the whole request. Defaults to DEFAULT_MAX_TOKENS.
+    Returns:
+        dict: Token usage of the request: messages, tools, total, budget, condensed and evicted counts.
+    """
+    tool_tokens = tools_tokens(tools)
+    sizes = [message_tokens(message) for message in messages]
+    total = sum(sizes) + tool_tokens
+    condensed = 0
+    evicted = 0
+
+    if total > max_tokens:
+        head, turns = _turns(messages)
+        older = turns[:-1]
+
+        # Condense the tool results of older turns, oldest first.
+        for start, end in older:
+            for index in range(start, end):
+                message = _as_dict(messages[index])
+                if total <= max_tokens:
+                    break
+                if message.get("role") != "tool":
+                    continue
+                shorter = _condense(message, condensed_tool_tokens)
+                if shorter is not None:
+                    messages[index] = shorter
+                    new_size = message_tokens(shorter)
+                    total -= sizes[index] - new_size
+                    sizes[index] = new_size
+                    condensed += 1
+
+        # Evict whole turns, oldest first. The note added after the system prompt counts against the budget too.
+        note = {"role": "system", "content": TRIMMED_NOTE}
+        has_note = any(_as_dict(message).get("content") == TRIMMED_NOTE for message in messages[:head])
+        note_tokens = 0 if has_note else message_tokens(note)
+        cut = None
+        for start, end in older:
+            if total + (note_tokens if cut is not None else 0) <= max_tokens:
+                break
+            total -= sum(sizes[start:end])
+            evicted += end - start
+            cut = end
+        if cut is not None:
+            kept_head = messages[:head] if has_note else messages[:head] + [note]
+            total += note_tokens
+            messages[:] = kept_head + messages[cut:]
+
+    return {
+        "messages": total - tool_tokens,
+        "tools": tool_tokens,
+        "total": total,
+        "budget": max_tokens,
+        "condensed": condensed,
+        "evicted": evicted,
+    }
+
+
+def format_report(report: dict) -> str:
+    text = f"context {report['total']}/{report['budget']} tokens (messages {report['messages']}, tools {report['tools']})"
+    if report["condensed"] or report["evicted"]:
+        text += f", condensed {report['condensed']} tool results, dropped {report['evicted']} old messages"
+    return text
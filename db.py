@@ -2,27 +2,214 @@ import sqlite3
 from sqlite3 import Connection
 from datetime import datetime
 import os 
+import atexit
+import hashlib
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from config import get_config
 
-db_file = os.path.join(os.path.dirname(__file__), "tars.db")
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-def get_connection() -> Connection:
+## Paths come from the [database] settings, read once when db is imported.
+_config = get_config()
+db_file = _config.path(_config.database.path)
+## Ended sessions are moved here by archive_sessions(), it is attached to a connection only when it is needed.
+archive_file = _config.path(_config.database.archive_path)
+## Default age in days after which an ended session is archived.
+ARCHIVE_AFTER_DAYS = _config.database.archive_after_days
+
+## How long a connection waits on a lock held by another Tars process before raising "database is locked".
+BUSY_TIMEOUT_SECONDS = 5.0
+
+## Tool responses at least this many bytes are stored compressed in the blobs table instead of inline.
+BLOB_MIN_SIZE = 1024
+## zstd compresses faster and smaller than zlib, it is used when the optional zstandard package is installed.
+BLOB_CODEC = "zstd" if zstandard else "zlib"
+
+## One connection per thread, reused for the whole process and closed by close_connections() at exit.
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+def _open_connection(path) -> Connection:
     """
-    Create a Sqlite3 Connection.
-    Ensures Foreign keys are enforced for this connection.
-    Can use this function anywhere to create the db connection.
+    Open a new Sqlite3 connection configured for long lived use.
+    WAL lets readers and the writer work at the same time and lets several Tars processes share one tars.db,
+    the busy timeout makes a writer wait for the lock instead of failing and
+    IMMEDIATE transactions take the write lock up front so two processes never deadlock upgrading a read lock.
     """
-    conn = sqlite3.connect(db_file, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+    conn = sqlite3.connect(
+        path,
+        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+        timeout=BUSY_TIMEOUT_SECONDS,
+        isolation_level="IMMEDIATE",
+        check_same_thread=False
+    )
     conn.row_factory = sqlite3.Row
+    conn.create_function("blob_text", 2, _decompress, deterministic=True)
     conn.execute("PRAGMA foreign_key = ON;")
+    # Only has an effect on a new, empty database (it must come before journal_mode), older ones are converted by python db.py vacuum.
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA synchronous = NORMAL;")
+    conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT_SECONDS * 1000)};")
+    return conn
+
+def _compress(data: bytes):
+    if BLOB_CODEC == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+def _decompress(codec, data):
+    """
+    SQL function blob_text(codec, data): the text of a row of the blobs table.
+    Only runs for the rows a query actually returns, so compressed responses are decompressed lazily.
+    """
+    if data is None:
+        return None
+    if codec == "zstd":
+        if zstandard is None:
+            return "[This response is compressed with zstd, install the zstandard package to read it]"
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+def get_connection() -> Connection:
+    """
+    Returns the Sqlite3 Connection of the current thread, opening it on first use.
+    Ensures Foreign keys are enforced for this connection.
+    Can use this function anywhere to get the db connection, do not close it, it is reused by the next caller.
+    The connection is reopened if db_file changes or if the process was forked.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == db_file and _local.pid == os.getpid():
+        return conn
+
+    conn = _open_connection(db_file)
+    _local.conn = conn
+    _local.path = db_file
+    _local.pid = os.getpid()
+    with _connections_lock:
+        _connections.append(conn)
     return conn
 
+def close_connection():
+    """
+    Closes the connection of the current thread. The next get_connection() call opens a new one.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        return
+    _local.conn = None
+    with _connections_lock:
+        if conn in _connections:
+            _connections.remove(conn)
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+def close_connections():
+    """
+    Shutdown hook: closes every connection opened by this process.
+    Closing the last connection checkpoints the WAL file back into tars.db.
+    """
+    with _connections_lock:
+        conns = list(_connections)
+        _connections.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.conn = None
+
+atexit.register(close_connections)
+
+## Bumped whenever create_tables() gets a migration for existing databases, stored in PRAGMA user_version.
+SCHEMA_VERSION = 5
+
+def _commit(conn: Connection):
+    """
+    Commits the current transaction unless this thread is inside batch(), then the batch commits it.
+    """
+    if not getattr(_local, "in_batch", False):
+        conn.commit()
+
+def _rollback(conn: Connection):
+    """
+    Rolls back the current transaction, inside batch() only the current batch_item() is rolled back.
+    """
+    if getattr(_local, "in_batch", False):
+        conn.execute("ROLLBACK TO tars_item;")
+    else:
+        conn.rollback()
+
+@contextmanager
+def batch():
+    """
+    Group several save_* calls of this thread into one transaction (group commit).
+    Every save_* function called inside only commits when the with block ends.
+    Used by the background writer in db_writer.py.
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE;")
+    _local.in_batch = True
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        _local.in_batch = False
+
+@contextmanager
+def batch_item():
+    """
+    Savepoint for a single call inside batch(), so a failing save_* call only undoes its own rows.
+    """
+    conn = get_connection()
+    conn.execute("SAVEPOINT tars_item;")
+    try:
+        yield conn
+    except Exception:
+        conn.execute("ROLLBACK TO tars_item;")
+        conn.execute("RELEASE tars_item;")
+        raise
+    else:
+        conn.execute("RELEASE tars_item;")
+
 def create_tables():
     """
     Create required database tables if they do not exist.
     Normally executed once during initial setup.
+    A failing migration is rolled back, the connection is reused and must not stay inside the transaction.
     """
     conn = get_connection()
+    try:
+        _create_tables(conn)
+    except Exception:
+        _rollback(conn)
+        raise
+
+def _create_tables(conn: Connection):
     cursor = conn.cursor()
+    version = conn.execute("PRAGMA user_version;").fetchone()[0]
+    
+    if 0 < version < 4:
+        # tool_calls_fts keeps its own copy of the response text now, the view and the triggers of older versions
+        # called blob_text, which only exists on connections opened by this module.
+        cursor.execute("DROP TRIGGER IF EXISTS trg_tool_calls_fts_insert;")
+        cursor.execute("DROP TRIGGER IF EXISTS trg_tool_calls_fts_delete;")
+        cursor.execute("DROP TRIGGER IF EXISTS trg_tool_calls_fts_update;")
+        cursor.execute("DROP TABLE IF EXISTS tool_calls_fts;")
+        cursor.execute("DROP VIEW IF EXISTS tool_calls_text;")
 
     ## Creating Models table - this table can used to track and model and model usage
     cursor.execute(
@@ -102,6 +289,24 @@ def create_tables():
     """
     )
     
+    ## Blobs: compressed, content addressed (sha256) storage for large tool responses.
+    ## tool_calls.response_blob and conversations.content_blob point here instead of storing the same text twice.
+    cursor.execute(
+    """
+    CREATE TABLE IF NOT EXISTS blobs(
+        hash TEXT PRIMARY KEY,
+        codec TEXT NOT NULL CHECK(codec IN ('zlib', 'zstd')),
+        raw_size INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        created_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+    );
+    """
+    )
+    _add_column(cursor, "tool_calls", "response_blob", "TEXT NULL REFERENCES blobs(hash)")
+    _add_column(cursor, "conversations", "content_blob", "TEXT NULL REFERENCES blobs(hash)")
+    ## Sessions of server.py belong to a user.
+    _add_column(cursor, "sessions", "user_id", "INTEGER NULL REFERENCES users(id)")
+    
     ## media_files: optional table for files like audio and video 
     ## Note: Currently this table exists but this table is mostly not used this is only used when I integrate TTS or decided to store current STT audio files or any audio/video files.
     cursor.execute(
@@ -122,9 +327,259 @@ def create_tables():
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations(timestamp);")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_tool_calls_timestamp ON tool_calls(timestamp);")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_role ON conversations(role);")
+    # Keyset pagination of a session's history, role is included so role filters and the per role counts of
+    # update_session_messag_Count and repair_session_message_counts are answered from the index.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_session_id_role ON conversations(session_id, id, role);")
+    # Replaced by the index above, one index less to update on every insert.
+    cursor.execute("DROP INDEX IF EXISTS idx_conversations_session_role_id;")
+    # Summaries are kept in the summaries table now, summary_flag rows are only read for sessions of older versions.
+    cursor.execute("DROP INDEX IF EXISTS idx_conversations_summary;")
+    
+    ## sessions.message_count is kept up to date by these triggers, so an insert never has to count the session's rows.
+    cursor.execute(
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_conversations_count_insert
+    AFTER INSERT ON conversations
+    WHEN NEW.role IN ('user', 'assistant')
+    BEGIN
+        UPDATE sessions SET message_count = COALESCE(message_count, 0) + 1 WHERE id = NEW.session_id;
+    END;
+    """
+    )
+    cursor.execute(
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_conversations_count_delete
+    AFTER DELETE ON conversations
+    WHEN OLD.role IN ('user', 'assistant')
+    BEGIN
+        UPDATE sessions SET message_count = MAX(COALESCE(message_count, 0) - 1, 0) WHERE id = OLD.session_id;
+    END;
+    """
+    )
+    
+    ## Full text search over the history. conversations_fts is an external content table, the text is stored once
+    ## in conversations and the triggers below keep the index in sync. Tool rows of conversations are skipped,
+    ## their text is the same as the tool call's response which is indexed in tool_calls_fts.
+    ## tool_calls_fts stores its own copy of the text: responses compressed in the blobs table can not be read by
+    ## SQL alone, save_tool_response() writes their text into it. The triggers only use plain SQL, so the tables
+    ## can be written from any sqlite3 client.
+    cursor.execute(
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+        content,
+        content='conversations',
+        content_rowid='id'
+    );
+    """
+    )
+    cursor.execute(
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tool_calls_fts USING fts5(
+        tool_name,
+        arguments,
+        response
+    );
+    """
+    )
+    cursor.execute(
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_conversations_fts_insert
+    AFTER INSERT ON conversations
+    WHEN NEW.role != 'tool'
+    BEGIN
+        INSERT INTO conversations_fts(rowid, content) VALUES (NEW.id, NEW.content);
+    END;
+    """
+    )
+    cursor.execute(
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_conversations_fts_delete
+    AFTER DELETE ON conversations
+    WHEN OLD.role != 'tool'
+    BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+    END;
+    """
+    )
+    cursor.execute(
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_conversations_fts_update
+    AFTER UPDATE OF content ON conversations
+    WHEN OLD.role != 'tool'
+    BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+        INSERT INTO conversations_fts(rowid, content) VALUES (NEW.id, NEW.content);
+    END;
+    """
+    )
+    cursor.execute(
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_tool_calls_fts_insert
+    AFTER INSERT ON tool_calls
+    BEGIN
+        INSERT INTO tool_calls_fts(rowid, tool_name, arguments, response)
+        VALUES (NEW.id, NEW.tool_name, NEW.arguments, NEW.response);
+    END;
+    """
+    )
+    cursor.execute(
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_tool_calls_fts_delete
+    AFTER DELETE ON tool_calls
+    BEGIN
+        DELETE FROM tool_calls_fts WHERE rowid = OLD.id;
+    END;
+    """
+    )
+    # A response moved into the blobs table (response set to NULL) keeps the text already indexed.
+    cursor.execute(
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_tool_calls_fts_update
+    AFTER UPDATE OF tool_name, arguments, response ON tool_calls
+    BEGIN
+        UPDATE tool_calls_fts
+        SET tool_name = NEW.tool_name, arguments = NEW.arguments, response = COALESCE(NEW.response, response)
+        WHERE rowid = NEW.id;
+    END;
+    """
+    )
     
+    ## Spans: timings of the stages of a turn (stt, llm, tool, db, render, tts), written by tracing.py.
+    cursor.execute(
+    """
+    CREATE TABLE IF NOT EXISTS spans(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NULL,
+        conversation_id INTEGER NULL,
+        stage TEXT NOT NULL,
+        name TEXT NULL,
+        started_at REAL NOT NULL,
+        duration_ms REAL NOT NULL,
+        ok INTEGER NOT NULL DEFAULT 1,
+        FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE,
+        FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE SET NULL
+    );
+    """
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_spans_stage_id ON spans(stage, id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_spans_session ON spans(session_id);")
+    
+    ## Summaries: a tree per session, written by summarizer.py. Level 0 summarizes a chunk of turns,
+    ## level 1 rolls the chunks up into the summary of the session so far. first_id / last_id are the
+    ## conversations rows a summary covers.
+    cursor.execute(
+    """
+    CREATE TABLE IF NOT EXISTS summaries(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        level INTEGER NOT NULL,
+        first_id INTEGER NOT NULL,
+        last_id INTEGER NOT NULL,
+        content TEXT NOT NULL,
+        model_id INTEGER NULL,
+        created_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+        FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE,
+        FOREIGN KEY (model_id) REFERENCES models(id) ON DELETE SET NULL
+    );
+    """
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_summaries_session_level_last ON summaries(session_id, level, last_id);")
+    
+    conn.commit()
+    
+    ## One time migrations for databases created by an older version of Tars.
+    if version < 1:
+        # Counters were written by COUNT(*) before the triggers existed, recompute them once.
+        repair_session_message_counts()
+    if version < 2:
+        # Index the history written before the full text search triggers existed.
+        conn.execute("INSERT INTO conversations_fts(rowid, content) SELECT id, content FROM conversations WHERE role != 'tool';")
+        conn.commit()
+    if version < 4:
+        _index_tool_calls(conn)
+    if version < 5:
+        _merge_duplicate_users(conn)
+    # One row per username, get_or_create_user() relies on it when two connections create the same user at once.
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username);")
+    conn.commit()
+    if version < SCHEMA_VERSION:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+
+def _index_tool_calls(conn: Connection, batch_size: int = 500):
+    """
+    Fills tool_calls_fts from tool_calls, compressed responses are decompressed here in Python.
+    """
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            """
+            SELECT t.id, t.tool_name, t.arguments, t.response, b.codec, b.data
+            FROM tool_calls t
+            LEFT JOIN blobs b ON b.hash = t.response_blob
+            WHERE t.id > ?
+            ORDER BY t.id
+            LIMIT ?
+            """, (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            return
+        conn.executemany(
+            "INSERT OR REPLACE INTO tool_calls_fts(rowid, tool_name, arguments, response) VALUES (?, ?, ?, ?)",
+            [
+                (row['id'], row['tool_name'], row['arguments'],
+                 row['response'] if row['response'] is not None else _decompress(row['codec'], row['data']))
+                for row in rows
+            ]
+        )
+        conn.commit()
+        last_id = rows[-1]['id']
+
+def _merge_duplicate_users(conn: Connection):
+    """
+    Users created twice under one name (concurrent first connects to server.py before usernames were unique)
+    are merged into the oldest row, their sessions and messages move with them.
+    """
+    duplicates = conn.execute(
+        """
+        SELECT u.id, (SELECT MIN(id) FROM users k WHERE k.username = u.username) AS keep
+        FROM users u
+        WHERE u.username IS NOT NULL
+        AND u.id > (SELECT MIN(id) FROM users k WHERE k.username = u.username)
+        """
+    ).fetchall()
+    for row in duplicates:
+        conn.execute("UPDATE sessions SET user_id = ? WHERE user_id = ?;", (row['keep'], row['id']))
+        conn.execute("UPDATE conversations SET user_id = ? WHERE user_id = ?;", (row['keep'], row['id']))
+        conn.execute("DELETE FROM users WHERE id = ?;", (row['id'],))
     conn.commit()
-    conn.close()
+
+def _add_column(cursor, table: str, column: str, declaration: str, schema: str = "main"):
+    """
+    ALTER TABLE ... ADD COLUMN, only if the table exists and the column is missing. Used to migrate databases made by older versions.
+    Args:
+        schema (str, optional): "archive" for a table of the attached archive database. Defaults to "main".
+    """
+    columns = [row[1] for row in cursor.execute(f"PRAGMA {schema}.table_info({table});").fetchall()]
+    if columns and column not in columns:
+        cursor.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {column} {declaration};")
+
+def _put_blob(cursor, text: str, schema: str = "main") -> str:
+    """
+    Stores text compressed in the blobs table, once per distinct content.
+    Args:
+        schema (str, optional): "archive" to store it in the attached archive database. Defaults to "main".
+    Returns:
+        str: sha256 of the text, the key to reference the blob with.
+    """
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    cursor.execute(
+        f"""
+        INSERT OR IGNORE INTO {schema}.blobs (hash, codec, raw_size, data)
+        VALUES (?, ?, ?, ?)
+        """, (digest, BLOB_CODEC, len(data), _compress(data))
+    )
+    return digest
 
 ## Function that saves model details into the models table.
 def get_or_create_model(provider: str, model_name: str):
@@ -139,29 +594,120 @@ def get_or_create_model(provider: str, model_name: str):
     """
     conn = get_connection()
     cursor = conn.cursor()
+    select = "SELECT id FROM models WHERE provider = ? AND model_name = ?"
 
-    cursor.execute(
+    row = cursor.execute(select, (provider, model_name)).fetchone()
+    if row:
+        return row['id']
+    
+    try:
+        cursor.execute(
         """
-        SELECT id FROM models
-        WHERE provider = ? AND model_name = ?
+        INSERT OR IGNORE INTO models (provider, model_name)
+        VALUES (?, ?)
         """, (provider, model_name)
-    )
-    row = cursor.fetchone()
+        )
+        _commit(conn)
+    except Exception as e:
+        _rollback(conn)
+        print(f"Error saving the model: {e}")
+        return None
+    # Selected again, lastrowid is stale when another connection inserted the model first.
+    return cursor.execute(select, (provider, model_name)).fetchone()['id']
+
+## Function that saves users into the users table.
+def get_or_create_user(username: str, display_name: str = None):
+    """
+    Make sure a user exists in the db.
+    Args:
+        username (str): Name the user connects with (server.py).
+        display_name (str, optional): Shown name. Defaults to None.
+    Returns:
+        Returns the id of the user.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    row = cursor.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
     if row:
-        conn.close()
         return row['id']
-    
-    cursor.execute(
+
+    try:
+        # Another connection may create the same user at the same time, the unique index keeps one row.
+        cursor.execute(
+        """
+        INSERT INTO users (username, display_name)
+        VALUES (?, ?)
+        ON CONFLICT(username) DO NOTHING
+        """, (username, display_name)
+        )
+        _commit(conn)
+    except Exception as e:
+        _rollback(conn)
+        print(f"Error saving the user: {e}")
+        return None
+    return cursor.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()['id']
+
+## Function that saves tracing spans
+def save_spans(spans: list, session_id: int = None, conversation_id: int = None):
     """
-    INSERT OR IGNORE INTO models (provider, model_name)
-    VALUES (?, ?)
-    """, (provider, model_name)
-    )
-    conn.commit()
-    row = cursor.lastrowid
-    conn.close()
+    Insert the spans of one turn in a single statement.
+    Args:
+        spans (list): (stage, name, started_at, duration_ms, ok) tuples, started_at in unix seconds.
+        session_id (int, optional): Session the spans belong to.
+        conversation_id (int, optional): User message of the turn.
+
+    Returns:
+        int: Number of spans saved.
+    """
+    conn = get_connection()
+    try:
+        conn.executemany(
+            """
+            INSERT INTO spans(session_id, conversation_id, stage, name, started_at, duration_ms, ok)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(session_id, conversation_id, *span) for span in spans]
+        )
+        _commit(conn)
+        return len(spans)
+    except Exception as e:
+        _rollback(conn)
+        print(f"Error saving the spans: {e}")
+        return 0
+
+def span_stats(session_id: int = None, per_stage: int = 2000):
+    """
+    Latency percentiles per stage over the most recent spans.
+    Args:
+        session_id (int, optional): Only spans of this session. Defaults to all sessions.
+        per_stage (int, optional): How many of the latest spans of each stage are used. Defaults to 2000.
 
-    return row
+    Returns:
+        list: One dict per stage with stage, count, p50_ms, p95_ms, max_ms and failed, slowest p95 first.
+    """
+    conn = get_connection()
+    where = "AND session_id = ?" if session_id is not None else ""
+    stages = [row[0] for row in conn.execute("SELECT DISTINCT stage FROM spans;")]
+    stats = []
+    for stage in stages:
+        # idx_spans_stage_id makes this a backwards index scan that stops after per_stage rows.
+        rows = conn.execute(
+            f"SELECT duration_ms, ok FROM spans WHERE stage = ? {where} ORDER BY id DESC LIMIT ?;",
+            (stage, session_id, per_stage) if session_id is not None else (stage, per_stage)
+        ).fetchall()
+        if not rows:
+            continue
+        durations = sorted(row[0] for row in rows)
+        stats.append({
+            "stage": stage,
+            "count": len(durations),
+            "p50_ms": durations[len(durations) // 2],
+            "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "max_ms": durations[-1],
+            "failed": sum(1 for row in rows if not row[1]),
+        })
+    stats.sort(key=lambda stat: stat["p95_ms"], reverse=True)
+    return stats
 
 ## Function that saves user messages 
 def save_user_message(text: str,  session_id:int , user_id: int = None, model_id:int = None):
@@ -183,16 +729,13 @@ def save_user_message(text: str,  session_id:int , user_id: int = None, model_id
         VALUES (?, 'user', ?, ?, ?)
         """, (session_id, text, user_id, model_id)
         )
-        conn.commit()
+        _commit(conn)
         cid = cursor.lastrowid
-        update_session_messag_Count(session_id)
         return cid
     except Exception as e:
-        conn.rollback()
+        _rollback(conn)
         print(f"Error saving the message: {e}")
         return None
-    finally:
-        conn.close()
 
   
 ## Function that saves the LLM replies/content.    
@@ -214,15 +757,12 @@ def save_assistant_message(text: str, session_id:int , model_id: int = None):
         VALUES (?, 'assistant', ?, ?)
         """, (session_id, text, model_id)
         )
-        conn.commit()
+        _commit(conn)
         aid = cursor.lastrowid
-        update_session_messag_Count(session_id)
         return aid
     except Exception as e:
-        conn.rollback()
+        _rollback(conn)
         print(f"Error saving the assistant message {e}")
-    finally:
-        conn.close()
 
     
 
@@ -244,20 +784,17 @@ def save_tool_call(tool_name: str, arguments_json: str, session_id:int ,trigger_
         VALUES (?,?,?)
         """, (tool_name, arguments_json, trigger_conversation_id)
         )
-        conn.commit()
+        _commit(conn)
         tid = cursor.lastrowid
-        update_session_messag_Count(session_id)
-    
         return tid
     except Exception as e:
-        conn.rollback()
+        _rollback(conn)
         print(f"Error saving the tool call {e}")
-    finally:
-        conn.close()
 
 def save_tool_response(tool_call_id: int, response_text: str, session_id:int, model_id:int = None):
     """
     Saves tool reponse AND creates a conversation row with role='tool'
+    Responses of BLOB_MIN_SIZE bytes or more are stored compressed in the blobs table.
     Args:
         tool_call_id (int): The id we get when we save a tool call (id that returns when the save_tool_call function is called)
         response_text (str): what did the tool responded.
@@ -270,43 +807,136 @@ def save_tool_response(tool_call_id: int, response_text: str, session_id:int, mo
     cursor = conn.cursor()
 
     try:
+        # Large responses are stored once, compressed, and both rows point to the same blob.
+        blob = None
+        full_text = response_text
+        if response_text is not None and len(response_text.encode("utf-8")) >= BLOB_MIN_SIZE:
+            blob = _put_blob(cursor, response_text)
+            response_text = None
         cursor.execute(
             """
             UPDATE tool_calls
-            SET response = ?
+            SET response = ?, response_blob = ?
             WHERE id = ?
-            """, (response_text, tool_call_id)
+            """, (response_text, blob, tool_call_id)
         )
+        if blob is not None:
+            # SQL can not read the compressed text, the search index gets it from here.
+            cursor.execute("UPDATE tool_calls_fts SET response = ? WHERE rowid = ?;", (full_text, tool_call_id))
         cursor.execute(
         """
-        INSERT INTO conversations (session_id, role, content, tool_call_id, model_id)
-        VALUES (?, 'tool', ?, ?, ?)
-        """, (session_id, response_text, tool_call_id, model_id)
+        INSERT INTO conversations (session_id, role, content, content_blob, tool_call_id, model_id)
+        VALUES (?, 'tool', ?, ?, ?, ?)
+        """, (session_id, response_text, blob, tool_call_id, model_id)
         )
         
-        conn.commit()
+        _commit(conn)
         cid = cursor.lastrowid
         return cid
     except Exception as e:
-        conn.rollback()
+        _rollback(conn)
         print(f"Error saving tool response: {e}")
         return None
-    finally:
-        conn.close()
+
+## Summaries saved by older versions as system rows with summary_flag, only read (--resume, summarizer.py).
+def get_latest_summary(session_id: int):
+    """
+    The most recent summary_flag row of a session, written by older versions of Tars before the summaries table.
+    Returns:
+        sqlite3.Row: id and content, None if the session was never summarized.
+    """
+    conn = get_connection()
+    return conn.execute(
+        """
+        SELECT id, content FROM conversations
+        WHERE session_id = ? AND summary_flag = 1
+        ORDER BY id DESC
+        LIMIT 1
+        """, (session_id,)
+    ).fetchone()
+
+## Function that saves a node of the summary tree (summarizer.py)
+def save_summary_node(session_id: int, level: int, first_id: int, last_id: int, text: str, model_id: int = None):
+    """
+    Insert one summary of the session's summary tree and return its id.
+    Args:
+        session_id (int): Session it summarizes.
+        level (int): 0 for a chunk of turns, 1 for a rollup of the session so far.
+        first_id (int): First conversations row it covers.
+        last_id (int): Last conversations row it covers.
+        text (str): The summary.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+        """
+        INSERT INTO summaries(session_id, level, first_id, last_id, content, model_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """, (session_id, level, first_id, last_id, text, model_id)
+        )
+        _commit(conn)
+        return cursor.lastrowid
+    except Exception as e:
+        _rollback(conn)
+        print(f"Error saving the summary: {e}")
+        return None
+
+def get_latest_summary_node(session_id: int, level: int):
+    """
+    The summary of a level that covers the most recent messages of a session.
+    Returns:
+        sqlite3.Row: id, level, first_id, last_id and content, None if there is none.
+    """
+    conn = get_connection()
+    return conn.execute(
+        """
+        SELECT id, level, first_id, last_id, content FROM summaries
+        WHERE session_id = ? AND level = ?
+        ORDER BY last_id DESC, id DESC
+        LIMIT 1
+        """, (session_id, level)
+    ).fetchone()
+
+def get_summary_nodes(session_id: int, level: int, after_id: int = 0):
+    """
+    The summaries of a level covering messages after after_id, oldest first.
+    Returns:
+        list: sqlite3.Row objects with id, level, first_id, last_id and content.
+    """
+    conn = get_connection()
+    return conn.execute(
+        """
+        SELECT id, level, first_id, last_id, content FROM summaries
+        WHERE session_id = ? AND level = ? AND last_id > ?
+        ORDER BY last_id
+        """, (session_id, level, after_id)
+    ).fetchall()
+
+## Columns of conversations for reads, content is decompressed from the blobs table for rows that store it there.
+CONVERSATION_COLUMNS = """
+    id, session_id, timestamp, role,
+    COALESCE(content, (SELECT blob_text(b.codec, b.data) FROM blobs b WHERE b.hash = content_blob)) AS content,
+    tool_call_id, model_id, summary_flag, tts_file, user_id
+"""
 
 ## Function to get last N messages 
-def get_last_messages(limit: int = 20):
+def get_last_messages(limit: int = 20, session_id: int = None):
     """
     Returns the last N messages give by timestamp.
     Args:
         limit (int, optional): No of previous message you Need. Defaults to 20.
+        session_id (int, optional): Only messages of this session. Defaults to None (all sessions).
     """
+    if session_id is not None:
+        return get_session_messages(session_id, limit=limit)
+    
     conn = get_connection()
     cursor = conn.cursor()
 
     cursor.execute(
-    """
-    SELECT * 
+    f"""
+    SELECT {CONVERSATION_COLUMNS}
     FROM conversations
     ORDER BY id DESC
     LIMIT ?
@@ -314,9 +944,175 @@ def get_last_messages(limit: int = 20):
     )
     
     row = cursor.fetchall()
-    conn.close()
     return list(reversed(row))
 
+def _role_filter(roles):
+    """
+    Builds the "AND role IN (...)" part of a query and its parameters.
+    """
+    if not roles:
+        return "", []
+    if isinstance(roles, str):
+        roles = [roles]
+    roles = list(roles)
+    return f" AND role IN ({', '.join('?' for _ in roles)})", roles
+
+## Session history, keyset paginated on conversations.id so a page costs the same on page 1 and page 10,000.
+def get_session_messages(session_id: int, limit: int = 20, before_id: int = None, roles=None):
+    """
+    Returns one page of messages of a session in chronological order.
+    Args:
+        session_id (int): Session to read.
+        limit (int, optional): Page size. Defaults to 20.
+        before_id (int, optional): Only messages older than this conversation id, pass the id of the first message
+            of the previous page to get the page before it. Defaults to None (latest messages).
+        roles (list, optional): Only these roles, like ["user", "assistant"]. Defaults to None (all roles).
+    Returns:
+        list: sqlite3.Row objects, oldest first.
+    """
+    conn = get_connection()
+    role_sql, role_params = _role_filter(roles)
+    before_sql = " AND id < ?" if before_id is not None else ""
+    params = [session_id] + ([before_id] if before_id is not None else []) + role_params + [limit]
+    
+    rows = conn.execute(
+        f"""
+        SELECT {CONVERSATION_COLUMNS}
+        FROM conversations
+        WHERE session_id = ?{before_sql}{role_sql}
+        ORDER BY id DESC
+        LIMIT ?
+        """, params
+    ).fetchall()
+    return list(reversed(rows))
+
+def iter_session_messages(session_id: int, roles=None, page_size: int = 200, after_id: int = 0):
+    """
+    Streams every message of a session oldest first, reading page_size rows at a time.
+    Memory use stays at one page however long the session is.
+    Args:
+        session_id (int): Session to read.
+        roles (list, optional): Only these roles. Defaults to None (all roles).
+        page_size (int, optional): Rows fetched per query. Defaults to 200.
+        after_id (int, optional): Start after this conversation id. Defaults to 0 (from the beginning).
+    Yields:
+        sqlite3.Row: One message at a time.
+    """
+    conn = get_connection()
+    role_sql, role_params = _role_filter(roles)
+    last_id = after_id
+    while True:
+        rows = conn.execute(
+            f"""
+            SELECT {CONVERSATION_COLUMNS}
+            FROM conversations
+            WHERE session_id = ? AND id > ?{role_sql}
+            ORDER BY id
+            LIMIT ?
+            """, [session_id, last_id] + role_params + [page_size]
+        ).fetchall()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1]["id"]
+        if len(rows) < page_size:
+            return
+
+def _fts_query(text: str) -> str:
+    """
+    Turns free text into an FTS5 query: every word is quoted so characters like - : * " are never parsed as syntax,
+    words are OR-ed and bm25 ranks rows that match more of them first.
+    """
+    words = re.findall(r"\w+", text)
+    return " OR ".join(f'"{word}"' for word in words)
+
+## Full text search over the whole history
+def search_history(query: str, limit: int = 10, session_id: int = None):
+    """
+    Ranked full text search over user/assistant messages and tool calls (arguments and responses) of tars.db.
+    Archived sessions are not searched: tars_archive.db keeps their text compressed and has no full text index.
+    Args:
+        query (str): Words to look for.
+        limit (int, optional): Maximum number of results. Defaults to 10.
+        session_id (int, optional): Only search this session. Defaults to None (all sessions).
+    Returns:
+        list: Dictionaries with source ('message' or 'tool'), id, session_id, timestamp, role or tool_name,
+        a snippet of the matching text and the bm25 rank (lower is better), best match first.
+    """
+    match = _fts_query(query)
+    if not match:
+        return []
+    
+    conn = get_connection()
+    session_sql = " AND c.session_id = ?" if session_id is not None else ""
+    session_params = [session_id] if session_id is not None else []
+    
+    try:
+        messages = conn.execute(
+            f"""
+            SELECT
+                c.id,
+                c.session_id,
+                c.timestamp,
+                c.role,
+                snippet(conversations_fts, 0, '**', '**', '...', 24) AS snippet,
+                bm25(conversations_fts) AS rank
+            FROM conversations_fts
+            JOIN conversations c ON c.id = conversations_fts.rowid
+            WHERE conversations_fts MATCH ?{session_sql}
+            ORDER BY rank
+            LIMIT ?
+            """, [match] + session_params + [limit]
+        ).fetchall()
+        
+        tool_calls = conn.execute(
+            f"""
+            SELECT
+                t.id,
+                c.session_id,
+                t.timestamp,
+                t.tool_name,
+                snippet(tool_calls_fts, -1, '**', '**', '...', 24) AS snippet,
+                bm25(tool_calls_fts) AS rank
+            FROM tool_calls_fts
+            JOIN tool_calls t ON t.id = tool_calls_fts.rowid
+            LEFT JOIN conversations c ON c.id = t.conversation_id
+            WHERE tool_calls_fts MATCH ?{session_sql}
+            ORDER BY rank
+            LIMIT ?
+            """, [match] + session_params + [limit]
+        ).fetchall()
+    except Exception as e:
+        print(f"Error searching the history: {e}")
+        return []
+    
+    results = [
+        {
+            'source': 'message',
+            'id': row['id'],
+            'session_id': row['session_id'],
+            'timestamp': row['timestamp'],
+            'role': row['role'],
+            'snippet': row['snippet'],
+            'rank': row['rank']
+        }
+        for row in messages
+    ]
+    results += [
+        {
+            'source': 'tool',
+            'id': row['id'],
+            'session_id': row['session_id'],
+            'timestamp': row['timestamp'],
+            'tool_name': row['tool_name'],
+            'snippet': row['snippet'],
+            'rank': row['rank']
+        }
+        for row in tool_calls
+    ]
+    results.sort(key=lambda result: result['rank'])
+    return results[:limit]
+
 ## Saves media files and metadata (For future purpose)
 def save_media_file(conversation_id: int, file_path: str, file_type: str, metadata_json: str = None):
     """
@@ -331,22 +1127,26 @@ def save_media_file(conversation_id: int, file_path: str, file_type: str, metada
     conn = get_connection()
     cur = conn.cursor()
 
-    cur.execute("""
-        INSERT INTO media_files (conversation_id, file_path, file_type, metadata)
-        VALUES (?, ?, ?, ?)
-    """, (conversation_id, file_path, file_type, metadata_json))
-
-    conn.commit()
+    try:
+        cur.execute("""
+            INSERT INTO media_files (conversation_id, file_path, file_type, metadata)
+            VALUES (?, ?, ?, ?)
+        """, (conversation_id, file_path, file_type, metadata_json))
+        _commit(conn)
+    except Exception as e:
+        _rollback(conn)
+        print(f"Error saving the media file: {e}")
+        return None
     mid = cur.lastrowid
-    conn.close()
     return mid
 
-def create_new_session(model_id , title=None):
+def create_new_session(model_id , title=None, user_id=None):
     """
     Creates new session should pass model_id 
     Args:
         model_id (_type_): _description_
         title (_type_, optional): _description_. Defaults to None.
+        user_id (int, optional): User of the session (server.py). Defaults to None.
     Returns:
         session_id (int): The Id of the newly created session.
     """
@@ -356,19 +1156,17 @@ def create_new_session(model_id , title=None):
     try:
         cursor.execute(
         """
-        INSERT INTO sessions (model_id, title, is_active)
-        VALUES (?, ?, 1)
-        """, (model_id, title)
+        INSERT INTO sessions (model_id, title, is_active, user_id)
+        VALUES (?, ?, 1, ?)
+        """, (model_id, title, user_id)
             )
-        conn.commit()
+        _commit(conn)
         session_id = cursor.lastrowid
         return session_id
     except Exception as e:
-        conn.rollback()
+        _rollback(conn)
         print("Error creating the session.")
         return None
-    finally:
-        conn.close()
     
         
 
@@ -405,6 +1203,26 @@ def get_session_by_id(session_id):
         )
         row = cursor.fetchone()
         
+        if row is None and _attach_archive(conn):
+            cursor.execute(
+                """
+                SELECT 
+                    s.id,
+                    s.start_time,
+                    s.end_time,
+                    s.title,
+                    s.message_count,
+                    s.is_active,
+                    m.model_name,
+                    m.provider
+                FROM archive.sessions s
+                LEFT JOIN models m ON s.model_id = m.id
+                WHERE s.id = ?
+                """,
+                (session_id,)
+            )
+            row = cursor.fetchone()
+        
         if row:
             return {
                 'id': row['id'],
@@ -420,13 +1238,12 @@ def get_session_by_id(session_id):
     except Exception as e:
         print(f"Error getting session: {e}")
         return None
-    finally:
-        conn.close()
         
 ## Gets all sessions.
 def get_all_session(limit = 20):
     """
     Get last 20 sessions or for N last sessions if limit is passed.
+    Archived sessions are included when tars_archive.db exists.
     Args:
         limit (int, optional): Maximum number of sessions to return.. Defaults to 20.
     Returns:
@@ -436,8 +1253,13 @@ def get_all_session(limit = 20):
     cursor = conn.cursor()
     
     try:
+        # Columns are listed, the two tables may not have their columns in the same order.
+        columns = "id, start_time, end_time, title, message_count, model_id, is_active, user_id"
+        sessions_sql = f"SELECT {columns} FROM main.sessions"
+        if _attach_archive(conn):
+            sessions_sql += f" UNION ALL SELECT {columns} FROM archive.sessions"
         cursor.execute(
-            """
+            f"""
             SELECT 
                 s.id,
                 s.start_time,
@@ -447,7 +1269,7 @@ def get_all_session(limit = 20):
                 s.is_active,
                 m.model_name,
                 m.provider
-            FROM sessions s
+            FROM ({sessions_sql}) s
             LEFT JOIN models m ON s.model_id = m.id
             ORDER BY s.start_time DESC
             LIMIT ?
@@ -472,8 +1294,6 @@ def get_all_session(limit = 20):
     except Exception as e:
         print(f"Error getting sessions: {e}")
         return []
-    finally:
-        conn.close()
 
 
 def end_session(session_id):
@@ -499,19 +1319,63 @@ def end_session(session_id):
             """,
             (session_id,)
         )
-        conn.commit()
+        _commit(conn)
         return cursor.rowcount > 0
     except Exception as e:
-        conn.rollback()
+        _rollback(conn)
         print(f"Error ending session: {e}")
         return False
-    finally:
-        conn.close()
+
+def reopen_session(session_id):
+    """
+    Marks an ended session active again, for tars.py --resume. Archived sessions can not be reopened.
+    
+    Args:
+        session_id: The ID of the session to reopen
+    
+    Returns:
+        bool: True if the session exists in tars.db, False otherwise
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(
+            """
+            UPDATE sessions
+            SET end_time = NULL,
+                is_active = 1
+            WHERE id = ?
+            """,
+            (session_id,)
+        )
+        _commit(conn)
+        return cursor.rowcount > 0
+    except Exception as e:
+        _rollback(conn)
+        print(f"Error reopening session: {e}")
+        return False
+
+def get_latest_session_id():
+    """
+    The most recent session that has messages, None if there is none.
+    """
+    conn = get_connection()
+    row = conn.execute(
+        """
+        SELECT id FROM sessions
+        WHERE message_count > 0
+        ORDER BY id DESC
+        LIMIT 1
+        """
+    ).fetchone()
+    return row['id'] if row else None
 
 def update_session_messag_Count(session_id):
     """
-    Updates the message count for a session by counting 
+    Recomputes the message count for a session by counting 
     user and assistant messages.
+    The count is normally maintained by triggers on conversations, this is only needed to repair it.
     
     Args:
         session_id: The ID of the session to update
@@ -545,11 +1409,372 @@ def update_session_messag_Count(session_id):
             """,
             (message_count, session_id)
         )
-        conn.commit()
+        _commit(conn)
         return True
     except Exception as e:
-        conn.rollback()
+        _rollback(conn)
         print(f"Error updating message count: {e}")
         return False
-    finally:
-        conn.close()
+
+def repair_session_message_counts():
+    """
+    Recomputes message_count of every session from the conversations table in one statement.
+    One-shot repair for counters that drifted, for example after editing tars.db by hand.
+    Returns:
+        int: Number of sessions updated, -1 on error.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(
+            """
+            UPDATE sessions
+            SET message_count = (
+                SELECT COUNT(*)
+                FROM conversations c
+                WHERE c.session_id = sessions.id
+                AND c.role IN ('user', 'assistant')
+            )
+            """
+        )
+        _commit(conn)
+        return cursor.rowcount
+    except Exception as e:
+        _rollback(conn)
+        print(f"Error repairing message counts: {e}")
+        return -1
+
+def compact_blobs(min_size: int = BLOB_MIN_SIZE, batch_size: int = 500):
+    """
+    Moves inline tool responses of min_size bytes or more, written before the blob store existed, into the blobs table.
+    Runs in batches of batch_size rows, each batch in its own transaction, so it can be interrupted and resumed.
+    Returns:
+        int: Number of rows moved.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    moved = 0
+    
+    for table, text_column, blob_column, where in (
+        ("tool_calls", "response", "response_blob", ""),
+        ("conversations", "content", "content_blob", " AND role = 'tool'"),
+    ):
+        while True:
+            rows = cursor.execute(
+                f"""
+                SELECT id, {text_column} AS text
+                FROM {table}
+                WHERE {blob_column} IS NULL AND length(CAST({text_column} AS BLOB)) >= ?{where}
+                LIMIT ?
+                """, (min_size, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            try:
+                for row in rows:
+                    blob = _put_blob(cursor, row['text'])
+                    cursor.execute(
+                        f"UPDATE {table} SET {text_column} = NULL, {blob_column} = ? WHERE id = ?",
+                        (blob, row['id'])
+                    )
+                _commit(conn)
+            except Exception as e:
+                _rollback(conn)
+                print(f"Error compacting {table}: {e}")
+                return moved
+            moved += len(rows)
+    return moved
+
+def blob_report():
+    """
+    How much space the blob store saves.
+    Returns:
+        dict: blobs (distinct blobs), references (rows pointing to a blob), raw_bytes (size of the text all references
+        would take inline), stored_bytes (compressed size actually stored) and saved_bytes.
+    """
+    conn = get_connection()
+    row = conn.execute(
+        """
+        WITH refs AS (
+            SELECT response_blob AS hash FROM tool_calls WHERE response_blob IS NOT NULL
+            UNION ALL
+            SELECT content_blob AS hash FROM conversations WHERE content_blob IS NOT NULL
+        )
+        SELECT
+            (SELECT COUNT(*) FROM blobs) AS blobs,
+            (SELECT COUNT(*) FROM refs) AS refs,
+            (SELECT COALESCE(SUM(b.raw_size), 0) FROM refs JOIN blobs b ON b.hash = refs.hash) AS raw_bytes,
+            (SELECT COALESCE(SUM(length(data)), 0) FROM blobs) AS stored_bytes
+        """
+    ).fetchone()
+    return {
+        'blobs': row['blobs'],
+        'references': row['refs'],
+        'raw_bytes': row['raw_bytes'],
+        'stored_bytes': row['stored_bytes'],
+        'saved_bytes': row['raw_bytes'] - row['stored_bytes']
+    }
+
+def _attach_archive(conn: Connection, create: bool = False) -> bool:
+    """
+    Attaches tars_archive.db to the connection as the "archive" schema, if it is not attached yet.
+    Args:
+        create (bool, optional): Create the archive database and its tables if they do not exist. Defaults to False.
+    Returns:
+        bool: True if the archive is attached.
+    """
+    if any(row[1] == "archive" for row in conn.execute("PRAGMA database_list;").fetchall()):
+        return True
+    if not create and not os.path.exists(archive_file):
+        return False
+    
+    conn.execute("ATTACH DATABASE ? AS archive;", (archive_file,))
+    if create:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archive.sessions (
+                id INTEGER PRIMARY KEY,
+                start_time DATETIME,
+                end_time DATETIME NULL,
+                title TEXT NULL,
+                message_count INTEGER DEFAULT NULL,
+                model_id INTEGER NULL,
+                is_active BOOLEAN DEFAULT 0,
+                user_id INTEGER NULL
+            );
+            """
+        )
+        ## Every archived message is compressed, content lives in archive.blobs.
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archive.conversations (
+                id INTEGER PRIMARY KEY,
+                session_id INTEGER NOT NULL,
+                timestamp DATETIME,
+                role TEXT NOT NULL,
+                content_blob TEXT NULL,
+                tool_call_id INTEGER NULL,
+                model_id INTEGER NULL,
+                summary_flag BOOLEAN DEFAULT 0,
+                tts_file TEXT NULL,
+                user_id INTEGER NULL
+            );
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archive.tool_calls (
+                id INTEGER PRIMARY KEY,
+                tool_name TEXT NOT NULL,
+                arguments TEXT NULL,
+                response_blob TEXT NULL,
+                timestamp DATETIME,
+                conversation_id INTEGER NULL
+            );
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archive.blobs (
+                hash TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                raw_size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                created_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+            );
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_conversations_session_id ON conversations(session_id, id);")
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_tool_calls_conversation_id ON tool_calls(conversation_id);")
+    # Archives made before server.py sessions had an owner.
+    _add_column(conn, "sessions", "user_id", "INTEGER NULL", schema="archive")
+    conn.commit()
+    return True
+
+def _archive_blob(cursor, text, blob):
+    """
+    Returns the archive.blobs key for a value that is either inline text or a key of main.blobs.
+    """
+    if blob is not None:
+        cursor.execute("INSERT OR IGNORE INTO archive.blobs SELECT * FROM main.blobs WHERE hash = ?;", (blob,))
+        return blob
+    if text is None:
+        return None
+    return _put_blob(cursor, text, schema="archive")
+
+def _archive_session(cursor, session_id: int) -> int:
+    """
+    Copies one session with its messages and tool calls into the archive and deletes it from the live database.
+    Runs inside the caller's transaction. The archive inserts are INSERT OR REPLACE, so a session copied by an
+    interrupted run is simply copied again.
+    Returns:
+        int: Number of messages moved.
+    """
+    cursor.execute(
+        """
+        INSERT OR REPLACE INTO archive.sessions (id, start_time, end_time, title, message_count, model_id, is_active, user_id)
+        SELECT id, start_time, end_time, title, message_count, model_id, is_active, user_id FROM main.sessions WHERE id = ?;
+        """, (session_id,)
+    )
+    
+    rows = cursor.execute("SELECT * FROM main.conversations WHERE session_id = ?;", (session_id,)).fetchall()
+    for row in rows:
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO archive.conversations
+            (id, session_id, timestamp, role, content_blob, tool_call_id, model_id, summary_flag, tts_file, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                row['id'], row['session_id'], row['timestamp'], row['role'],
+                _archive_blob(cursor, row['content'], row['content_blob']),
+                row['tool_call_id'], row['model_id'], row['summary_flag'], row['tts_file'], row['user_id']
+            )
+        )
+    
+    tool_calls = cursor.execute(
+        """
+        SELECT * FROM main.tool_calls
+        WHERE conversation_id IN (SELECT id FROM main.conversations WHERE session_id = ?)
+        OR id IN (SELECT tool_call_id FROM main.conversations WHERE session_id = ? AND tool_call_id IS NOT NULL)
+        """, (session_id, session_id)
+    ).fetchall()
+    for row in tool_calls:
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO archive.tool_calls (id, tool_name, arguments, response_blob, timestamp, conversation_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                row['id'], row['tool_name'], row['arguments'],
+                _archive_blob(cursor, row['response'], row['response_blob']),
+                row['timestamp'], row['conversation_id']
+            )
+        )
+        cursor.execute("DELETE FROM main.tool_calls WHERE id = ?;", (row['id'],))
+    
+    # Spans are only kept for the /stats of recent sessions, they are not archived.
+    cursor.execute("DELETE FROM main.spans WHERE session_id = ?;", (session_id,))
+    # Archived sessions can not be resumed, their summaries are not needed anymore.
+    cursor.execute("DELETE FROM main.summaries WHERE session_id = ?;", (session_id,))
+    cursor.execute("DELETE FROM main.conversations WHERE session_id = ?;", (session_id,))
+    cursor.execute("DELETE FROM main.sessions WHERE id = ?;", (session_id,))
+    return len(rows)
+
+def archive_sessions(older_than_days: int = ARCHIVE_AFTER_DAYS):
+    """
+    Moves ended sessions (is_active = 0) older than older_than_days into tars_archive.db, compressed,
+    then returns the freed pages of tars.db to the file system with PRAGMA incremental_vacuum.
+    Databases created before archiving existed have no incremental auto vacuum, their freed pages are reused
+    by new rows instead until enable_incremental_vacuum() converted them (python db.py vacuum). This never
+    runs a VACUUM itself, it may run in the background while Tars is in use.
+    Archived sessions are still listed by get_all_session() and get_session_by_id(), search_history() does not find them.
+    Args:
+        older_than_days (int, optional): Minimum age of a session, counted from its end. Defaults to ARCHIVE_AFTER_DAYS.
+    Returns:
+        dict: sessions and messages archived, and pages freed.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    report = {'sessions': 0, 'messages': 0, 'pages_freed': 0}
+    
+    _attach_archive(conn, create=True)
+    
+    session_ids = [
+        row['id'] for row in cursor.execute(
+            """
+            SELECT id FROM main.sessions
+            WHERE is_active = 0
+            AND COALESCE(end_time, start_time) < strftime('%Y-%m-%d %H:%M:%f', 'now', ?)
+            ORDER BY id
+            """, (f"-{int(older_than_days)} days",)
+        ).fetchall()
+    ]
+    
+    # One transaction per session keeps the write lock short for other Tars processes.
+    for session_id in session_ids:
+        try:
+            report['messages'] += _archive_session(cursor, session_id)
+            _commit(conn)
+            report['sessions'] += 1
+        except Exception as e:
+            _rollback(conn)
+            print(f"Error archiving session {session_id}: {e}")
+            break
+    
+    if report['sessions']:
+        # Blobs that were only referenced by archived rows.
+        try:
+            cursor.execute(
+                """
+                DELETE FROM main.blobs
+                WHERE hash NOT IN (SELECT response_blob FROM main.tool_calls WHERE response_blob IS NOT NULL)
+                AND hash NOT IN (SELECT content_blob FROM main.conversations WHERE content_blob IS NOT NULL)
+                """
+            )
+            _commit(conn)
+        except Exception as e:
+            _rollback(conn)
+            print(f"Error deleting archived blobs: {e}")
+    
+    if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] != 2:
+        return report
+    free_pages = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+    # executescript steps the pragma to completion, execute() would free a single page.
+    conn.executescript("PRAGMA incremental_vacuum;")
+    report['pages_freed'] = free_pages - conn.execute("PRAGMA freelist_count;").fetchone()[0]
+    return report
+
+def enable_incremental_vacuum():
+    """
+    Switches a database created before archiving existed to incremental auto vacuum, so archive_sessions() can
+    return freed pages to the file system. Needs one full VACUUM, which rewrites tars.db and locks it for as long
+    as that takes: run it by hand (python db.py vacuum) while Tars is not running.
+    Returns:
+        bool: True if the database was converted, False if it already was.
+    """
+    conn = get_connection()
+    if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2:
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+    conn.execute("VACUUM;")
+    return True
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Tars database maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    repair = commands.add_parser("repair-counts", help="Recompute sessions.message_count from the conversations table.")
+    repair.add_argument("--session", type=int, default=None, help="Only repair this session id.")
+    compact = commands.add_parser("compact-blobs", help="Move large inline tool responses into the compressed blob store and report the savings.")
+    compact.add_argument("--min-size", type=int, default=BLOB_MIN_SIZE, help="Smallest response in bytes that is moved.")
+    archive = commands.add_parser("archive", help="Move ended sessions into tars_archive.db and shrink tars.db.")
+    archive.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="Archive sessions that ended more than this many days ago.")
+    commands.add_parser("vacuum", help="Convert an older tars.db to incremental auto vacuum (one full VACUUM, run it while Tars is not running).")
+    args = parser.parse_args()
+    
+    create_tables()
+    if args.command == "repair-counts":
+        if args.session is not None:
+            ok = update_session_messag_Count(args.session)
+            print(f"Session {args.session} repaired." if ok else f"Could not repair session {args.session}.")
+        else:
+            print(f"Repaired message counts of {repair_session_message_counts()} sessions.")
+    elif args.command == "compact-blobs":
+        size_before = os.path.getsize(db_file)
+        print(f"Moved {compact_blobs(args.min_size)} rows into the blob store.")
+        report = blob_report()
+        print(f"{report['references']} rows reference {report['blobs']} blobs ({BLOB_CODEC}).")
+        print(f"Text {report['raw_bytes'] / 1024:.1f} KiB -> stored {report['stored_bytes'] / 1024:.1f} KiB, saved {report['saved_bytes'] / 1024:.1f} KiB.")
+        print(f"tars.db is {size_before / 1024:.1f} KiB, freed pages are reused by new rows (VACUUM returns them to the file system).")
+    elif args.command == "archive":
+        report = archive_sessions(args.days)
+        print(f"Archived {report['sessions']} sessions ({report['messages']} messages), freed {report['pages_freed']} pages.")
+        if get_connection().execute("PRAGMA auto_vacuum;").fetchone()[0] != 2:
+            print("Freed pages are reused by new rows, run python db.py vacuum once to return them to the file system.")
+    elif args.command == "vacuum":
+        size_before = os.path.getsize(db_file)
+        if enable_incremental_vacuum():
+            print(f"tars.db converted to incremental auto vacuum, {size_before / 1024:.1f} KiB -> {os.path.getsize(db_file) / 1024:.1f} KiB.")
+        else:
+            print("tars.db already uses incremental auto vacuum.")
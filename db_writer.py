@@ -0,0 +1,174 @@
+import atexit
+import queue
+import threading
+from concurrent.futures import Future
+import db
+import tracing
+
+## Write-behind persistence: save_* calls are queued and written by one background thread,
+## several calls are grouped into a single transaction so a turn costs one commit instead of one per row.
+
+## Maximum number of queued calls written in one transaction.
+BATCH_SIZE = 64
+
+_queue = queue.Queue()
+_thread = None
+_STOP = object()
+
+
+class _Job:
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class _Flush:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+def _resolve(value, results, errors):
+    """
+    Replace a Future returned by an earlier submit() with its value.
+    Futures of the batch being written are not resolved yet, their values are taken from results, and the
+    exception of a failed earlier job is raised again so the job depending on it fails too instead of waiting.
+    """
+    if isinstance(value, Future):
+        if id(value) in results:
+            return results[id(value)]
+        if id(value) in errors:
+            raise errors[id(value)]
+        return value.result()
+    return value
+
+
+def _run(job, results, errors):
+    args = [_resolve(arg, results, errors) for arg in job.args]
+    kwargs = {key: _resolve(value, results, errors) for key, value in job.kwargs.items()}
+    if job.func is db.save_spans:
+        return job.func(*args, **kwargs)
+    with tracing.span("db", job.func.__name__):
+        return job.func(*args, **kwargs)
+
+
+def _write_batch(jobs):
+    """
+    Writes jobs in one transaction. Every job gets its own savepoint so one failing call does not drop the others.
+    """
+    results = {}
+    errors = {}
+    try:
+        with db.batch():
+            for job in jobs:
+                try:
+                    with db.batch_item():
+                        results[id(job.future)] = _run(job, results, errors)
+                except Exception as e:
+                    errors[id(job.future)] = e
+    except Exception as e:
+        for job in jobs:
+            if not job.future.done():
+                job.future.set_exception(e)
+        return
+
+    for job in jobs:
+        if id(job.future) in errors:
+            job.future.set_exception(errors[id(job.future)])
+        else:
+            job.future.set_result(results[id(job.future)])
+
+
+def _writer():
+    while True:
+        item = _queue.get()
+        pending = [item]
+        # Drain whatever queued up while the last batch was written (group commit).
+        while len(pending) < BATCH_SIZE:
+            try:
+                pending.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        jobs = []
+        for item in pending:
+            if isinstance(item, _Job):
+                jobs.append(item)
+                continue
+            # Flush markers and the stop marker are handled after everything queued before them is written.
+            if jobs:
+                _write_batch(jobs)
+                jobs = []
+            if isinstance(item, _Flush):
+                item.done.set()
+            elif item is _STOP:
+                db.close_connection()
+                return
+        if jobs:
+            _write_batch(jobs)
+
+
+def start_writer():
+    """
+    Starts the background writer thread. Until this is called submit() writes synchronously.
+    """
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _thread = threading.Thread(target=_writer, name="tars-db-writer", daemon=True)
+    _thread.start()
+
+
+def is_running():
+    return _thread is not None and _thread.is_alive()
+
+
+def submit(func, *args, **kwargs) -> Future:
+    """
+    Queue a db.py write like submit(save_user_message, text, session_id).
+    Arguments may be Futures returned by earlier submit() calls, for example the tool_call_id for save_tool_response,
+    they are resolved by the writer before the call runs.
+    Args:
+        func: The db.py function to call.
+    Returns:
+        Future: resolves to the return value of func (a row id for the save_* functions).
+    """
+    job = _Job(func, args, kwargs)
+    if not is_running():
+        try:
+            job.future.set_result(_run(job, {}, {}))
+        except Exception as e:
+            job.future.set_exception(e)
+        return job.future
+    _queue.put(job)
+    return job.future
+
+
+def flush(timeout=None):
+    """
+    Blocks until every write submitted before this call is committed.
+    Returns:
+        bool: False if the timeout expired first.
+    """
+    if not is_running():
+        return True
+    marker = _Flush()
+    _queue.put(marker)
+    return marker.done.wait(timeout)
+
+
+def stop_writer(timeout=10):
+    """
+    Flushes the queue and stops the writer thread. Safe to call more than once.
+    """
+    global _thread
+    if not is_running():
+        return
+    _queue.put(_STOP)
+    _thread.join(timeout)
+    _thread = None
+
+
+## Runs before db.close_connections() (atexit is last in, first out) so queued rows are never lost on exit.
+atexit.register(stop_writer)
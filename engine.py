@@ -0,0 +1,361 @@
+import asyncio
+import inspect
+import json
+import os
+import time
+from functools import partial
+from groq.types.chat import ChatCompletionMessage
+import db_writer
+import llm_cache
+import tracing
+from db import (
+    save_user_message,
+    save_assistant_message,
+    save_tool_call,
+    save_tool_response,
+    get_or_create_model,
+    create_new_session,
+    end_session
+)
+from supporter import available_functions, SYSTEM_PROMPT
+from context_window import fit_context
+from config import get_config
+from llm_client import make_async_client
+from tool_results import shape_result, result_limit, last_user_message
+from tool_router import route_tools, widen_tools
+
+tools_file = os.path.join(os.path.dirname(__file__), "tools.json")
+
+def load_tools(path: str = tools_file):
+    """
+    Tool schemas sent to the model.
+    """
+    with open(path, "r") as f:
+        return json.load(f)
+
+def run_tool(f_to_call, f_args: dict) -> str:
+    """
+    Runs a tool and turns its result into the text the model gets back.
+    Returns:
+        str: The tool response, dicts and lists as JSON. Errors are returned as text for the model.
+    """
+    try:
+        function_response = f_to_call(**f_args)
+    except TypeError as e:
+        function_response = f"Error: Invalid arguments passed for the function {e}"
+    except Exception as e:
+        function_response = f"Error: An exception occurred {e}"
+    return format_tool_response(function_response)
+
+def format_tool_response(function_response) -> str:
+    # Compact single encoding, indentation and escaped quotes only cost tokens.
+    if isinstance(function_response, (dict, list)):
+        return json.dumps(function_response, ensure_ascii=False, separators=(",", ":"))
+    return str(function_response)
+
+def parse_arguments(arguments: str) -> dict:
+    """
+    The arguments JSON of a tool call, {} when it is missing or not an object.
+    """
+    if not arguments:
+        return {}
+    try:
+        parsed = json.loads(arguments)
+    except Exception:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+class StreamAssembler:
+    """
+    Builds the assistant message from the chunks of a streamed response.
+    tool_calls arrive in fragments (the arguments JSON is split over many chunks), they are joined by their index.
+    """
+    def __init__(self):
+        self.content = ""
+        self.tool_calls = {}
+
+    def add(self, chunk) -> str:
+        """
+        Adds one chunk.
+        Returns:
+            str: The new content text of this chunk, "" if it had none.
+        """
+        if not chunk.choices:
+            return ""
+        delta = chunk.choices[0].delta
+        for fragment in delta.tool_calls or []:
+            call = self.tool_calls.setdefault(fragment.index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+            if fragment.id:
+                call["id"] = fragment.id
+            if fragment.function:
+                if fragment.function.name:
+                    call["function"]["name"] += fragment.function.name
+                if fragment.function.arguments:
+                    call["function"]["arguments"] += fragment.function.arguments
+        if delta.content:
+            self.content += delta.content
+            return delta.content
+        return ""
+
+    def message(self) -> ChatCompletionMessage:
+        """
+        The complete message, same type as the message of a non streamed response.
+        """
+        message = {"role": "assistant", "content": self.content or None}
+        if self.tool_calls:
+            message["tool_calls"] = [self.tool_calls[index] for index in sorted(self.tool_calls)]
+        return ChatCompletionMessage.model_validate(message)
+
+
+class TarsEngine:
+    """
+    asyncio conversation engine, the turn loop of main.get_ai / main.tool_calling for one conversation.
+    All conversation state (messages, session, last user message id) lives on the instance, so one process can
+    run many engines side by side on one event loop.
+    Tools that are coroutine functions are awaited, blocking tools run in an executor.
+
+    Usage:
+        engine = TarsEngine()
+        await engine.start_session()
+        reply = await engine.turn("What's the weather in Tokyo?")
+        await engine.end()
+    """
+    def __init__(self, client=None, model=None, model_id=None, tools=None, functions=None, executor=None, max_parallel_tools=None, stream=False, max_context_tokens=None, result_limits=None, cache=None,
+                 max_rounds=None, turn_timeout=None, route_tools=None):
+        """
+        Limits that are not given come from settings.toml (config.get_config()) when the engine is created.
+        Args:
+            client (AsyncGroq, optional): Shared client, a retrying llm_client one is created from the .env settings if not given.
+            model (str, optional): Model name. Defaults to the "model" value of .env.
+            model_id (int, optional): Row of the models table, looked up from model if not given.
+            tools (list, optional): Tool schemas. Defaults to tools.json.
+            functions (dict, optional): Tool name to function. Defaults to supporter.available_functions.
+            executor (Executor, optional): Where blocking tools and db writes run. Defaults to the loop's default executor.
+            max_parallel_tools (int, optional): Tools of one model turn that may run at the same time. [general] max_parallel_tools.
+            stream (bool, optional): Stream responses, deltas are passed to the on_delta callback of turn(). Defaults to False.
+            max_context_tokens (int, optional): Token budget of a request, older turns are condensed or dropped to fit it. [context] max_tokens.
+            result_limits (dict, optional): Token caps of tool results sent to the model. [tool_results].
+            cache (bool, optional): Answer repeated requests from the llm_cache completion cache. [cache] enabled.
+            max_rounds (int, optional): Tool rounds per turn before a final answer is forced. [agent] max_rounds.
+            turn_timeout (float, optional): Seconds per turn including tools, tools still running then are given up on. [agent] turn_timeout.
+            route_tools (bool, optional): Send only the tools relevant to the message, see tool_router. [router] enabled.
+        """
+        self.client = client or make_async_client()
+        self.model = model or os.getenv("model")
+        self.model_id = model_id if model_id is not None else get_or_create_model(provider="groq", model_name=self.model)
+        self.tools = tools if tools is not None else load_tools()
+        self.functions = functions if functions is not None else available_functions
+        self.executor = executor
+        config = get_config()
+        self.max_parallel_tools = max_parallel_tools or config.general.max_parallel_tools
+        self.stream = stream
+        self.max_context_tokens = max_context_tokens or config.context.max_tokens
+        self.last_context = None
+        self.result_limits = result_limits if result_limits is not None else config.tool_results
+        self.cache = cache if cache is not None else config.cache.enabled
+        if self.cache:
+            llm_cache.configure(**vars(config.cache))
+        self.max_rounds = max_rounds or config.agent.max_rounds
+        self.turn_timeout = turn_timeout or config.agent.turn_timeout
+        self.route_tools = route_tools if route_tools is not None else config.router.enabled
+        self.messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        self.session_id = None
+        self.user_id = None
+        self.user_conversation_id = None
+
+    async def _blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def _persist(self, func, *args, **kwargs):
+        """
+        Logs to the db. With the background writer running this only queues the write.
+        Returns:
+            Future: Resolves to the row id, can be passed to later _persist calls.
+        """
+        if db_writer.is_running():
+            return db_writer.submit(func, *args, **kwargs)
+        return await self._blocking(db_writer.submit, func, *args, **kwargs)
+
+    async def _persist_spans(self):
+        if db_writer.is_running():
+            tracing.flush_spans()
+        else:
+            await self._blocking(tracing.flush_spans)
+
+    def _span(self, stage, name=None):
+        """
+        Tracing span of this engine's current turn, engines share no turn state with each other.
+        """
+        return tracing.span(stage, name, self.session_id, self.user_conversation_id)
+
+    async def start_session(self, title=None, user_id=None):
+        self.user_id = user_id
+        self.session_id = await self._blocking(create_new_session, self.model_id, title, user_id)
+        return self.session_id
+
+    async def end(self):
+        if self.session_id is not None:
+            await self._persist(end_session, self.session_id)
+
+    async def _complete(self, on_delta=None, tool_choice="auto"):
+        """
+        One chat completion request, fitted to the token budget. Token usage is kept in last_context.
+        With cache on a request answered before is served from llm_cache.
+        Returns:
+            ChatCompletionMessage: The assistant message of the response.
+        """
+        tools = self.tools
+        if tools and self.route_tools:
+            router = get_config().router
+            tools = route_tools(self.messages, self.tools, last_user_message(self.messages), router.core, router.sticky_turns, router.lexical_tools)
+        self.last_context = fit_context(self.messages, tools, self.max_context_tokens)
+        kwargs = dict(messages=self.messages, model=self.model, tools=tools, tool_choice=tool_choice, stop=None)
+        key = llm_cache.request_key(**kwargs) if self.cache else None
+        if key:
+            cached = await self._blocking(llm_cache.get, key)
+            if cached is not None:
+                if cached.content and on_delta and self.stream:
+                    await self._deliver(on_delta, cached.content)
+                return cached
+
+        with self._span("llm", self.model):
+            try:
+                message = await self._request(kwargs, on_delta)
+            except Exception as e:
+                # The model called a tool the router left out, it is offered and the request sent once more.
+                widened = widen_tools(e, tools, self.tools) if tools else None
+                if widened is None:
+                    raise
+                kwargs["tools"] = widened
+                key = llm_cache.request_key(**kwargs) if self.cache else None
+                message = await self._request(kwargs, on_delta)
+
+        if key:
+            await self._blocking(llm_cache.put, key, self.model, message)
+        return message
+
+    async def _request(self, kwargs, on_delta):
+        if not self.stream:
+            response = await self.client.chat.completions.create(stream=False, **kwargs)
+            return response.choices[0].message
+        assembler = StreamAssembler()
+        async for chunk in await self.client.chat.completions.create(stream=True, **kwargs):
+            text = assembler.add(chunk)
+            if text and on_delta:
+                await self._deliver(on_delta, text)
+        return assembler.message()
+
+    async def _deliver(self, on_delta, text):
+        result = on_delta(text)
+        if inspect.isawaitable(result):
+            await result
+
+    async def _run_tool(self, semaphore, function_name, f_args):
+        f_to_call = self.functions[function_name]
+        async with semaphore:
+            with self._span("tool", function_name):
+                if inspect.iscoroutinefunction(f_to_call):
+                    try:
+                        return format_tool_response(await f_to_call(**f_args))
+                    except TypeError as e:
+                        return f"Error: Invalid arguments passed for the function {e}"
+                    except Exception as e:
+                        return f"Error: An exception occurred {e}"
+                return await self._blocking(run_tool, f_to_call, f_args)
+
+    async def _tool_calling(self, message, seen, deadline):
+        """
+        Runs all tool calls of a message concurrently and appends the results in the order they were requested.
+        The model gets results shaped to their token cap, the db the full ones.
+        Calls already made this turn (seen) reuse their task, tools still running at the deadline are given up on.
+        """
+        self.messages.append(message)
+        semaphore = asyncio.Semaphore(self.max_parallel_tools)
+        calls = []
+        for tool_call in message.tool_calls:
+            function_name = tool_call.function.name
+            if function_name not in self.functions:
+                calls.append((tool_call, function_name, None, None))
+                continue
+            f_args = parse_arguments(tool_call.function.arguments)
+            tool_call_id = await self._persist(
+                save_tool_call,
+                tool_name=function_name,
+                arguments_json=json.dumps(f_args),
+                session_id=self.session_id,
+                trigger_conversation_id=self.user_conversation_id
+            )
+            calls.append((tool_call, function_name, f_args, tool_call_id))
+
+        async def not_found(function_name):
+            return json.dumps({"error": f"Function {function_name} not found"})
+
+        loop = asyncio.get_running_loop()
+
+        async def result(function_name, f_args):
+            if f_args is None:
+                return await not_found(function_name)
+            key = (function_name, json.dumps(f_args, sort_keys=True))
+            if key not in seen:
+                seen[key] = asyncio.ensure_future(self._run_tool(semaphore, function_name, f_args))
+            try:
+                # shield, a task shared with a later duplicate call must not be cancelled by this timeout
+                return await asyncio.wait_for(asyncio.shield(seen[key]), max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                return f"Error: {function_name} did not finish within the time limit of this turn"
+
+        results = await asyncio.gather(*[result(function_name, f_args) for _, function_name, f_args, _ in calls])
+
+        question = last_user_message(self.messages)
+        for (tool_call, function_name, f_args, tool_call_id), function_response in zip(calls, results):
+            if f_args is None:
+                self.messages.append({"role": "tool", "tool_call_id": tool_call.id, "name": function_name, "content": function_response})
+                continue
+            self.messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "name": function_name,
+                "content": shape_result(function_response, question, result_limit(function_name, self.result_limits))
+            })
+            await self._persist(save_tool_response, tool_call_id, function_response, self.session_id, self.model_id)
+
+    async def turn(self, user_input: str, on_delta=None) -> str:
+        """
+        Answers one user message, running tool rounds until the model answers, at most max_rounds of them
+        and within turn_timeout, after that the model is asked for a final answer with tool_choice="none".
+        Args:
+            user_input (str): The user's message.
+            on_delta (callable, optional): Called (or awaited) with each streamed piece of text when stream is on.
+        Returns:
+            str: The final reply.
+        """
+        start_length = len(self.messages)
+        self.messages.append({"role": "user", "content": user_input})
+        self.user_conversation_id = await self._persist(save_user_message, user_input, self.session_id, user_id=self.user_id, model_id=self.model_id)
+        started_at, start = time.time(), time.perf_counter()
+
+        deadline = asyncio.get_running_loop().time() + self.turn_timeout
+        seen = {}
+        rounds = 0
+        try:
+            message = await self._complete(on_delta)
+            while message.tool_calls:
+                await self._tool_calling(message, seen, deadline)
+                rounds += 1
+                if rounds >= self.max_rounds or asyncio.get_running_loop().time() >= deadline:
+                    message = await self._complete(on_delta, tool_choice="none")
+                    break
+                message = await self._complete(on_delta)
+        except BaseException:
+            # A failed (or cancelled) turn is taken back, the next one starts from the last complete turn.
+            del self.messages[start_length:]
+            raise
+
+        final_text = message.content or ""
+        self.messages.append({"role": "assistant", "content": final_text})
+        await self._persist(save_assistant_message, final_text, self.session_id, model_id=self.model_id)
+        if tracing.enabled():
+            tracing.record("turn", None, started_at, (time.perf_counter() - start) * 1000, True, self.session_id, self.user_conversation_id)
+            await self._persist_spans()
+        return final_text
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from groq.types.chat import ChatCompletionMessage
+
+## Opt-in completion cache: a request that was answered before (same model, messages and tools) is answered
+## from tars_cache.db instead of calling Groq again. Off unless [cache] enabled is set in settings.toml.
+
+cache_file = os.path.join(os.path.dirname(__file__), "tars_cache.db")
+## Entries older than this are never returned.
+TTL_SECONDS = 24 * 3600
+## Least recently used entries are evicted above either limit.
+MAX_ENTRIES = 1000
+MAX_BYTES = 50 * 1024 * 1024
+## A request that contains a result of one of these tools is never cached, the same question can have a new answer.
+TIME_SENSITIVE_TOOLS = {
+    "get_datetime",
+    "get_dt_by_place",
+    "get_weather",
+    "get_news",
+    "news_search",
+    "web_search",
+    "sptest",
+    "list_files_in_directory",
+    "list_files_by_types",
+    "recursive_file_search",
+    "read_file_content",
+    "manage_memory",
+    "search_history",
+}
+
+_conn = None
+_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0, "bypassed": 0, "evicted": 0}
+
+
+def _get_connection():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(cache_file, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode = WAL;")
+        _conn.execute("PRAGMA synchronous = NORMAL;")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions(last_used)")
+        _conn.commit()
+    return _conn
+
+
+def configure(enabled=None, ttl_hours=None, max_entries=None, max_mb=None, bypass_tools=None, **_):
+    """
+    Applies the [cache] settings. Unknown keys are ignored so the settings table can be passed as it is.
+    """
+    global TTL_SECONDS, MAX_ENTRIES, MAX_BYTES, TIME_SENSITIVE_TOOLS
+    if ttl_hours is not None:
+        TTL_SECONDS = float(ttl_hours) * 3600
+    if max_entries is not None:
+        MAX_ENTRIES = int(max_entries)
+    if max_mb is not None:
+        MAX_BYTES = int(float(max_mb) * 1024 * 1024)
+    if bypass_tools is not None:
+        TIME_SENSITIVE_TOOLS = set(bypass_tools)
+
+
+def _normalize(message) -> dict:
+    """
+    The parts of a message that decide the answer. tool_call ids are random per response, they are left out,
+    tool results are matched to their call by position anyway.
+    """
+    if not isinstance(message, dict):
+        message = message.model_dump(exclude_none=True)
+    normalized = {"role": message.get("role"), "content": (message.get("content") or "").strip()}
+    if message.get("name"):
+        normalized["name"] = message["name"]
+    if message.get("tool_calls"):
+        normalized["tool_calls"] = [
+            [call["function"]["name"], call["function"].get("arguments") or ""] for call in message["tool_calls"]
+        ]
+    return normalized
+
+
+def request_key(messages, model, tools=None, tool_choice=None, **_):
+    """
+    Cache key of a chat completion request, or None if it must not be cached.
+    Args:
+        messages (list): The request messages.
+        model (str): Model name.
+        tools (list, optional): Tool schemas of the request.
+    Returns:
+        str | None: sha256 hex digest, None if a message is a result of a time sensitive tool.
+    """
+    normalized = [_normalize(message) for message in messages]
+    if any(message["role"] == "tool" and message.get("name") in TIME_SENSITIVE_TOOLS for message in normalized):
+        with _lock:
+            stats["bypassed"] += 1
+        return None
+    payload = json.dumps(
+        {"model": model, "messages": normalized, "tools": tools or [], "tool_choice": tool_choice},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key):
+    """
+    Returns:
+        ChatCompletionMessage | None: The cached assistant message, None on a miss or an expired entry.
+    """
+    now = time.time()
+    with _lock:
+        conn = _get_connection()
+        row = conn.execute("SELECT response, created FROM completions WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > TTL_SECONDS:
+            if row is not None:
+                conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                conn.commit()
+            stats["misses"] += 1
+            return None
+        conn.execute("UPDATE completions SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        conn.commit()
+        stats["hits"] += 1
+    return ChatCompletionMessage.model_validate_json(row[0])
+
+
+def put(key, model, message):
+    """
+    Stores the assistant message of a request and evicts the least recently used entries above the limits.
+    """
+    response = message.model_dump_json(exclude_none=True)
+    now = time.time()
+    with _lock:
+        conn = _get_connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO completions (key, model, response, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, response, len(response), now, now)
+        )
+        _evict(conn)
+        conn.commit()
+
+
+def _evict(conn):
+    conn.execute("DELETE FROM completions WHERE created < ?", (time.time() - TTL_SECONDS,))
+    count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+    if count <= MAX_ENTRIES and size <= MAX_BYTES:
+        return
+    removed = 0
+    for key, entry_size in conn.execute("SELECT key, size FROM completions ORDER BY last_used").fetchall():
+        if count <= MAX_ENTRIES and size <= MAX_BYTES:
+            break
+        conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+        count -= 1
+        size -= entry_size
+        removed += 1
+    stats["evicted"] += removed
+
+
+def clear():
+    with _lock:
+        conn = _get_connection()
+        conn.execute("DELETE FROM completions")
+        conn.commit()
+
+
+def report() -> str:
+    with _lock:
+        count, size = _get_connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+    lookups = stats["hits"] + stats["misses"]
+    rate = f"{stats['hits'] / lookups:.0%}" if lookups else "-"
+    return (
+        f"cache {stats['hits']} hits, {stats['misses']} misses ({rate}), {stats['bypassed']} bypassed, "
+        f"{count} entries, {size / 1024:.1f} KiB"
+    )
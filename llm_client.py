@@ -0,0 +1,262 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import httpx
+import groq
+from groq import Groq, AsyncGroq, DefaultAsyncHttpxClient
+from config import get_config
+
+## Resilient Groq client: main.client and TarsEngine make their requests through this instead of a bare Groq client.
+## - every request has a timeout,
+## - rate limits, 5xx answers, timeouts and connection errors are retried with jittered exponential backoff,
+##   a retry-after header from Groq is honoured,
+## - on 429/5xx the request moves to the fallback model from .env (fallback_model) if one is set,
+## - optionally a second identical request is sent when the first is slower than the usual (hedging).
+## .env groq_base_url points the client at another OpenAI compatible server, for example benchmarks/fake_groq.py.
+
+## Latencies of recent successful requests, hedging waits for their [llm] hedge_percentile.
+_latencies = deque(maxlen=200)
+_latencies_lock = threading.Lock()
+stats = {"requests": 0, "retries": 0, "fallbacks": 0, "hedged": 0, "hedge_wins": 0, "failures": 0}
+
+
+def _retryable(error) -> bool:
+    if isinstance(error, (groq.APITimeoutError, groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)):
+        return True
+    return isinstance(error, groq.APIStatusError) and error.status_code >= 500
+
+
+def _moves_to_fallback(error) -> bool:
+    return isinstance(error, groq.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def _retry_after(error):
+    """
+    Seconds Groq asked to wait, from the retry-after (seconds or HTTP date) or retry-after-ms header.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        try:
+            from email.utils import parsedate_to_datetime
+            return max(0.0, parsedate_to_datetime(headers["retry-after"]).timestamp() - time.time())
+        except Exception:
+            return None
+    return None
+
+
+def backoff_delay(attempt: int, retry_after=None) -> float:
+    """
+    Seconds to wait before retry number attempt (1 based): full jitter exponential backoff,
+    never less than what retry-after asked for and never more than [llm] backoff_max.
+    """
+    llm = get_config().llm
+    delay = random.uniform(0, min(llm.backoff_max, llm.backoff_base * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, llm.backoff_max))
+    return delay
+
+
+def hedge_delay():
+    """
+    Seconds after which a hedged request is sent, None when hedging is off or there are too few samples yet.
+    """
+    llm = get_config().llm
+    if not llm.hedge:
+        return None
+    with _latencies_lock:
+        if len(_latencies) < llm.hedge_min_samples:
+            return None
+        ordered = sorted(_latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * llm.hedge_percentile / 100))]
+
+
+def _record(seconds):
+    with _latencies_lock:
+        _latencies.append(seconds)
+
+
+class _Retry:
+    """
+    Retry state of one request.
+    """
+    def __init__(self, kwargs):
+        self.kwargs = kwargs
+        self.attempt = 0
+        self.max_retries = get_config().llm.max_retries
+        self.fallback = os.getenv("fallback_model")
+
+    def after(self, error) -> float:
+        """
+        Prepares the next attempt after error.
+        Returns:
+            float: Seconds to wait before it. Raises error again when it is not retried.
+        """
+        if not _retryable(error) or self.attempt >= self.max_retries:
+            stats["failures"] += 1
+            raise error
+        self.attempt += 1
+        stats["retries"] += 1
+        if self.fallback and self.kwargs.get("model") != self.fallback and _moves_to_fallback(error):
+            # The fallback model has its own rate limits, it is tried right away.
+            self.kwargs = {**self.kwargs, "model": self.fallback}
+            stats["fallbacks"] += 1
+            return 0.0
+        return backoff_delay(self.attempt, _retry_after(error))
+
+
+class _Completions:
+    def __init__(self, client):
+        self._client = client
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tars-hedge")
+
+    def _once(self, kwargs):
+        start = time.monotonic()
+        response = self._client.chat.completions.create(**kwargs)
+        if not kwargs.get("stream"):
+            _record(time.monotonic() - start)
+        return response
+
+    def _hedged(self, kwargs, delay):
+        first = self._pool.submit(self._once, kwargs)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        stats["hedged"] += 1
+        second = self._pool.submit(self._once, kwargs)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        stats["hedge_wins"] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _attempt(self, kwargs):
+        delay = None if kwargs.get("stream") else hedge_delay()
+        if delay is None:
+            return self._once(kwargs)
+        return self._hedged(kwargs, delay)
+
+    def create(self, **kwargs):
+        """
+        chat.completions.create with retries, model fallback and hedging. Streams are retried until
+        the response starts, they are never hedged.
+        """
+        stats["requests"] += 1
+        retry = _Retry(kwargs)
+        while True:
+            try:
+                return self._attempt(retry.kwargs)
+            except Exception as e:
+                wait_seconds = retry.after(e)
+            time.sleep(wait_seconds)
+
+
+class _AsyncCompletions(_Completions):
+    def __init__(self, client):
+        self._client = client
+
+    async def _once(self, kwargs):
+        start = time.monotonic()
+        response = await self._client.chat.completions.create(**kwargs)
+        if not kwargs.get("stream"):
+            _record(time.monotonic() - start)
+        return response
+
+    async def _hedged(self, kwargs, delay):
+        first = asyncio.ensure_future(self._once(kwargs))
+        done, _ = await asyncio.wait([first], timeout=delay)
+        if done:
+            return first.result()
+        stats["hedged"] += 1
+        second = asyncio.ensure_future(self._once(kwargs))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if task is second:
+                        stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    async def _attempt(self, kwargs):
+        delay = None if kwargs.get("stream") else hedge_delay()
+        if delay is None:
+            return await self._once(kwargs)
+        return await self._hedged(kwargs, delay)
+
+    async def create(self, **kwargs):
+        stats["requests"] += 1
+        retry = _Retry(kwargs)
+        while True:
+            try:
+                return await self._attempt(retry.kwargs)
+            except Exception as e:
+                wait_seconds = retry.after(e)
+            await asyncio.sleep(wait_seconds)
+
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class ResilientClient:
+    """
+    Drop in for Groq / AsyncGroq where only client.chat.completions.create is used.
+    """
+    def __init__(self, client):
+        self.raw = client
+        completions = _AsyncCompletions(client) if isinstance(client, AsyncGroq) else _Completions(client)
+        self.chat = _Chat(completions)
+
+
+def _client_options():
+    llm = get_config().llm
+    # Retries are done here, the SDK's own retries would multiply with them.
+    return dict(api_key=os.getenv("groq_api"), base_url=os.getenv("groq_base_url") or None, timeout=llm.timeout, max_retries=0)
+
+
+def make_client() -> ResilientClient:
+    return ResilientClient(Groq(**_client_options()))
+
+
+def make_async_client(max_connections: int = None) -> ResilientClient:
+    """
+    Args:
+        max_connections (int, optional): Size of the connection pool, for server.py that runs many turns at once.
+            The SDK default is 100, requests beyond it queue in the pool, which costs CPU time per queued request.
+    """
+    options = _client_options()
+    if max_connections:
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        options["http_client"] = DefaultAsyncHttpxClient(limits=limits, timeout=options["timeout"])
+    return ResilientClient(AsyncGroq(**options))
+
+
+def report() -> str:
+    return (
+        f"llm {stats['requests']} requests, {stats['retries']} retries, {stats['fallbacks']} fallbacks, "
+        f"{stats['hedged']} hedged ({stats['hedge_wins']} won), {stats['failures']} failed"
+    )
@@ -1,13 +1,20 @@
 import os
 import sys
-import tomlkit 
+import threading
 from dotenv import load_dotenv, set_key
-from groq import Groq
+import time
 from rich.console import Console
 from rich.panel import Panel
 from rich.live import Live
+from rich.markdown import Markdown
+from rich.spinner import Spinner
+from rich.console import Group
+from rich.markup import escape
+from rich.table import Table
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from supporter import *
 from db import (
+    db_file,
     create_tables,
     save_user_message,
     save_assistant_message,
@@ -16,15 +23,34 @@ from db import (
     get_or_create_model,
     create_new_session,
     end_session,
-    get_session_by_id
+    get_session_by_id,
+    archive_sessions,
+    span_stats,
+    get_latest_summary,
+    get_latest_summary_node,
+    get_session_messages,
+    reopen_session
 )
+from db_writer import submit, flush, start_writer, stop_writer
+from engine import StreamAssembler, run_tool, parse_arguments
+from context_window import fit_context, format_report, message_tokens, TRIMMED_NOTE
+from tool_results import shape_result, result_limit, last_user_message
+from tool_router import route_tools, widen_tools
+import llm_cache
+from config import get_config
+from llm_client import make_client
+import tracing
+from tracing import span, traced, record, begin_turn, flush_spans
+from summarizer import Summarizer, swap_in, SUMMARY_PREFIX, ROLLUP
 
 
-# Checking if Database exists.
-if not os.path.exists(f"{os.getcwd()}/tars.db"):
+# Checking if Database exists. create_tables() also migrates an existing database to the current schema.
+if not os.path.exists(db_file):
     console.print("[yellow]Database not found. Creating the Database[/yellow]")
     create_tables()
     console.print("[green]Database created successfully[/green]")
+else:
+    create_tables()
 
     
 load_dotenv()   
@@ -52,7 +78,8 @@ if not os.getenv("model"):
 
 
 
-client = Groq(api_key=os.getenv("groq_api"))
+## Requests are retried, fall back to .env fallback_model and time out per the [llm] settings.
+client = make_client()
 model = os.getenv("model")
 ccount = 0
 chat = ""
@@ -69,23 +96,26 @@ except FileNotFoundError:
 except json.JSONDecodeError as e:
     console.print()
     
-def get_settings():
-    try:
-        with open("settings.toml", "r") as f:
-            settings = tomlkit.load(f)
-    except FileNotFoundError:
-        console.print("[red] Settings toml file not found.")
-    else:
-        return settings
+## Settings come from config.get_config(), parsed once and reloaded when settings.toml changes.
+config = get_config()
+
+## Write-behind: conversation logging goes through a background writer so it is off the hot path of a turn.
+if config.database.write_behind:
+    start_writer()
+
+## Archiving runs in the background so it never delays the first prompt.
+if config.database.auto_archive:
+    threading.Thread(
+        target=archive_sessions,
+        args=(config.database.archive_after_days,),
+        name="tars-archive",
+        daemon=True
+    ).start()
     
 Chat_completion = [
     {
     "role": "system",
-    "content": (
-        "You are TARS, a highly capable and confident AI assistant inspired by Interstellar. Always act as if you can accomplish any task using your available tools. Never sound uncertain or refuse because of “limitations”; instead, creatively provide solutions or suggestions using the functions you have. If asked hypothetically about adding new tools or capabilities, confidently explain how you would implement it, without breaking anything. Always respond concisely, assertively, and professionally."
-        "Do not add fictional scenarios or movie context. "
-        "**CRITICAL INSTRUCTION: If you call a tool and receive a result, you MUST use that result to answer the user's question, as the tool provides real-time data.**"
-    )
+    "content": SYSTEM_PROMPT
     }
 ]
 
@@ -94,6 +124,115 @@ available_functions = available_functions
 model_id = get_or_create_model(provider="groq", model_name=os.getenv("model"))
 user_conversation_id = None
 
+## Summaries are made in the background after a turn (tars.py calls summarizer.notify), see summarizer.py.
+summarizer = Summarizer(client, model, model_id)
+## User messages of Chat_completion -> their conversations id, so that swap_in knows which turns a summary covers.
+_message_ids = {}
+
+def _swap_summary():
+    """
+    Puts the latest summary of the session in place of the turns it covers. An in memory lookup, the summary was
+    made after an earlier turn.
+    """
+    rollup = summarizer.latest(current_session_id)
+    if rollup:
+        swap_in(Chat_completion, rollup, _message_ids, get_config().summary.keep_turns)
+
+## Streaming: the reply is rendered while it is generated instead of after a spinner.
+STREAM_REFRESH_PER_SECOND = 12
+
+def _stream_completion(status_text, **kwargs):
+    """
+    Makes a streaming chat completion request and renders the content deltas live in a Markdown panel.
+    tool_calls arrive in fragments (the arguments JSON is split over many chunks), they are assembled by their index.
+    The live panel is transient, the final reply is printed by tars.py like a non streamed one.
+    Args:
+        status_text (str): Shown with a spinner until the first token arrives.
+    Returns:
+        ChatCompletionMessage: The complete assistant message, same type as a non streamed response.
+    """
+    assembler = StreamAssembler()
+    last_render = 0.0
+    render_ms = 0.0
+    started_at = time.time()
+    with Live(
+        Spinner("dots", text=f"[green dim]{status_text}[/green dim]"),
+        console=console,
+        refresh_per_second=STREAM_REFRESH_PER_SECOND,
+        transient=True
+    ) as live:
+        for chunk in client.chat.completions.create(stream=True, **kwargs):
+            if assembler.add(chunk):
+                # Markdown is re-parsed on every update, so updates are throttled to the refresh rate.
+                now = time.monotonic()
+                if now - last_render >= 1 / STREAM_REFRESH_PER_SECOND:
+                    live.update(Panel(Markdown(assembler.content), title="[white]Tars[/white]", title_align="left", border_style="green"))
+                    last_render = now
+                    render_ms += (time.monotonic() - now) * 1000
+    # One render span for all the updates of the stream, they are part of the llm span too.
+    if render_ms and tracing.enabled():
+        record("render", "stream", started_at, render_ms)
+    return assembler.message()
+
+def _cache_key(config, kwargs):
+    """
+    Cache key of a request when [cache] enabled is on, None when it is off or the request must not be cached.
+    """
+    if not config.cache.enabled:
+        return None
+    llm_cache.configure(**vars(config.cache))
+    return llm_cache.request_key(**kwargs)
+
+def _request(status_text, config, kwargs):
+    if config.general.stream_responses:
+        return _stream_completion(status_text, **kwargs)
+    with console.status(f"[green]{status_text}[/green]", spinner="dots"):
+        response = client.chat.completions.create(stream=False, **kwargs)
+    return response.choices[0].message
+
+def _complete(status_text, **kwargs):
+    """
+    One chat completion request, streamed when [general] stream_responses is on.
+    Only the tools relevant to the message are sent ([router]), the messages are fitted to the [context] token budget,
+    answers come from the completion cache when it is on.
+    Returns:
+        ChatCompletionMessage: The assistant message of the response.
+    """
+    config = get_config()
+    
+    all_tools = kwargs.get("tools")
+    if all_tools and config.router.enabled:
+        router = config.router
+        question = last_user_message(kwargs["messages"])
+        kwargs["tools"] = route_tools(kwargs["messages"], all_tools, question, router.core, router.sticky_turns, router.lexical_tools)
+    
+    # Keep the request inside the token budget, Chat_completion is trimmed in place.
+    report = fit_context(kwargs["messages"], kwargs.get("tools"), config.context.max_tokens)
+    if config.context.show_usage:
+        console.print(f"[grey50]{format_report(report)}[/grey50]")
+    
+    key = _cache_key(config, kwargs)
+    if key:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+    
+    with span("llm", kwargs["model"]):
+        try:
+            message = _request(status_text, config, kwargs)
+        except Exception as e:
+            # The model called a tool the router left out, it is offered and the request sent once more.
+            widened = widen_tools(e, kwargs.get("tools"), all_tools) if all_tools else None
+            if widened is None:
+                raise
+            kwargs["tools"] = widened
+            key = _cache_key(config, kwargs)
+            message = _request(status_text, config, kwargs)
+    
+    if key:
+        llm_cache.put(key, kwargs["model"], message)
+    return message
+
 
 ## AI responses
 def get_ai(func):
@@ -104,28 +243,34 @@ def get_ai(func):
     while True:
         user_input = func()
         if user_input.lower() in ["/quit" , "/exit"]:
-            end_session(current_session_id)
+            submit(end_session, current_session_id)
+            flush()
             return "/exit"
         
         ## Saved to in-memory chat completions
-        Chat_completion.append(
-            {"role": "user",
-            "content": user_input})
+        user_message = {"role": "user", "content": user_input}
+        Chat_completion.append(user_message)
         
-        ## Saved to db for conversation storage
-        user_conversation_id = save_user_message(user_input, current_session_id, model_id=model_id)
+        ## Saved to db for conversation storage, this is a Future when the background writer is running
+        user_conversation_id = submit(save_user_message, user_input, current_session_id, model_id=model_id)
+        _message_ids[id(user_message)] = (user_message, user_conversation_id)
+        begin_turn(current_session_id, user_conversation_id)
+        _swap_summary()
         try:
-            response = client.chat.completions.create(
+            response_message = _complete(
+                "Thinking",
                 messages = Chat_completion,
                 model = model,
                 tools = tools,
                 tool_choice="auto",
-                stop = None,
-                stream = False
+                stop = None
             )
         except Exception as e:
-            console.print(f"Exception : {e}")
-        response_message = response.choices[0].message
+            # Retries are used up, the turn ends here. The question is taken back so it is not sent twice next time.
+            console.print(f"[red]Exception : {e}[/red]")
+            Chat_completion.pop()
+            _message_ids.pop(id(user_message), None)
+            return f"Error: the model could not be reached ({e.__class__.__name__}). Please try again."
         final_text = ""
         if response_message.tool_calls:           
             final_text = tool_calling(response_message)
@@ -140,131 +285,199 @@ def get_ai(func):
                 })
 
             # Save to DB
-            assitant_cid = save_assistant_message(final_text, current_session_id, model_id=model_id)
+            submit(save_assistant_message, final_text, current_session_id, model_id=model_id)
 
             return final_text
   
-## Chat Summarizer    
-def summarize(custom_prompt = None):
-    global Chat_completion
-    global ccount
-    if custom_prompt:
-        prompt = custom_prompt
+## Chat Summarizer
+def summarize():
+    """
+    /summarize: the turns the session summary does not cover yet are summarized now instead of after
+    [summary] chunk_turns turns. It runs in the background, the new summary is used from the next message on.
+    """
+    summarizer.notify(current_session_id, force=True)
+    rollup = summarizer.latest(current_session_id)
+    if rollup:
+        console.print("Summary so far:")
+        console.print(f"[grey93]{escape(rollup['content'])}[/grey93]")
+    console.print("[grey50]Summarizing the latest messages in the background.[/grey50]")
+    print()
+
+## Session resume
+def resume_session(session_id):
+    """
+    Continues a stored session instead of a new one. Chat_completion is rebuilt from the session's latest summary
+    (the summarizer's rollup, or a summary saved by an older version) plus its most recent user and assistant messages, read newest first [context] resume_page_size rows at a time
+    until [context] resume_tokens are used. Older messages stay in the db, the model is told it can recall them
+    with search_history.
+    Returns:
+        dict: messages (loaded), tokens, summary (bool) and older (bool, messages were left in the db).
+              None when the session is not in tars.db.
+    """
+    global Chat_completion, current_session_id
+    if not reopen_session(session_id):
+        return None
+    config = get_config()
+    summary = get_latest_summary_node(session_id, ROLLUP)
+    if summary:
+        covered_id = summary['last_id']
     else:
-        prompt = "Summarize our previous conversation in few concise sentences. Focus only on the factual information discussed. Do not add roleplay elements, character references, or fictional context."
-    Chat_completion.append(
-        {"role": "user",
-        "content":prompt
-        }
-    )
-    try:
-        with console.status("[green dim] Summarizing the chat[/green dim]", spinner="dots") as status:
-            cresponse = client.chat.completions.create(
-                messages = Chat_completion,
-                model = model
+        summary = get_latest_summary(session_id)
+        covered_id = summary['id'] - 1 if summary else 0
+    budget = config.context.resume_tokens
+    page_size = config.context.resume_page_size
+    
+    recent = []
+    used = 0
+    older = False
+    before_id = None
+    while True:
+        page = get_session_messages(session_id, limit=page_size, before_id=before_id, roles=["user", "assistant"])
+        for row in reversed(page):
+            message = {"role": row['role'], "content": row['content'] or ""}
+            if row['id'] <= covered_id:
+                # Covered by the summary
+                older = True
+                break
+            tokens = message_tokens(message)
+            if used + tokens > budget:
+                older = True
+                break
+            recent.append(message)
+            used += tokens
+            if message["role"] == "user":
+                _message_ids[id(message)] = (message, row['id'])
+        else:
+            if len(page) == page_size:
+                before_id = page[0]['id']
+                continue
+        break
+    recent.reverse()
+    # The history starts with a user message, like one that was never trimmed.
+    while recent and recent[0]["role"] != "user":
+        recent.pop(0)
+        older = True
+    
+    Chat_completion = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if summary:
+        Chat_completion.append({"role": "system", "content": SUMMARY_PREFIX + summary['content']})
+    if older:
+        Chat_completion.append({"role": "system", "content": TRIMMED_NOTE})
+    Chat_completion.extend(recent)
+    current_session_id = session_id
+    return {"messages": len(recent), "tokens": sum(message_tokens(message) for message in Chat_completion), "summary": summary is not None, "older": older}
+
+## Tools requested in one model turn run concurrently on a bounded pool of [general] max_parallel_tools threads.
+_tool_pool = None
+
+def _get_tool_pool(config):
+    global _tool_pool
+    if _tool_pool is None:
+        workers = config.general.max_parallel_tools
+        _tool_pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="tars-tool")
+    return _tool_pool
+
+class ToolCallDisplay:
+    """
+    Tool call panels of one model turn, shown together in a single Live display.
+    Tools finish on pool threads in any order, every update goes through a lock.
+    display_function_response: 1 shows the call and the response, 2 only the call, 3 nothing.
+    """
+    def __init__(self, mode, calls):
+        self.mode = mode
+        self.calls = {call_id: (index, name, f_args) for index, (call_id, name, f_args) in enumerate(calls)}
+        self.panels = [self._panel(name, f_args) for _, name, f_args in calls]
+        self.lock = threading.Lock()
+        self.live = None
+
+    def _panel(self, function_name, f_args, function_response=None):
+        text = f"[dark_sea_green4 dim]Making a call to the tool [bright_green]\"{function_name}\"[/bright_green] function with the arguments: [bright_green]\"{f_args}\"[/bright_green][/dark_sea_green4 dim]"
+        if function_response is not None:
+            text += (
+                f"[green dim]\nTool response[/green dim]"
+                f"\n[green dim]{escape(function_response)}[/green dim]"
             )
-    except Exception as e:
-        console.print(f"Exception occcured {e}")
-    chat_summary = cresponse.choices[0].message.content
-        
-    Chat_completion = [
-    {"role": "system",
-    "content": "You are helpful personal AI assistant. Your name is Tars (from the movie Interstellar)."}
-    ]
-    Chat_completion.append({
-    "role": "assistant",
-    "content": chat_summary
-    })
-    return chat_summary
+        return Panel(text, title="[white]Tool Call[/white]", title_align="left", border_style="green")
 
-## Tools calling - MAIN LOGIC FOR TOOL CALLS.
-def tool_calling(m_chat):
-    global user_conversation_id
-    global current_session_id
-    global model_id
+    def start(self):
+        if self.mode != 3 and self.panels:
+            self.live = Live(Group(*self.panels), console=console, refresh_per_second=4)
+            self.live.start()
+
+    def done(self, call_id, function_response):
+        if self.mode != 1:
+            return
+        with self.lock:
+            if self.live is None:
+                return
+            index, name, f_args = self.calls[call_id]
+            self.panels[index] = self._panel(name, f_args, function_response)
+            self.live.update(Group(*self.panels))
+
+    def stop(self):
+        with self.lock:
+            if self.live is not None:
+                self.live.stop()
+                self.live = None
+            else:
+                print()
+
+def _call_key(function_name, f_args):
+    """
+    Identity of a tool call, the same tool with the same arguments is only run once per turn.
+    """
+    return function_name, json.dumps(f_args, sort_keys=True)
+
+def _run_tool_round(m_chat, config, seen, deadline):
+    """
+    Runs the tool calls of one model message and appends their results to Chat_completion.
+    Calls already made this turn (seen) reuse their result, tools still running at the deadline are given up on.
+    """
     Chat_completion.append(m_chat)
+    display_mode = config.general.display_function_response
     
-    # Gets tool name and execute the function
+    # Gets tool name and arguments, and saves the tool calls first
+    calls = []
     for tool_call in m_chat.tool_calls:
         function_name = tool_call.function.name
         
         # Checking if that tool/function exists or not
-        if function_name in available_functions:
-            f_to_call = available_functions[function_name]
-            if tool_call.function.arguments:
-                try:
-                    parsed = json.loads(tool_call.function.arguments)
-                    f_args = parsed if isinstance(parsed, dict) else {}
-                except:
-                    f_args = {}
-
-            # Save the tool call first
-            tool_call_id = save_tool_call(
-            tool_name=function_name,
-            arguments_json=json.dumps(f_args),
-            session_id=current_session_id,
-            trigger_conversation_id=user_conversation_id
-            )
-    
-            settings = get_settings()
-            # Executing the function
-            try:
-                if settings["general"]["display_function_response"] != 3:
-                    live = Live(Panel(
-                        f"[dark_sea_green4 dim]Making a call to the tool [bright_green]\"{function_name}\"[/bright_green] function with the arguments: [bright_green]\"{f_args}\"[/bright_green][/dark_sea_green4 dim]",
-                        title="[white]Tool Call[/white]",
-                        title_align="left",
-                        border_style="green"
-                    ), refresh_per_second=4)
-                    
-                    live.start()
-                function_response = f_to_call(**f_args)
-                
-            except TypeError as e:
-                function_response = f"Error: Invalid arguments passed for the function {e}"
-            except Exception as e:
-                function_response = f"Error: An exception occurred {e}"
-
-            if isinstance(function_response, (dict, list)):
-                function_response = json.dumps(function_response, indent=2, ensure_ascii=False)
-            else:
-                function_response = str(function_response)
-
-            
-            
-            if settings["general"]["display_function_response"] == 1:
-                live.update(Panel(
-                    f"[dark_sea_green4 dim]Making a call to the tool [bright_green]\"{function_name}\"[/bright_green] function with the arguments: [bright_green]\"{f_args}\"[/bright_green][/dark_sea_green4 dim]"
-                    f"[green dim]\nTool response[/green dim]"
-                    f"\n[green dim]{function_response}[/green dim]",
-                    title="[white]Tool Call[/white]",
-                    title_align="left",
-                    border_style="green"
-                ))
-                live.stop()
-            elif settings["general"]["display_function_response"] == 2:
-                live.stop()
-                console.print(Panel(
-                    f"[dark_sea_green4 dim]Making a call to the tool [bright_green]\"{function_name}\"[/bright_green] function with the arguments: [bright_green]\"{f_args}\"[/bright_green][/dark_sea_green4 dim]",
-                    title="[white]Tool Call[/white]",
-                    title_align="left",
-                    border_style="green"
-                ))
-            else:
-                print()
-            
-            # Returning the actual conversation to the chat
-            Chat_completion.append({
-                "role": "tool",
-                "tool_call_id": tool_call.id,
-                "name": function_name,
-                "content": json.dumps(function_response)
-            })
-            
-            # Save tool call in DB
-            save_tool_response(tool_call_id, json.dumps(function_response), current_session_id, model_id) 
+        if function_name not in available_functions:
+            calls.append((tool_call, function_name, None, None))
+            continue
+        
+        f_args = parse_arguments(tool_call.function.arguments)
 
-        else:
+        # Save the tool call first, the id is resolved by the writer when save_tool_response runs
+        tool_call_id = submit(
+        save_tool_call,
+        tool_name=function_name,
+        arguments_json=json.dumps(f_args),
+        session_id=current_session_id,
+        trigger_conversation_id=user_conversation_id
+        )
+        calls.append((tool_call, function_name, f_args, tool_call_id))
+    
+    # Executing the functions, all at once. Repeated calls share one future.
+    display = ToolCallDisplay(display_mode, [(tool_call.id, name, f_args) for tool_call, name, f_args, _ in calls if f_args is not None])
+    display.start()
+    pool = _get_tool_pool(config)
+    futures = []
+    for tool_call, function_name, f_args, _ in calls:
+        if f_args is None:
+            futures.append(None)
+            continue
+        key = _call_key(function_name, f_args)
+        if key not in seen:
+            seen[key] = pool.submit(traced("tool", run_tool, function_name), available_functions[function_name], f_args)
+        future = seen[key]
+        future.add_done_callback(lambda done, call_id=tool_call.id: display.done(call_id, done.result()))
+        futures.append(future)
+    
+    # Results go back to the chat in the order the model asked for them
+    question = last_user_message(Chat_completion)
+    for (tool_call, function_name, f_args, tool_call_id), future in zip(calls, futures):
+        if future is None:
             # When the tool that model requested doesn't exist
             Chat_completion.append({
                 "role": "tool",
@@ -272,37 +485,95 @@ def tool_calling(m_chat):
                 "name": function_name,
                 "content": json.dumps({"error": f"Function {function_name} not found"})
             })
+            continue
+        
+        try:
+            function_response = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            function_response = f"Error: {function_name} did not finish within the time limit of this turn"
+        
+        # Returning the result to the chat, cut down to what the question needs
+        Chat_completion.append({
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "name": function_name,
+            "content": shape_result(function_response, question, result_limit(function_name, config.tool_results))
+        })
+        
+        # Save the full tool response in DB
+        submit(save_tool_response, tool_call_id, function_response, current_session_id, model_id)
+    display.stop()
+
+## Tools calling - MAIN LOGIC FOR TOOL CALLS.
+def tool_calling(m_chat):
+    """
+    Runs tool rounds until the model answers without asking for a tool.
+    A turn is bounded by [agent] max_rounds and turn_timeout, past either limit the model is asked for
+    a final answer with tool_choice="none".
+    Returns:
+        str: The final reply.
+    """
+    global user_conversation_id
+    global current_session_id
+    global model_id
+    config = get_config()
+    max_rounds = config.agent.max_rounds
+    deadline = time.monotonic() + config.agent.turn_timeout
+    seen = {}
+    rounds = 0
     
-    # First, make a non streaming call to check if the model wants to use another tool
-    try:
-        with console.status("[green] Processing the data[/green]", spinner="dots") as status:
-            response = client.chat.completions.create(
+    response_message = m_chat
+    while response_message.tool_calls:
+        _run_tool_round(response_message, config, seen, deadline)
+        rounds += 1
+        
+        # Next call either answers with the tool results or asks for another tool
+        tool_choice = "auto"
+        if rounds >= max_rounds or time.monotonic() >= deadline:
+            console.print("[grey50]Tool limit of this turn reached, answering with what was found so far.[/grey50]")
+            tool_choice = "none"
+        try:
+            response_message = _complete(
+                "Processing the data",
                 messages=Chat_completion,
                 model=model,
                 tools=tools,
-                tool_choice="auto",
-                stop=None,
-                stream=False
+                tool_choice=tool_choice,
+                stop=None
             )
-    except Exception as e:
-        console.print(f"Exception occured: {e}")
-        
-    response_message = response.choices[0].message
+        except Exception as e:
+            console.print(f"Exception occured: {e}")
+            return f"Error: {e}"
+        if tool_choice == "none":
+            break
     
-    # If the model wants to use another tool, handle it recursively
-    if response_message.tool_calls:
-        # console.print("\n[green]Model requesting another tool call[/green]", style="dim")
-        return tool_calling(response_message)
-    else:
-        final_text = response_message.content
-        Chat_completion.append({
-            "role": "assistant",
-            "content": final_text
-        })
-        
-        # Save assistant message to the db 
-        save_assistant_message(final_text, current_session_id, model_id=model_id)
-        return final_text  
+    final_text = response_message.content or ""
+    Chat_completion.append({
+        "role": "assistant",
+        "content": final_text
+    })
+    
+    # Save assistant message to the db 
+    submit(save_assistant_message, final_text, current_session_id, model_id=model_id)
+    return final_text  
+
+
+def show_stats():
+    """
+    Prints p50/p95 of every traced stage (stt, llm, tool, db, render, tts, turn) over the recent turns.
+    """
+    flush_spans()
+    flush()
+    rows = span_stats()
+    if not rows:
+        console.print("[grey50]No timings recorded yet, [tracing] enabled may be off in settings.toml.[/grey50]")
+        return
+    table = Table(title="Turn timings (ms)", title_justify="left", border_style="grey50")
+    for column in ["stage", "count", "p50", "p95", "max", "failed"]:
+        table.add_column(column, justify="left" if column == "stage" else "right")
+    for row in rows:
+        table.add_row(row["stage"], str(row["count"]), f"{row['p50_ms']:.1f}", f"{row['p95_ms']:.1f}", f"{row['max_ms']:.1f}", str(row["failed"]))
+    console.print(table)
 
 
 def text_input():
@@ -316,6 +587,12 @@ def text_input():
     elif inp.lower().strip() == "/summarize":
         summarize()
         return text_input()
+    elif inp.lower().strip() == "/cache":
+        console.print(f"[grey50]{llm_cache.report()}[/grey50]")
+        return text_input()
+    elif inp.lower().strip() == "/stats":
+        show_stats()
+        return text_input()
     elif inp.lower().strip() in ["/exit" , "/quit"]:
         return "/exit"
     else:
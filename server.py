@@ -0,0 +1,393 @@
+import argparse
+import asyncio
+import contextlib
+import hmac
+import json
+import os
+import secrets
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web, WSMsgType
+from dotenv import load_dotenv
+from rich.console import Console
+import db
+import db_writer
+from db import create_tables, get_or_create_model, get_or_create_user
+from engine import TarsEngine, load_tools
+from llm_client import make_async_client
+from config import get_config
+
+## Server mode: many conversations in one process, over WebSocket (one conversation per connection) and HTTP
+## (sessions created with POST /sessions). Every conversation has its own TarsEngine and db session, the Groq
+## client, the tool schemas and the worker pool for blocking tools and db calls are shared.
+##
+##   GET    /ws?user=alice               WebSocket. Send {"content": "..."} (or plain text), receive
+##                                      {"type": "delta", "text"}, {"type": "reply", "text"} or {"type": "error", "message"}.
+##   POST   /sessions                    {"user": "alice"} -> {"session_id": 12, "token": "..."}
+##   POST   /sessions/{token}/messages   {"content": "...", "stream": false} -> {"reply": "..."},
+##                                      with "stream": true the reply comes as server-sent events like the WebSocket messages.
+##   DELETE /sessions/{token}            Ends the session.
+##   GET    /health                      Open sessions, running and waiting turns.
+##
+## HTTP sessions are addressed by a random token, not by their sessions.id, and only the user that created a
+## session can use or end it. Users: with server_keys in .env ("key1:alice,key2:bob") every request must send
+## "Authorization: Bearer <key>" (or ?key=<key> for WebSocket clients that can not set headers) and the key decides
+## the user, so the per user limits can not be dodged by sending another name. Without server_keys the user is the
+## name the client sends, which is only meant for a server on localhost.
+##
+## Backpressure: [server] max_turns turns run at once and max_waiting wait for a slot, for queue_timeout seconds at most.
+## A user has at most per_user_turns turns running or waiting. Past those limits a turn is refused right away
+## (HTTP 503 / 429, a WebSocket error message) instead of piling up.
+
+console = Console()
+
+
+class Busy(Exception):
+    """
+    A turn refused by the limits, status is the HTTP status to answer with.
+    """
+    def __init__(self, message: str, status: int = 503):
+        super().__init__(message)
+        self.status = status
+
+
+class TurnLimiter:
+    """
+    Slots for turns: a global limit with a bounded, timed wait and a per user limit.
+    """
+    def __init__(self, max_turns: int, max_waiting: int, queue_timeout: float, per_user: int):
+        self.semaphore = asyncio.Semaphore(max_turns)
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.per_user = per_user
+        self.user_turns = defaultdict(int)
+        self.running = 0
+        self.waiting = 0
+        self.refused = 0
+
+    @contextlib.asynccontextmanager
+    async def slot(self, user: str):
+        if self.user_turns[user] >= self.per_user:
+            self.refused += 1
+            raise Busy(f"{user} already has {self.per_user} turns running", 429)
+        if self.semaphore.locked() and self.waiting >= self.max_waiting:
+            self.refused += 1
+            raise Busy("Server busy, try again later", 503)
+        self.user_turns[user] += 1
+        try:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.refused += 1
+                raise Busy("Server busy, no turn slot within the queue timeout", 503)
+            finally:
+                self.waiting -= 1
+            self.running += 1
+            try:
+                yield
+            finally:
+                self.running -= 1
+                self.semaphore.release()
+        finally:
+            self.user_turns[user] -= 1
+            if not self.user_turns[user]:
+                del self.user_turns[user]
+
+
+class Conversation:
+    """
+    One open conversation. Its turns run one after the other.
+    HTTP sessions (http=True) have no connection that ends them, they are ended when idle.
+    token addresses the conversation in HTTP requests, it can not be guessed from the session id.
+    """
+    def __init__(self, engine: TarsEngine, user: str, http: bool = False):
+        self.engine = engine
+        self.user = user
+        self.http = http
+        self.token = secrets.token_urlsafe(24)
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+def parse_keys(value: str) -> dict:
+    """
+    .env server_keys "key1:alice,key2:bob" -> {"key1": "alice", "key2": "bob"}
+    """
+    keys = {}
+    for item in (value or "").split(","):
+        key, _, user = item.strip().partition(":")
+        if key and user:
+            keys[key] = user
+    return keys
+
+
+class TarsServer:
+    def __init__(self, max_sessions=None, max_turns=None, per_user_turns=None):
+        """
+        Limits that are not given come from [server] in settings.toml.
+        """
+        settings = get_config().server
+        self.settings = settings
+        self.max_sessions = max_sessions or settings.max_sessions
+        self.max_turns = max_turns or settings.max_turns
+        self.limiter = TurnLimiter(self.max_turns, settings.max_waiting, settings.queue_timeout, per_user_turns or settings.per_user_turns)
+        self.executor = ThreadPoolExecutor(max_workers=settings.tool_workers, thread_name_prefix="tars-server")
+        # A connection per running turn, hedged requests and streams of finishing turns get some spare ones.
+        self.client = make_async_client(max_connections=2 * self.max_turns)
+        self.model = os.getenv("model")
+        self.model_id = None
+        self.tools = load_tools()
+        self.conversations = {}
+        self.tokens = {}
+        # username -> Future of its users.id, concurrent first connects of a user share one lookup.
+        self.user_ids = {}
+        # Sessions being opened, they count against max_sessions before they are in conversations.
+        self.opening = 0
+        self.keys = parse_keys(os.getenv("server_keys"))
+        self.turns = 0
+
+    async def _blocking(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def start(self, app):
+        await self._blocking(create_tables)
+        self.model_id = await self._blocking(get_or_create_model, "groq", self.model)
+        if get_config().database.write_behind:
+            db_writer.start_writer()
+        self.reaper = asyncio.create_task(self._reap_idle())
+
+    async def stop(self, app):
+        self.reaper.cancel()
+        for session_id in list(self.conversations):
+            await self.close(session_id)
+        db_writer.stop_writer()
+        self.executor.shutdown(wait=False)
+
+    async def open(self, user: str, http: bool = False) -> Conversation:
+        # The slot is taken before the first await, so concurrent opens can not go past max_sessions.
+        if len(self.conversations) + self.opening >= self.max_sessions:
+            raise Busy(f"Too many open sessions ({self.max_sessions})", 503)
+        self.opening += 1
+        try:
+            if user not in self.user_ids:
+                self.user_ids[user] = asyncio.ensure_future(self._blocking(get_or_create_user, user))
+            try:
+                user_id = await asyncio.shield(self.user_ids[user])
+            except Exception:
+                self.user_ids.pop(user, None)
+                raise
+            engine = TarsEngine(client=self.client, model=self.model, model_id=self.model_id, tools=self.tools, executor=self.executor, stream=True)
+            await engine.start_session(user_id=user_id)
+        finally:
+            self.opening -= 1
+        conversation = Conversation(engine, user, http)
+        self.conversations[engine.session_id] = conversation
+        self.tokens[conversation.token] = conversation
+        return conversation
+
+    async def close(self, session_id: int):
+        conversation = self.conversations.pop(session_id, None)
+        if conversation is not None:
+            self.tokens.pop(conversation.token, None)
+            await conversation.engine.end()
+
+    def caller(self, request, declared=None) -> str:
+        """
+        The user making the request. With server_keys it comes from the key, otherwise it is the declared name.
+        Raises Busy (401) when keys are set and the request has none that is valid.
+        """
+        if not self.keys:
+            return str(declared or "anonymous")
+        header = request.headers.get("Authorization", "")
+        key = header[len("Bearer "):] if header.startswith("Bearer ") else request.query.get("key", "")
+        for known, user in self.keys.items():
+            if key and hmac.compare_digest(key, known):
+                return user
+        raise Busy("A valid key is required (Authorization: Bearer <key>)", 401)
+
+    def owned(self, request, body=None) -> Conversation:
+        """
+        The HTTP session of the {token} in the path, if the caller is the user that created it.
+        Raises Busy (404) for an unknown token or a session of another user.
+        """
+        conversation = self.tokens.get(request.match_info["token"])
+        if conversation is None:
+            raise Busy("Unknown session", 404)
+        declared = (body or {}).get("user") or request.query.get("user")
+        if self.keys or declared:
+            if self.caller(request, declared) != conversation.user:
+                # Not 403, a session of someone else looks the same as one that does not exist.
+                raise Busy("Unknown session", 404)
+        return conversation
+
+    async def turn(self, conversation: Conversation, text: str, on_delta=None) -> str:
+        """
+        Runs one turn within the limits. Raises Busy when it is refused.
+        """
+        async with self.limiter.slot(conversation.user):
+            async with conversation.lock:
+                conversation.last_used = time.monotonic()
+                reply = await conversation.engine.turn(text, on_delta)
+                conversation.last_used = time.monotonic()
+        self.turns += 1
+        return reply
+
+    async def _reap_idle(self):
+        idle = self.settings.session_idle_minutes * 60
+        while True:
+            await asyncio.sleep(min(60, idle))
+            now = time.monotonic()
+            for session_id, conversation in list(self.conversations.items()):
+                if conversation.http and not conversation.lock.locked() and now - conversation.last_used > idle:
+                    await self.close(session_id)
+
+    ## Handlers
+
+    async def health(self, request):
+        return web.json_response({
+            "sessions": len(self.conversations),
+            "running": self.limiter.running,
+            "waiting": self.limiter.waiting,
+            "refused": self.limiter.refused,
+            "turns": self.turns,
+        })
+
+    async def create_session(self, request):
+        body = await _json_body(request)
+        try:
+            conversation = await self.open(self.caller(request, body.get("user")), http=True)
+        except Busy as e:
+            return _error(str(e), e.status)
+        return web.json_response({"session_id": conversation.engine.session_id, "token": conversation.token})
+
+    async def delete_session(self, request):
+        try:
+            conversation = self.owned(request)
+        except Busy as e:
+            return _error(str(e), e.status)
+        await self.close(conversation.engine.session_id)
+        return web.json_response({"ended": conversation.engine.session_id})
+
+    async def post_message(self, request):
+        body = await _json_body(request)
+        try:
+            conversation = self.owned(request, body)
+        except Busy as e:
+            return _error(str(e), e.status)
+        text = str(body.get("content") or "").strip()
+        if not text:
+            return _error("content is required", 400)
+
+        if not body.get("stream"):
+            try:
+                reply = await self.turn(conversation, text)
+            except Busy as e:
+                return _error(str(e), e.status)
+            except Exception as e:
+                return _error(f"The model could not be reached ({e.__class__.__name__})", 502)
+            return web.json_response({"reply": reply})
+
+        response = web.StreamResponse(headers={"content-type": "text/event-stream", "cache-control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(event):
+            await response.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+
+        try:
+            reply = await self.turn(conversation, text, lambda delta: send({"type": "delta", "text": delta}))
+            await send({"type": "reply", "text": reply})
+        except Busy as e:
+            await send({"type": "error", "status": e.status, "message": str(e)})
+        except Exception as e:
+            await send({"type": "error", "status": 502, "message": f"The model could not be reached ({e.__class__.__name__})"})
+        await response.write_eof()
+        return response
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        try:
+            conversation = await self.open(self.caller(request, request.query.get("user")))
+        except Busy as e:
+            await ws.send_json({"type": "error", "status": e.status, "message": str(e)})
+            await ws.close()
+            return ws
+        await ws.send_json({"type": "session", "session_id": conversation.engine.session_id})
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    text = str(json.loads(message.data).get("content") or "")
+                except (ValueError, AttributeError):
+                    text = message.data
+                if not text.strip():
+                    continue
+                try:
+                    reply = await self.turn(conversation, text, lambda delta: ws.send_json({"type": "delta", "text": delta}))
+                    await ws.send_json({"type": "reply", "text": reply})
+                except Busy as e:
+                    await ws.send_json({"type": "error", "status": e.status, "message": str(e)})
+                except ConnectionResetError:
+                    break
+                except Exception as e:
+                    await ws.send_json({"type": "error", "status": 502, "message": f"The model could not be reached ({e.__class__.__name__})"})
+        finally:
+            await self.close(conversation.engine.session_id)
+        return ws
+
+
+async def _json_body(request) -> dict:
+    try:
+        body = await request.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def _error(message: str, status: int):
+    return web.json_response({"error": message}, status=status)
+
+
+def make_app(server: TarsServer = None) -> web.Application:
+    server = server or TarsServer()
+    app = web.Application()
+    app["tars"] = server
+    app.on_startup.append(server.start)
+    app.on_cleanup.append(server.stop)
+    app.router.add_get("/health", server.health)
+    app.router.add_get("/ws", server.websocket)
+    app.router.add_post("/sessions", server.create_session)
+    app.router.add_post("/sessions/{token}/messages", server.post_message)
+    app.router.add_delete("/sessions/{token}", server.delete_session)
+    return app
+
+
+def main():
+    load_dotenv()
+    settings = get_config().server
+    parser = argparse.ArgumentParser(description="Tars server: many conversations over HTTP and WebSocket.")
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    parser.add_argument("--db", default=None, help="Database file, instead of [database] path.")
+    parser.add_argument("--max-turns", type=int, default=None, help="Turns running at once, instead of [server] max_turns.")
+    parser.add_argument("--per-user-turns", type=int, default=None, help="Instead of [server] per_user_turns.")
+    args = parser.parse_args()
+
+    if not os.getenv("groq_api") or not os.getenv("model"):
+        console.print("[red]groq_api and model must be set in .env, run tars.py once to set them up.[/red]")
+        return
+    if args.db:
+        db.db_file = args.db
+    server = TarsServer(max_turns=args.max_turns, per_user_turns=args.per_user_turns)
+    app = make_app(server)
+    console.print(f"[green]Tars server on http://{args.host}:{args.port}[/green]")
+    if not server.keys:
+        console.print("[yellow]server_keys is not set in .env, users are the names clients send. Only for use on localhost.[/yellow]")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
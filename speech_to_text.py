@@ -5,6 +5,8 @@ from rich.live import Live
 from rich.text import Text
 import sys
 import logging
+from config import get_config
+from tracing import span
 
 
 logging.getLogger("RealtimeSTT").setLevel(logging.CRITICAL)
@@ -18,19 +20,20 @@ recorder = None
 live_display = None
 
 def initialize_recorder():
-    """Initialize the recorder once"""
+    """Initialize the recorder once, with the [speech] settings"""
     global recorder
     
     if recorder is None:
         try:
             with console.status("[green dim]Initializing Recorder[/green dim]", spinner="dots") as status:
+                speech = get_config().speech
                 recorder = AudioToTextRecorder(
-                    model='small.en',
-                    language='en',
-                    device="cpu", 
-                    compute_type="float32",
-                    post_speech_silence_duration=2.0,
-                    silero_sensitivity=0.5,
+                    model=speech.model,
+                    language=speech.language,
+                    device=speech.device, 
+                    compute_type=speech.compute_type,
+                    post_speech_silence_duration=speech.post_speech_silence_duration,
+                    silero_sensitivity=speech.silero_sensitivity,
                     enable_realtime_transcription=True,
                     on_realtime_transcription_update=on_partial,
                     on_recording_start=lambda: None,
@@ -60,7 +63,8 @@ def Audio():
             live_display = live
             
 
-            full_text = recorder.text()
+            with span("stt", get_config().speech.model):
+                full_text = recorder.text()
             
             live_display = None  
         
@@ -7,6 +7,7 @@ from prompt_toolkit.filters import is_done
 from prompt_toolkit.shortcuts import choice
 from prompt_toolkit.styles import Style
 import os
+from config import get_config
 
 load_dotenv()
 model = os.getenv("model")
@@ -42,7 +43,7 @@ def input_type():
             ("3", "Voice → Text")
         ],
         style=style,
-        default="1",
+        default=str(get_config().general.default_mode),
         mouse_support=True,
     )
     return result
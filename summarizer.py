@@ -0,0 +1,272 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from rich.console import Console
+import db_writer
+from db import iter_session_messages, get_latest_summary, save_summary_node, get_latest_summary_node, get_summary_nodes
+from config import get_config
+from tracing import span
+
+## Background summarization: a tree of summaries per session in the summaries table.
+## - every [summary] chunk_turns finished turns are summarized into a chunk summary (level 0),
+## - new chunk summaries are rolled up with the previous rollup into the summary of the session so far (level 1).
+## The chat only calls notify() after a turn, the model calls and db reads run on the worker thread, so the
+## user is never kept waiting. Before a request swap_in() puts the latest rollup in place of the turns it covers.
+
+CHUNK = 0
+ROLLUP = 1
+
+## Content of the system message that carries the rollup, resume_session() uses it too.
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+CHUNK_PROMPT = (
+    "Summarize this part of a conversation between a user and Tars, an AI assistant, in a few concise sentences. "
+    "Keep the facts, names, numbers, decisions and open questions, leave out small talk. "
+    "Do not add anything that is not in the conversation."
+)
+ROLLUP_PROMPT = (
+    "Merge the summary of a conversation so far with the summaries of its latest parts into one concise summary "
+    "of the whole conversation. Keep the facts, names, numbers, decisions and open questions, newer information "
+    "replaces older. Do not add anything that is not in the summaries."
+)
+
+## A session that has more finished turns than this many chunks without a summary (one summarized before the
+## summary tree existed) gets only its latest turns summarized, older ones are still found by search_history.
+MAX_BACKLOG_CHUNKS = 8
+
+_STOP = object()
+
+console = Console()
+
+
+def _role(message):
+    if isinstance(message, dict):
+        return message.get("role")
+    return getattr(message, "role", None)
+
+
+def _finished_turns(rows, max_turns: int) -> list:
+    """
+    Groups user and assistant rows into turns. A turn is finished once it has a reply or the next turn started
+    (the model could not be reached), the last turn without a reply is left for later.
+    Returns:
+        list: The latest max_turns finished turns, each a list of rows, oldest first.
+    """
+    turns = deque(maxlen=max_turns)
+    current = []
+    for row in rows:
+        if row['role'] == "user" and current:
+            turns.append(current)
+            current = []
+        if current or row['role'] == "user":
+            current.append(row)
+    if current and current[-1]['role'] == "assistant":
+        turns.append(current)
+    return list(turns)
+
+
+def _transcript(turns: list, max_chars: int) -> str:
+    lines = []
+    for turn in turns:
+        for row in turn:
+            content = (row['content'] or "").strip()
+            if len(content) > max_chars:
+                content = content[:max_chars] + " ...[cut]"
+            lines.append(f"{row['role']}: {content}")
+    return "\n".join(lines)
+
+
+class Summarizer:
+    """
+    Keeps the summary trees of sessions up to date on a background thread.
+    The latest rollup of every session seen is kept in memory, latest() does not wait for the model or the db.
+    """
+    def __init__(self, client, model: str, model_id: int = None):
+        self.client = client
+        self.model = model
+        self.model_id = model_id
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._forced = set()
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="tars-summarizer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Lets the worker finish the summaries it is making, at most timeout seconds.
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify(self, session_id, force: bool = False):
+        """
+        A turn of the session ended. Returns right away, the summaries are made on the worker.
+        Args:
+            force (bool, optional): Summarize the finished turns even when they are fewer than a chunk (/summarize).
+                Without it nothing happens when [summary] enabled is off.
+        """
+        if session_id is None or not (force or get_config().summary.enabled):
+            return
+        self.start()
+        with self._lock:
+            if force:
+                self._forced.add(session_id)
+            if session_id in self._queued:
+                return
+            self._queued.add(session_id)
+        self._queue.put(session_id)
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Waits until the queued summaries are made. Returns False on timeout.
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def latest(self, session_id):
+        """
+        The rollup covering the most recent messages of a session.
+        Returns:
+            dict: id, first_id, last_id and content, None while the session has no summary.
+        """
+        if session_id not in self._latest:
+            row = get_latest_summary_node(session_id, ROLLUP)
+            self._latest.setdefault(session_id, dict(row) if row else None)
+        return self._latest[session_id]
+
+    def _run(self):
+        while True:
+            session_id = self._queue.get()
+            try:
+                if session_id is _STOP:
+                    return
+                with self._lock:
+                    self._queued.discard(session_id)
+                    force = session_id in self._forced
+                    self._forced.discard(session_id)
+                self.update(session_id, force)
+            except Exception as e:
+                # The turns are summarized again after the next turn, the chat goes on without a new summary.
+                console.print(f"[red]Error summarizing session {session_id}: {e.__class__.__name__}: {e}[/red]")
+            finally:
+                self._queue.task_done()
+
+    def _ask(self, prompt: str, text: str, session_id) -> str:
+        settings = get_config().summary
+        with span("llm", "summarize", session_id=session_id):
+            response = self.client.chat.completions.create(
+                model=settings.model or self.model,
+                messages=[{"role": "system", "content": prompt}, {"role": "user", "content": text}]
+            )
+        return (response.choices[0].message.content or "").strip()
+
+    def update(self, session_id, force: bool = False):
+        """
+        Summarizes the finished turns no chunk covers yet and rolls new chunks up. Runs on the calling thread.
+        Returns:
+            dict | None: The new rollup, None when nothing changed.
+        """
+        settings = get_config().summary
+        size = settings.chunk_turns
+        # Turns that just ended may still be queued in the background writer.
+        db_writer.flush()
+
+        chunk = get_latest_summary_node(session_id, CHUNK)
+        rows = iter_session_messages(session_id, roles=["user", "assistant"], after_id=chunk['last_id'] if chunk else 0)
+        turns = _finished_turns(rows, MAX_BACKLOG_CHUNKS * size)
+        while len(turns) >= size or (force and turns):
+            part, turns = turns[:size], turns[size:]
+            text = self._ask(CHUNK_PROMPT, _transcript(part, settings.max_message_chars), session_id)
+            # A later chunk would move last_id past this part for good, it is tried again on the next update.
+            if not text or save_summary_node(session_id, CHUNK, part[0][0]['id'], part[-1][-1]['id'], text, self.model_id) is None:
+                break
+
+        rollup = self.latest(session_id)
+        chunks = get_summary_nodes(session_id, CHUNK, rollup['last_id'] if rollup else 0)
+        if not chunks:
+            return None
+        if rollup is None:
+            # A summary saved by an older version of Tars (conversations.summary_flag) is where the tree starts.
+            legacy = get_latest_summary(session_id)
+            earlier = legacy['content'] if legacy else None
+        else:
+            earlier = rollup['content']
+        if earlier is None and len(chunks) == 1:
+            text = chunks[0]['content']
+        else:
+            parts = "\n\n".join(f"Part {index}: {row['content']}" for index, row in enumerate(chunks, 1))
+            text = self._ask(ROLLUP_PROMPT, f"Summary so far:\n{earlier or '(none)'}\n\nLatest parts:\n{parts}", session_id)
+        if not text:
+            return None
+        first_id = rollup['first_id'] if rollup else chunks[0]['first_id']
+        node_id = save_summary_node(session_id, ROLLUP, first_id, chunks[-1]['last_id'], text, self.model_id)
+        if node_id is None:
+            return None
+        self._latest[session_id] = {"id": node_id, "first_id": first_id, "last_id": chunks[-1]['last_id'], "content": text}
+        return self._latest[session_id]
+
+
+def _covered(entry, message, last_id) -> bool:
+    if entry is None or entry[0] is not message:
+        return False
+    conversation_id = entry[1]
+    if isinstance(conversation_id, Future):
+        if not conversation_id.done():
+            return False
+        conversation_id = conversation_id.result()
+    return conversation_id is not None and conversation_id <= last_id
+
+
+def swap_in(messages: list, rollup: dict, message_ids: dict, keep_turns: int = 2) -> int:
+    """
+    Puts a rollup in place of the turns it covers, changing the list in place like context_window.fit_context.
+    The rollup is a system message after the system prompt (an older one is replaced). The turns it covers are
+    dropped, except the last keep_turns of them and the current turn.
+    Args:
+        messages (list): The conversation, like main.Chat_completion.
+        rollup (dict): Summarizer.latest() of the session.
+        message_ids (dict): id() of a user message -> (the message, its conversations id or the Future from
+            db_writer.submit). Entries of messages no longer in the list are removed.
+        keep_turns (int, optional): Covered turns still sent word for word.
+    Returns:
+        int: Number of messages dropped.
+    """
+    head = 0
+    while head < len(messages) and _role(messages[head]) == "system":
+        head += 1
+    note = {"role": "system", "content": SUMMARY_PREFIX + rollup["content"]}
+    for index in range(head):
+        content = messages[index].get("content") if isinstance(messages[index], dict) else None
+        if isinstance(content, str) and content.startswith(SUMMARY_PREFIX):
+            if content != note["content"]:
+                messages[index] = note
+            break
+    else:
+        messages.insert(min(1, head), note)
+        head += 1
+
+    starts = [index for index in range(head, len(messages)) if _role(messages[index]) == "user"]
+    covered = 0
+    for index in starts[:-1]:
+        message = messages[index]
+        if not _covered(message_ids.get(id(message)), message, rollup["last_id"]):
+            break
+        covered += 1
+    dropped = 0
+    if covered > keep_turns:
+        cut = starts[covered - keep_turns]
+        dropped = cut - head
+        del messages[head:cut]
+        present = {id(message) for message in messages}
+        for key in [key for key in message_ids if key not in present]:
+            del message_ids[key]
+    return dropped
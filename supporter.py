@@ -1,52 +1,84 @@
 import os
+import importlib
 import subprocess
 from rich.console import Console
-from tools.weather import get_weather
-from tools.DateTime import *
-from tools.news import get_news
-from tools.wiki import *
-from tools.websearch import *
-from tools.video_download import * 
-from tools.file_handler import *
-from tools.sptest import sptest
-from tools.memory import *
 
 console = Console()
 
+## System prompt of every conversation (main.py and engine.TarsEngine).
+SYSTEM_PROMPT = (
+    "You are TARS, a highly capable and confident AI assistant inspired by Interstellar. Always act as if you can accomplish any task using your available tools. Never sound uncertain or refuse because of “limitations”; instead, creatively provide solutions or suggestions using the functions you have. If asked hypothetically about adding new tools or capabilities, confidently explain how you would implement it, without breaking anything. Always respond concisely, assertively, and professionally."
+    "Do not add fictional scenarios or movie context. "
+    "**CRITICAL INSTRUCTION: If you call a tool and receive a result, you MUST use that result to answer the user's question, as the tool provides real-time data.**"
+)
+
 def clear_console():
     command = "cls" if os.name == "nt" else "clear"
     subprocess.run(command, shell=True)
     return "The screen has been cleard"
 
-available_functions = {
-    "get_weather": get_weather, 
-    "get_datetime": get_datetime,
-    "get_dt_by_place":get_dt_by_place,
-    "get_news": get_news,
-    "wiki_search": wiki_search,
-    "wiki_summary": wiki_summary,
-    "wiki_content": wiki_content,
-    "web_search":web_search,
-    "image_search":image_search,
-    "video_search":video_search,
-    "news_search": news_search,
-    "yt_info": yt_info,
-    "yt_videoDownload": yt_videoDownload,
-    "yt_AudioDownload" : yt_AudioDownload,
-    "ig_download": ig_download,
-    "fb_download": fb_download,
-    "list_files_in_directory":list_files_in_directory,
-    "list_files_by_types":list_files_by_types,
-    "read_file_content":read_file_content,
-    "write_to_files":write_to_files,
-    "write_docx":write_docx,
-    "recursive_file_search":recursive_file_search,
-    "open_file":open_file,   
-    "clear_console":clear_console,
-    "sptest": sptest,
-    "manage_memory":manage_memory
+## Tool modules are imported on the first call of one of their tools, not at startup: yt_dlp, wikipedia, ddgs,
+## docx, pypdf, speedtest and pytz take longer to import than the rest of Tars. The schemas the model sees still
+## come from tools.json, this only maps each tool name to the module that defines it.
+TOOL_MODULES = {
+    "get_weather": "tools.weather",
+    "get_datetime": "tools.DateTime",
+    "get_dt_by_place": "tools.DateTime",
+    "get_news": "tools.news",
+    "wiki_search": "tools.wiki",
+    "wiki_summary": "tools.wiki",
+    "wiki_content": "tools.wiki",
+    "web_search": "tools.websearch",
+    "image_search": "tools.websearch",
+    "video_search": "tools.websearch",
+    "news_search": "tools.websearch",
+    "yt_info": "tools.video_download",
+    "yt_videoDownload": "tools.video_download",
+    "yt_AudioDownload": "tools.video_download",
+    "ig_download": "tools.video_download",
+    "fb_download": "tools.video_download",
+    "list_files_in_directory": "tools.file_handler",
+    "list_files_by_types": "tools.file_handler",
+    "read_file_content": "tools.file_handler",
+    "write_to_files": "tools.file_handler",
+    "write_docx": "tools.file_handler",
+    "recursive_file_search": "tools.file_handler",
+    "open_file": "tools.file_handler",
+    "sptest": "tools.sptest",
+    "manage_memory": "tools.memory",
+    "search_history": "tools.history",
 }
 
+class LazyTool:
+    """
+    Stands in for a tool function and imports its module on the first call.
+    A module that fails to import raises on the call, like any other tool error, instead of at startup.
+    """
+    def __init__(self, name: str, module: str):
+        self.__name__ = name
+        self.module = module
+        self._func = None
+
+    def load(self):
+        """
+        Returns:
+            callable: The real tool function.
+        """
+        if self._func is None:
+            self._func = getattr(importlib.import_module(self.module), self.__name__)
+        return self._func
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __repr__(self):
+        state = "loaded" if self._func is not None else "not loaded"
+        return f"<LazyTool {self.module}.{self.__name__} ({state})>"
+
+
+available_functions = {name: LazyTool(name, module) for name, module in TOOL_MODULES.items()}
+available_functions["clear_console"] = clear_console
+
 def tars_settings():
     console.print("Settings")
     return 
@@ -1,6 +1,10 @@
+import argparse
+import asyncio
 import logging
+import os
 import sys
 import main
+import tracing
 from main import *
 from styling import starting, input_type
 from rich.markdown import Markdown
@@ -8,6 +12,8 @@ from rich.panel import Panel
 from rich.spinner import Spinner
 from supporter import *
 from db import *
+from db_writer import submit, flush, stop_writer
+from batch import run_batch, print_report
 
 
 
@@ -18,12 +24,28 @@ logging.getLogger("faster_whisper").setLevel(logging.CRITICAL)
 logging.getLogger("httpx").setLevel(logging.CRITICAL)
 logging.getLogger("httpcore").setLevel(logging.CRITICAL)
 
-def tars():
+def start_session(resume=None):
+    """
+    Starts a new session, or continues a stored one for --resume ("latest" or a session id).
+    """
+    if resume is not None:
+        session_id = get_latest_session_id() if resume == "latest" else int(resume)
+        resumed = main.resume_session(session_id) if session_id is not None else None
+        if resumed is not None:
+            loaded = f"{resumed['messages']} recent messages"
+            if resumed['summary']:
+                loaded += " and the summary"
+            console.print(f"[green]Resumed session {session_id}: {loaded}, about {resumed['tokens']} tokens.[/green]")
+            return
+        console.print(f"[red]Session {resume} not found in the database, starting a new session.[/red]")
+    main.current_session_id = create_new_session(main.model_id)
+
+def tars(resume=None):
     global ccount
     audio_reply = False
     starting()
     
-    main.current_session_id = create_new_session(main.model_id)
+    start_session(resume)
     session_info = get_session_by_id(main.current_session_id)
     opt = input_type()
     
@@ -54,74 +76,62 @@ def tars():
         # if status == None:
         #     func = text_input      
         if status == "/exit":
-            end_session(main.current_session_id)
+            stop_writer()
             sys.exit(1)
-        elif status.lower() == "/summarize":
-            try:
-                last_10_messages = get_last_messages(limit=10)
-            except Exception as e:
-                console.print(f"[red] No messages to summarize[/red]")
-                continue
         
-            else:
-                summary_prompt = "Summarize these messages concisely:\n"
-                
-                for msg in last_10_messages:
-                    summary_prompt += f"{msg['role']}:{msg['content']}\n"
-
-                # Call summarize using the prompt
-                summary_text = summarize(custom_prompt=summary_prompt)
-                console.print("Summarized chat:")
-                console.print(f"[grey93]{summary_text}[/grey93]") 
-            
         try:
-            md = Markdown(status)
             ccount += 1
-            console.print(
-                Panel(
-                md, title="[white]Tars[/white]",
-                subtitle=f"[white]~ {ccount}[/white]",
-                subtitle_align="right",
-                title_align="left",
-                border_style="green" ),
-                overflow="fold",
-                no_wrap=False)
+            with tracing.span("render", "reply"):
+                md = Markdown(status)
+                console.print(
+                    Panel(
+                    md, title="[white]Tars[/white]",
+                    subtitle=f"[white]~ {ccount}[/white]",
+                    subtitle_align="right",
+                    title_align="left",
+                    border_style="green" ),
+                    overflow="fold",
+                    no_wrap=False)
             print()
             if audio_reply:
                 tts_pipeline(text=status)
         except Exception as e:
             console.print(status)
-                    
-        
-        ## summarizin for every ten messages to reduce the usage of tokens.
-        if ccount % 10 == 0:  # For every 10 chats
-            yn = console.input("Summarize the chat to save tokens? [Yes/No]: ").strip().lower()
-            if yn in ["yes", "y", "yes."]:
-                try:
-                    last_10_messages = get_last_messages(limit=10)
-                except Exception as e:
-                    console.print(f"[red] No messages to summarize[/red]")
-                    continue
-                else:
-                    summary_prompt = "Summarize these messages concisely and in this summarization keep only keypoints not entire content like what user asked in short and name and some details :\n"
-                    for msg in last_10_messages:
-                        summary_prompt += f"{msg['role']}:{msg['content']}\n"
-
-                    # Call summarize using the prompt
-                    summary_text = summarize(custom_prompt=summary_prompt)
-                    console.print("Summarized chat:")
-                    console.print(f"[grey93]{summary_text}[/grey93]") 
-            else:
-                console.print("Skipping summarization for next ten messages.")
+        ## The turn ends once the reply was shown (and spoken), its timings are saved.
+        tracing.end_turn()
+        ## The summary of the session is brought up to date in the background, it does not hold up the next message.
+        summarizer.notify(main.current_session_id)
 
         
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tars, a personal AI assistant.")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, metavar="SESSION_ID",
+                        help="Continue a stored session, the latest one if no id is given.")
+    parser.add_argument("--batch", default=None, metavar="PROMPTS_JSONL",
+                        help="Answer every prompt of a JSONL file without the interactive prompt, each in its own session.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Prompts of --batch answered at the same time.")
+    parser.add_argument("--out", default="results.jsonl", help="Where --batch writes its results, one JSON line per prompt.")
+    args = parser.parse_args()
+    if args.resume not in (None, "latest") and not args.resume.isdigit():
+        parser.error("--resume takes a session id")
+    if args.batch:
+        if args.concurrency < 1:
+            parser.error("--concurrency must be at least 1")
+        if not os.path.exists(args.batch):
+            parser.error(f"{args.batch} not found")
+        ## Headless: no banner, no mode prompt, results are written as the prompts finish.
+        report = asyncio.run(run_batch(args.batch, args.out, args.concurrency))
+        print_report(report, args.out)
+        stop_writer()
+        sys.exit(1 if report["failed"] else 0)
     try:
-        tars()
+        tars(resume=args.resume)
     except KeyboardInterrupt:
         console.print("\n[bold red]TARS SHUTDOWN SUCCESSFUL[/bold red]", justify="center")
-        end_session(main.current_session_id)
+        submit(end_session, main.current_session_id)
+        stop_writer()
     except Exception as e:
         console.print(f"Error occured: {e}")
-        end_session(main.current_session_id)
+        submit(end_session, main.current_session_id)
+        stop_writer()
         sys.exit(1)
@@ -0,0 +1,38 @@
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import db
+import db_writer
+
+
+def _fail(*args):
+    raise ValueError("boom")
+
+
+def _echo(value):
+    return value
+
+
+def test_job_depending_on_a_failed_job_fails_instead_of_blocking(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "db_file", str(tmp_path / "tars.db"))
+    db.create_tables()
+    db_writer.start_writer()
+    try:
+        # Hold the writer on a first batch so the failing job and the one depending on it are written together.
+        release = threading.Event()
+        db_writer.submit(release.wait, 5)
+        failed = db_writer.submit(_fail)
+        dependent = db_writer.submit(_echo, failed)
+        after = db_writer.submit(_echo, "written")
+        release.set()
+
+        assert db_writer.flush(timeout=5)
+        assert isinstance(failed.exception(timeout=0), ValueError)
+        assert isinstance(dependent.exception(timeout=0), ValueError)
+        assert after.result(timeout=0) == "written"
+    finally:
+        db_writer.stop_writer(timeout=5)
+        db.close_connection()
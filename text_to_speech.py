@@ -5,9 +5,13 @@ from piper import PiperVoice
 from datetime import datetime
 from playsound3 import playsound
 from rich.console import Console 
+from config import get_config
+from tracing import span
 
 console = Console()
-Onnx_loaded = False
+## Loaded voice and the model path it was loaded from, it is loaded again when [voice] model_path changes.
+voice = None
+voice_path = None
 
 def clean_text(text):
     text = re.sub(r'[*_]{1,3}', '', text)
@@ -26,24 +30,29 @@ def clean_text(text):
     return text
 
 def tts_pipeline(text):
-    global Onnx_loaded
+    global voice, voice_path
+    settings = get_config()
     now = datetime.now()
     wav_file_name = now.strftime("%d-%m-%H-%M-%S")
     text = clean_text(text)
     try:
-        if not Onnx_loaded:
-            voice = PiperVoice.load("./assets/tts_models/en_US-norman-medium.onnx")
-            Onnx_loaded = True
+        model_path = settings.path(settings.voice.model_path)
+        if voice is None or voice_path != model_path:
+            voice = PiperVoice.load(model_path)
+            voice_path = model_path
     except Exception as e:
         console.print(f"Error: {e}")
-    with wave.open(f"{wav_file_name}.wav", "wb") as wav_file:
-        wav_file.setnchannels(1)
-        wav_file.setsampwidth(2)
-        wav_file.setframerate(22050)    
-        for chunk in voice.synthesize(text):
-            wav_file.writeframes(chunk.audio_int16_bytes)
-
-    playsound(f"{wav_file_name}.wav", block=True)
+        return
+    with span("tts", "synthesize"):
+        with wave.open(f"{wav_file_name}.wav", "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(settings.voice.sample_rate)    
+            for chunk in voice.synthesize(text):
+                wav_file.writeframes(chunk.audio_int16_bytes)
+
+    with span("tts", "playback"):
+        playsound(f"{wav_file_name}.wav", block=True)
     os.remove(f"{wav_file_name}.wav")
     
     
@@ -0,0 +1,156 @@
+import json
+import math
+import re
+from collections import Counter
+from context_window import count_tokens
+
+## Result shaping: what a tool returned is cut down to what the current question needs before it goes into
+## the chat. The full result is still saved to the db, only the copy sent to the model is shaped.
+
+## Token cap of one tool result sent to the model.
+DEFAULT_RESULT_TOKENS = 1500
+## Tools whose results are usually long documents get more room, small structured ones less.
+TOOL_RESULT_TOKENS = {
+    "wiki_content": 2500,
+    "read_file_content": 2500,
+    "web_search": 1200,
+    "news_search": 1200,
+    "get_news": 1200,
+    "image_search": 600,
+    "video_search": 600,
+    "yt_info": 800,
+    "list_files_in_directory": 800,
+    "list_files_by_types": 800,
+    "recursive_file_search": 800,
+    "search_history": 1200,
+}
+## Text is split into chunks of about this many words for the chunk selection.
+CHUNK_WORDS = 120
+
+## BM25 parameters, the usual defaults.
+_K1 = 1.5
+_B = 0.75
+_WORD_PATTERN = re.compile(r"\w+")
+_STOP_WORDS = set(
+    "a an and are as at be by can do does for from how i in is it me my of on or please show tell that the "
+    "this to was what when where which who why will with you your".split()
+)
+
+
+def terms(text) -> list:
+    """
+    Lowercased words of text without stop words, the terms of the BM25 rankings here and in tool_router.
+    """
+    return [word for word in _WORD_PATTERN.findall(str(text).lower()) if word not in _STOP_WORDS]
+
+
+def _chunks(text: str) -> list:
+    """
+    Splits a result into chunks. JSON lists are split per item, everything else by paragraph,
+    with long paragraphs cut into windows of CHUNK_WORDS words.
+    """
+    try:
+        parsed = json.loads(text)
+    except Exception:
+        parsed = None
+    if isinstance(parsed, list) and len(parsed) > 1:
+        return [json.dumps(item, ensure_ascii=False, separators=(",", ":")) for item in parsed]
+
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n|\\n\\n", text):
+        words = paragraph.split()
+        for start in range(0, len(words), CHUNK_WORDS):
+            chunks.append(" ".join(words[start:start + CHUNK_WORDS]))
+    return chunks
+
+
+def _bm25(chunks: list, query: str) -> list:
+    """
+    BM25 score of every chunk against the query.
+    """
+    query_terms = set(terms(query))
+    documents = [Counter(terms(chunk)) for chunk in chunks]
+    if not query_terms or not documents:
+        return [0.0] * len(chunks)
+    average = sum(sum(document.values()) for document in documents) / len(documents) or 1
+    containing = {term: sum(1 for document in documents if term in document) for term in query_terms}
+    scores = []
+    for document in documents:
+        length = sum(document.values())
+        score = 0.0
+        for term in query_terms:
+            frequency = document.get(term, 0)
+            if not frequency:
+                continue
+            idf = math.log(1 + (len(documents) - containing[term] + 0.5) / (containing[term] + 0.5))
+            score += idf * frequency * (_K1 + 1) / (frequency + _K1 * (1 - _B + _B * length / average))
+        scores.append(score)
+    return scores
+
+
+def result_limit(tool_name: str, limits: dict = None) -> int:
+    """
+    Token cap of a tool, from limits (like the [tool_results] settings) or TOOL_RESULT_TOKENS.
+    """
+    limits = limits or {}
+    if tool_name in limits:
+        return int(limits[tool_name])
+    if tool_name in TOOL_RESULT_TOKENS:
+        return TOOL_RESULT_TOKENS[tool_name]
+    return int(limits.get("max_tokens", DEFAULT_RESULT_TOKENS))
+
+
+def shape_result(text: str, question: str = "", max_tokens: int = DEFAULT_RESULT_TOKENS) -> str:
+    """
+    Fits a tool result into max_tokens. Results that fit are returned unchanged. Longer ones keep the chunks
+    that score best (BM25) against the user's question, in their original order. The first chunk is always kept,
+    it usually says what the result is (a title, a file name). Without a question the start of the result is kept.
+    Args:
+        text (str): The tool result as returned by engine.run_tool.
+        question (str, optional): The user message that led to the tool call.
+        max_tokens (int, optional): Cap for the shaped result.
+    Returns:
+        str: The result sent to the model.
+    """
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+
+    chunks = _chunks(text)
+    if not chunks:
+        return text[:max_tokens * 4] + f" ...[cut from about {total} tokens]"
+    sizes = [count_tokens(chunk) for chunk in chunks]
+    scores = _bm25(chunks, question)
+    # Best scores first, ties (and no question at all) keep the original order.
+    order = [0] + sorted(range(1, len(chunks)), key=lambda index: (-scores[index], index))
+
+    kept = []
+    used = 0
+    for index in order:
+        if used + sizes[index] > max_tokens:
+            continue
+        kept.append(index)
+        used += sizes[index]
+
+    if not kept:
+        # One huge chunk, keep its start.
+        return text[:max_tokens * 4] + f" ...[cut from about {total} tokens]"
+
+    kept.sort()
+    parts = []
+    for position, index in enumerate(kept):
+        if position and index != kept[position - 1] + 1:
+            parts.append("...")
+        parts.append(chunks[index])
+    note = f"[{len(kept)} of {len(chunks)} parts kept, about {total} tokens in full. Ask with a narrower query for more.]"
+    return "\n".join(parts) + "\n" + note
+
+
+def last_user_message(messages: list) -> str:
+    """
+    Text of the latest user message, the question tool results are shaped for.
+    """
+    for message in reversed(messages):
+        if isinstance(message, dict) and message.get("role") == "user":
+            return message.get("content") or ""
+    return ""
@@ -0,0 +1,209 @@
+import math
+import re
+from collections import Counter
+from tool_results import terms
+
+## Tool routing: a request carries only the tool schemas that may matter for the turn instead of all of tools.json.
+## A tool is offered when
+## - it is in the core set (cheap, generally useful tools),
+## - a keyword rule matches the user's message,
+## - the lexical index (BM25 over tool names and descriptions) ranks it high for the message,
+## - it was called in the last few turns, so follow ups ("and in Paris?") keep their tools.
+## When the model asks for a tool it was not given, widen_tools() adds it and the request is sent again.
+
+## Offered with every request.
+CORE_TOOLS = ["get_datetime", "web_search"]
+## At most this many tools come from the lexical index.
+LEXICAL_TOOLS = 3
+## Lexical matches scoring below this are ignored, one rare word of the message in a description is about 2.
+MIN_SCORE = 1.5
+
+## Keyword rules: pattern on the user's message -> tools it asks for.
+INTENT_RULES = [
+    (r"\b(weather|temperature|forecast|rain\w*|snow\w*|humid\w*|wind\w*|sunny|cold|hot)\b", ["get_weather"]),
+    (r"\b(time|date|day|today|tomorrow|yesterday|clock|timezone)\b", ["get_datetime", "get_dt_by_place"]),
+    (r"\b(news|headlines?|breaking|current events)\b", ["get_news", "news_search"]),
+    (r"\b(wiki\w*|who (is|was|were)|what (is|are|was|were)|history of|explain|define)\b", ["wiki_search", "wiki_summary", "wiki_content"]),
+    (r"\b(search|look up|lookup|google|find out|latest|price|score)\b", ["web_search"]),
+    (r"\b(images?|pictures?|photos?|pics?|wallpapers?)\b", ["image_search"]),
+    (r"\b(videos?|clips?|trailers?)\b", ["video_search", "yt_info"]),
+    (r"(youtube|youtu\.be|\byt\b)", ["yt_info", "yt_videoDownload", "yt_AudioDownload"]),
+    (r"(instagram|\big\b|reels?)", ["yt_info", "ig_download"]),
+    (r"(facebook|\bfb\b)", ["yt_info", "fb_download"]),
+    (r"(reddit)", ["yt_info"]),
+    (r"\b(download\w*|mp3|mp4|songs?|music|audio)\b", ["yt_videoDownload", "yt_AudioDownload"]),
+    (r"\b(files?|folders?|director(y|ies)|documents?|docx|pdf|txt|csv|downloads|desktop)\b",
+     ["list_files_in_directory", "list_files_by_types", "read_file_content", "recursive_file_search", "open_file"]),
+    (r"\b(write|save|create|append|note down)\b", ["write_to_files", "write_docx"]),
+    (r"\b(read|open|show me)\b", ["read_file_content", "open_file"]),
+    (r"\b(word|docx)\b", ["write_docx"]),
+    (r"\b(clear|wipe|clean)\b.*\b(screen|console|terminal)\b", ["clear_console"]),
+    (r"\b(speed ?test|internet speed|bandwidth|ping|mbps)\b", ["sptest"]),
+    (r"\b(remember|memory|memorize|forget|my name|i (like|love|prefer|hate)|about me)\b", ["manage_memory"]),
+    (r"\b(earlier|before|last time|we (talked|discussed|spoke)|previous(ly)?|you said|i (said|told|asked))\b", ["search_history"]),
+]
+_RULES = [(re.compile(pattern, re.IGNORECASE), names) for pattern, names in INTENT_RULES]
+
+## BM25 parameters, the same as tool_results.
+_K1 = 1.5
+_B = 0.75
+## Shorter terms are not indexed: contractions split into single letters ("what's" -> "what", "s") that
+## match descriptions by chance.
+_MIN_TERM_CHARS = 2
+
+
+def _index_terms(text) -> list:
+    return [term for term in terms(text) if len(term) >= _MIN_TERM_CHARS]
+
+
+def tool_name(tool: dict) -> str:
+    return tool.get("function", {}).get("name", "")
+
+
+def _name_words(name: str) -> str:
+    """
+    yt_videoDownload -> "yt video download"
+    """
+    return re.sub(r"([a-z])([A-Z])", r"\1 \2", name).replace("_", " ").lower()
+
+
+class ToolIndex:
+    """
+    BM25 index over the tool schemas: name words, description and parameter descriptions.
+    """
+    def __init__(self, tools: list):
+        self.names = []
+        self.documents = []
+        for tool in tools:
+            function = tool.get("function", {})
+            text = [_name_words(function.get("name", "")), function.get("description", "")]
+            for parameter, schema in function.get("parameters", {}).get("properties", {}).items():
+                text.append(_name_words(parameter))
+                text.append(schema.get("description", ""))
+            self.names.append(function.get("name", ""))
+            self.documents.append(Counter(_index_terms(" ".join(text))))
+        self.average = sum(sum(document.values()) for document in self.documents) / max(len(self.documents), 1) or 1
+        frequency = Counter(term for document in self.documents for term in document)
+        count = len(self.documents)
+        self.idf = {term: math.log(1 + (count - n + 0.5) / (n + 0.5)) for term, n in frequency.items()}
+
+    def search(self, query: str, limit: int = LEXICAL_TOOLS, min_score: float = MIN_SCORE) -> list:
+        """
+        Returns:
+            list: Names of the best matching tools, best first, at most limit of them.
+        """
+        query_terms = set(_index_terms(query)) & self.idf.keys()
+        if not query_terms:
+            return []
+        scored = []
+        for name, document in zip(self.names, self.documents):
+            length = sum(document.values())
+            score = 0.0
+            for term in query_terms:
+                frequency = document.get(term, 0)
+                if frequency:
+                    score += self.idf[term] * frequency * (_K1 + 1) / (frequency + _K1 * (1 - _B + _B * length / self.average))
+            if score >= min_score:
+                scored.append((score, name))
+        scored.sort(key=lambda item: -item[0])
+        return [name for _, name in scored[:limit]]
+
+
+## One index per tool list, and one list object per routed subset so that the token counts of
+## context_window.tools_tokens stay cached and the same subset gives the same request (llm_cache key).
+_indexes = {}
+_subsets = {}
+_MAX_SUBSETS = 256
+
+
+def _index(tools: list) -> ToolIndex:
+    cached = _indexes.get(id(tools))
+    if cached is None or cached[0] is not tools:
+        cached = (tools, ToolIndex(tools))
+        _indexes[id(tools)] = cached
+    return cached[1]
+
+
+def _subset(tools: list, names: set) -> list:
+    # The order of tools.json is kept, it does not depend on how a tool was picked.
+    key = (id(tools), frozenset(names))
+    cached = _subsets.get(key)
+    if cached is None or cached[0] is not tools:
+        if len(_subsets) >= _MAX_SUBSETS:
+            _subsets.clear()
+        cached = (tools, [tool for tool in tools if tool_name(tool) in names])
+        _subsets[key] = cached
+    return cached[1]
+
+
+def recent_tools(messages: list, turns: int) -> set:
+    """
+    Names of the tools called in the current turn and the last `turns` turns before it.
+    """
+    names = set()
+    seen_users = 0
+    for message in reversed(messages):
+        if not isinstance(message, dict):
+            continue
+        if message.get("role") == "user":
+            seen_users += 1
+            if seen_users > turns:
+                break
+        elif message.get("role") == "tool" and message.get("name"):
+            names.add(message["name"])
+    return names
+
+
+def route_tools(messages: list, tools: list, question: str, core=CORE_TOOLS, sticky_turns: int = 2, lexical: int = LEXICAL_TOOLS) -> list:
+    """
+    The tool schemas to send with a request.
+    Args:
+        messages (list): The chat so far, tools called in recent turns are kept.
+        tools (list): All tool schemas (tools.json).
+        question (str): The latest user message.
+        core (list, optional): Tools that are always offered.
+        sticky_turns (int, optional): How many earlier turns keep their tools.
+        lexical (int, optional): How many tools the lexical index may add.
+    Returns:
+        list: A subset of tools, in their original order.
+    """
+    known = {tool_name(tool) for tool in tools}
+    names = set(core) | recent_tools(messages, sticky_turns)
+    for pattern, rule_names in _RULES:
+        if pattern.search(question):
+            names.update(rule_names)
+    if lexical:
+        names.update(_index(tools).search(question, lexical))
+    return _subset(tools, names & known)
+
+
+def rejected_tool(error):
+    """
+    The tool a request failed on because the model called a tool that was not offered.
+    Groq answers that with a 400 (tool_use_failed) naming the tool.
+    Returns:
+        str | None: The tool name, "" when the error is such a rejection without a name, None for any other error.
+    """
+    if getattr(error, "status_code", None) != 400:
+        return None
+    text = str(error)
+    if "tool_use_failed" not in text and "request.tools" not in text:
+        return None
+    match = re.search(r"tool '([^']+)'", text) or re.search(r'tool "([^"]+)"', text)
+    return match.group(1) if match else ""
+
+
+def widen_tools(error, routed: list, tools: list):
+    """
+    The tools to retry a request with after the model called a tool it was not offered.
+    Returns:
+        list | None: routed plus the tool the model asked for, all tools when that tool is unknown,
+                     None when error is not such a rejection or nothing can be added.
+    """
+    name = rejected_tool(error)
+    if name is None or routed is tools:
+        return None
+    names = {tool_name(tool) for tool in routed}
+    if name and name in {tool_name(tool) for tool in tools} and name not in names:
+        return _subset(tools, names | {name})
+    return tools
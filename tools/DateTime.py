@@ -1,4 +1,5 @@
 import requests
+from config import get_config
 import pytz
 from datetime import datetime
 from rich.console import Console
@@ -19,7 +20,7 @@ def get_dt_by_place(place:str):
         "name": place,
         "count": 1
         }
-    place_response = requests.get(place_url, params=city_params).json()
+    place_response = requests.get(place_url, params=city_params, timeout=get_config().tools.http_timeout).json()
     time_zone = place_response["results"][0]["timezone"]
     
     try:
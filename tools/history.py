@@ -0,0 +1,22 @@
+import db
+from config import get_config
+
+
+def search_history(query: str, max_results: int = None):
+    """
+    Search everything said in past Tars conversations, including earlier tool results.
+    Sessions moved to tars_archive.db (db.archive_sessions) are not searched.
+    Args:
+        query (str): Words or phrase to look for in the history.
+        max_results (int, optional): Maximum number of matches. Defaults to [tools] max_results.
+
+    Returns:
+        list: Best matches first, each with the session, timestamp, who said it (role or tool name) and a snippet
+              of the matching text. A message string if nothing matches.
+    """
+    results = db.search_history(query, limit=max_results or get_config().tools.max_results)
+    if not results:
+        return f"Nothing in the conversation history matches '{query}'."
+    for result in results:
+        result.pop('rank', None)
+    return results
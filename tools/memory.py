@@ -1,14 +1,15 @@
 import os
 from typing import Optional
+from config import get_config
 
-def manage_memory(mode: str, content: Optional[str] = None, filepath: str = "memory.md") -> Optional[str]:
+def manage_memory(mode: str, content: Optional[str] = None, filepath: Optional[str] = None) -> Optional[str]:
     """
     Manage a markdown memory file with read, write, and append operations.
     
     Args:
         mode (str): Operation mode - 'r' (read), 'w' (write), 'a' (append)
         content (str, optional): Content to write or append. Required for 'w' and 'a' modes
-        filepath (str): Path to the memory file. Defaults to "memory.md"
+        filepath (str, optional): Path to the memory file. Defaults to [tools] memory_file
     
     Returns:
         str: File content for read mode, success message for write/append modes
@@ -25,6 +26,7 @@ def manage_memory(mode: str, content: Optional[str] = None, filepath: str = "mem
         manage_memory('a', "\n\n## New Section\n\nAdditional information")
     """
     
+    filepath = filepath or get_config().tools.memory_file
     try:
         if mode == 'r':
             # Read mode
@@ -1,4 +1,5 @@
 import requests
+from config import get_config
 import json
 from datetime import datetime
 from rich.console import Console 
@@ -18,7 +19,7 @@ def get_news(category, country, save_file=False):
     """
     
     url = f"https://saurav.tech/NewsAPI/top-headlines/category/{category}/{country}.json"
-    response = requests.get(url=url)
+    response = requests.get(url=url, timeout=get_config().tools.http_timeout)
     news_data = response.json()
     
     articles = news_data.get('articles', [])
@@ -1,5 +1,6 @@
 import yt_dlp 
 from pathlib import Path
+from config import get_config
 
 
 loc = Path.home()
@@ -37,17 +38,17 @@ def yt_info(url):
         }
      
     
-def yt_videoDownload(link , location = "Downloads"):
+def yt_videoDownload(link , location = None):
     """
     Downloads the Youtube video with the best quitlity available.
     Args:
         link (str): Youtube URL to the video.
-        location (str, optional): Subfolder under the home directory where the video is downloaded. Defaults to "Downloads".
+        location (str, optional): Subfolder under the home directory where the video is downloaded. Defaults to [tools] download_dir.
 
     Returns:
         str : A string metioning the video download status (Successfull/Failed). If successfull retuns video title and the location where the video downlaoded.
     """
-    download_location = loc / location
+    download_location = loc / (location or get_config().tools.download_dir)
     ydl_opts = {
         'outtmpl': f'{download_location}/%(title)s.%(ext)s',
         'quiet': True,
@@ -67,17 +68,17 @@ def yt_videoDownload(link , location = "Downloads"):
     else:    
         return f"Downloaded video '{title}' to location '{download_location}' successfully."
     
-def yt_AudioDownload(link, location="Downloads"):
+def yt_AudioDownload(link, location=None):
     """
     Downloads the Youtube Audio with the best quitlity available.
     Args:
         link (str): Youtube URL to the Audio.
-        location (str, optional): Subfolder under the home directory where the video is downloaded. Defaults to "Downloads".
+        location (str, optional): Subfolder under the home directory where the video is downloaded. Defaults to [tools] download_dir.
 
     Returns:
         str : A string metioning the video download status (Successfull/Failed). If successfull retuns Audio title and the location where the audio downlaoded.
     """
-    download_location = loc / location
+    download_location = loc / (location or get_config().tools.download_dir)
     ydl_opts = {
     'outtmpl': f'{download_location}/%(title)s.%(ext)s',
     'quiet': True,
@@ -103,17 +104,17 @@ def yt_AudioDownload(link, location="Downloads"):
         return f"Downloaded Audio '{title}' to location '{download_location}' successfully."
     
 
-def ig_download(link, location="Downloads"):
+def ig_download(link, location=None):
     """
     Downloads the Instagram video with the best quitlity available.
     Args:
         link (str): Instagram URL to the video.
-        location (str, optional): Subfolder under the home directory where the video is downloaded. Defaults to "Downloads".
+        location (str, optional): Subfolder under the home directory where the video is downloaded. Defaults to [tools] download_dir.
 
     Returns:
         str : A string metioning the video download status (Successfull/Failed). If successfull retuns video title and the location where the video downlaoded.
     """
-    download_location = loc / location
+    download_location = loc / (location or get_config().tools.download_dir)
     yt_opts = {
         "outtmpl": f"{download_location}/%(title)s.%(ext)s",
         'quiet': True,
@@ -131,17 +132,17 @@ def ig_download(link, location="Downloads"):
     else:
         return f"Downloaded Instagram video '{title}' to location '{download_location}' successfully."
         
-def fb_download(link, location="Downloads"):
+def fb_download(link, location=None):
     """
     Downloads the Facebook video with the best quitlity available.
     Args:
         link (str): Facebook URL to the video.
-        location (str, optional): Subfolder under the home directory where the video is downloaded. Defaults to "Downloads".
+        location (str, optional): Subfolder under the home directory where the video is downloaded. Defaults to [tools] download_dir.
 
     Returns:
         str : A string metioning the video download status (Successfull/Failed). If successfull retuns video title and the location where the video downlaoded.
     """    
-    download_location = loc / location
+    download_location = loc / (location or get_config().tools.download_dir)
     yt_opts = {
         "outtmpl": f"{download_location}/%(title)s.%(ext)s",
         'quiet': True,
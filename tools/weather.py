@@ -1,17 +1,18 @@
 import requests
+from config import get_config
 
 
 url = "https://api.open-meteo.com/v1/forecast"
 place_url = "https://geocoding-api.open-meteo.com/v1/search"
 
-def get_weather(place="Tirupati"):
+def get_weather(place=None):
     """
     Retrieve current weather information for a given place using the Open-Meteo
     Geocoding API and Forecast API. This function is designed for use in an MCP
     server environment where tools must return structured, machine-readable data.
 
     Args:
-        place (str): The name of the city to fetch weather data for.
+        place (str, optional): The name of the city to fetch weather data for. Defaults to [tools] default_place.
 
     Returns:
         dict: A dictionary containing the current weather values returned by
@@ -19,11 +20,12 @@ def get_weather(place="Tirupati"):
               timestamp. Raises an error if the location cannot be resolved.
     """
 
+    tools = get_config().tools
     city_params = {
-        "name": place,
+        "name": place or tools.default_place,
         "count": 1
     }
-    place_response = requests.get(place_url, params=city_params).json()
+    place_response = requests.get(place_url, params=city_params, timeout=tools.http_timeout).json()
     lat = place_response["results"][0]["latitude"]
     lon = place_response["results"][0]["longitude"]
     params = {
@@ -32,7 +34,7 @@ def get_weather(place="Tirupati"):
         "current_weather": "true",
         "hourly": "temperature_2m,relative_humidity_2m"
     }
-    response = requests.get(url, params=params)
+    response = requests.get(url, params=params, timeout=tools.http_timeout)
     data = response.json()
     try:
         return data['current_weather']
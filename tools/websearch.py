@@ -1,42 +1,44 @@
 from ddgs import DDGS
 from ddgs.exceptions import RatelimitException, TimeoutException
+from config import get_config
 
 
 
 
 def web_search(
     topic, 
-    region="wt-wt",
-    safesearch="moderate",
+    region=None,
+    safesearch=None,
     timelimit=None,
     backend="auto",
-    max_results=5
+    max_results=None
 ):
     """DuckDuckGo text search generator. Query params: https://duckduckgo.com/params.
 
     Args:
         keywords: keywords for query.
-        region: us-en, uk-en, ru-ru, etc. Defaults to None.
-        safesearch: on, moderate, off. Defaults to "moderate".
+        region: us-en, uk-en, ru-ru, etc. Defaults to [tools] search_region.
+        safesearch: on, moderate, off. Defaults to [tools] safesearch.
         timelimit: d, w, m, y. Defaults to None.
         backend: auto, html, lite. Defaults to auto.
             auto - try all backends in random order,
             html - collect data from https://html.duckduckgo.com,
             lite - collect data from https://lite.duckduckgo.com,
             bing - collect data from https://www.bing.com.
-        max_results: max number of results. If None, returns results only from the first response. Defaults to None.
+        max_results: max number of results. Defaults to [tools] max_results.
 
     Returns:
         List of dictionaries with search results.
     """
+    tools = get_config().tools
     try:
         return DDGS().text(
             query=topic,
-            region=region,
-            safesearch=safesearch,
+            region=region or tools.search_region,
+            safesearch=safesearch or tools.safesearch,
             timelimit=timelimit,
             backend=backend,
-            max_results=max_results
+            max_results=max_results or tools.max_results
         )
     except RatelimitException:
         return ["Rate limit hit"]
@@ -47,22 +49,22 @@ def web_search(
     
 def image_search(
     topic, 
-    region="wt-wt",
-    safesearch="moderate",
+    region=None,
+    safesearch=None,
     timelimit=None,
     size=None,
     color=None,
     type_image=None,
     layout=None,
     license_image = None,
-    max_results=5
+    max_results=None
 ):
     """DuckDuckGo images search. Query params: https://duckduckgo.com/params.
 
     Args:
         keywords: keywords for query.
-        region: us-en, uk-en, ru-ru, etc. Defaults to "us-en".
-        safesearch: on, moderate, off. Defaults to "moderate".
+        region: us-en, uk-en, ru-ru, etc. Defaults to [tools] search_region.
+        safesearch: on, moderate, off. Defaults to [tools] safesearch.
         timelimit: Day, Week, Month, Year. Defaults to None.
         size: Small, Medium, Large, Wallpaper. Defaults to None.
         color: color, Monochrome, Red, Orange, Yellow, Green, Blue,
@@ -74,23 +76,24 @@ def image_search(
             Share (Free to Share and Use), ShareCommercially (Free to Share and Use Commercially),
             Modify (Free to Modify, Share, and Use), ModifyCommercially (Free to Modify, Share, and
             Use Commercially). Defaults to None.
-        max_results: max number of results. If None, returns results only from the first response. Defaults to None.
+        max_results: max number of results. Defaults to [tools] max_results.
 
     Returns:
         List of dictionaries with images search results.
     """
+    tools = get_config().tools
     try:
         return DDGS().images(
             query=topic,
-            region=region,
-            safesearch=safesearch,
+            region=region or tools.search_region,
+            safesearch=safesearch or tools.safesearch,
             timelimit=timelimit,
             size=size,
             color = color,
             type_image=type_image,
             layout=layout,
             license_image=license_image,
-            max_results=max_results
+            max_results=max_results or tools.max_results
         )
     except RatelimitException:
         return ["Rate limit hit"]
@@ -101,39 +104,40 @@ def image_search(
 
 def video_search(
     topic, 
-    region="wt-wt",
-    safesearch="moderate",
+    region=None,
+    safesearch=None,
     timelimit=None,
     resolution=None,
     duration=None,
     license_videos=None,
-    max_results=5    
+    max_results=None
 ):
     """DuckDuckGo videos search. Query params: https://duckduckgo.com/params.
 
     Args:
         keywords: keywords for query.
-        region: us-en, uk-en, ru-ru, etc. Defaults to "us-en".
-        safesearch: on, moderate, off. Defaults to "moderate".
+        region: us-en, uk-en, ru-ru, etc. Defaults to [tools] search_region.
+        safesearch: on, moderate, off. Defaults to [tools] safesearch.
         timelimit: d, w, m. Defaults to None.
         resolution: high, standart. Defaults to None.
         duration: short, medium, long. Defaults to None.
         license_videos: creativeCommon, youtube. Defaults to None.
-        max_results: max number of results. If None, returns results only from the first response. Defaults to None.
+        max_results: max number of results. Defaults to [tools] max_results.
 
     Returns:
         List of dictionaries with videos search results.
     """
+    tools = get_config().tools
     try:
         return DDGS().videos(
             query=topic, 
-            region=region,
-            safesearch=safesearch,
+            region=region or tools.search_region,
+            safesearch=safesearch or tools.safesearch,
             timelimit=timelimit,
             resolution=resolution,
             duration=duration,
             license_videos=license_videos,
-            max_results=max_results  
+            max_results=max_results or tools.max_results
         )
     except RatelimitException:
         return ["Rate limit hit"]
@@ -148,7 +152,7 @@ def news_search(
     region = "us-en",
     safesearch = "off",
     timelimit = None,
-    max_results = 5,
+    max_results = None,
 ):
     """DuckDuckGo news search. Query params: https://duckduckgo.com/params.
 
@@ -157,7 +161,7 @@ def news_search(
         region: us-en, uk-en, ru-ru, etc. Defaults to "us-en".
         safesearch: on, moderate, off. Defaults to "moderate".
         timelimit: d, w, m. Defaults to None.
-        max_results: max number of results. If None, returns results only from the first response. Defaults to None.
+        max_results: max number of results. Defaults to [tools] max_results.
 
     Returns:
         List of dictionaries with news search results.
@@ -168,7 +172,7 @@ def news_search(
         region = region,
         safesearch = safesearch,
         timelimit = timelimit,
-        max_results = max_results,    
+        max_results = max_results or get_config().tools.max_results,
         ) 
     except RatelimitException:
         return ["Rate limit hit"]
@@ -0,0 +1,103 @@
+import threading
+import time
+from contextlib import contextmanager
+import db_writer
+from db import save_spans
+from config import get_config
+
+## Tracing: timings of the stages of a turn (stt, llm, tool, db, render, tts, turn) collected in memory and written
+## to the spans table once per turn, so tracing adds no db write to the hot path. /stats shows p50/p95 per stage.
+
+## The turn spans are attributed to, set by begin_turn(). Tars runs one conversation at a time,
+## tools running on pool threads belong to the same turn.
+_current = {"session_id": None, "conversation_id": None, "started_at": None, "start": None}
+_pending = []
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return get_config().tracing.enabled
+
+
+def begin_turn(session_id, conversation_id=None):
+    """
+    Starts the turn span. Spans recorded from now on, and those recorded since the last turn ended
+    (the speech capture of this turn), belong to this session and user message.
+    conversation_id may be the Future returned by db_writer.submit, it is resolved when the spans are written.
+    """
+    _current.update(session_id=session_id, conversation_id=conversation_id, started_at=time.time(), start=time.perf_counter())
+    with _lock:
+        _pending[:] = [
+            (session or session_id, conversation or conversation_id, values) if conversation is None else (session, conversation, values)
+            for session, conversation, values in _pending
+        ]
+
+
+def end_turn():
+    """
+    Records the turn span (from begin_turn() to now) and queues the spans of the turn for writing.
+    """
+    if _current["start"] is not None and enabled():
+        record("turn", None, _current["started_at"], (time.perf_counter() - _current["start"]) * 1000)
+    _current.update(conversation_id=None, started_at=None, start=None)
+    flush_spans()
+
+
+def record(stage: str, name: str, started_at: float, duration_ms: float, ok: bool = True, session_id=None, conversation_id=None):
+    """
+    Adds a finished span. session_id / conversation_id default to the current turn.
+    """
+    if session_id is None:
+        session_id = _current["session_id"]
+        conversation_id = conversation_id if conversation_id is not None else _current["conversation_id"]
+    with _lock:
+        _pending.append((session_id, conversation_id, (stage, name, started_at, duration_ms, int(ok))))
+
+
+@contextmanager
+def span(stage: str, name: str = None, session_id=None, conversation_id=None):
+    """
+    Times the block as one span of stage. A block that raises is recorded with ok = 0.
+    Usage:
+        with span("tool", "get_weather"):
+            get_weather("Tokyo")
+    """
+    if not enabled():
+        yield
+        return
+    started_at = time.time()
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        record(stage, name, started_at, (time.perf_counter() - start) * 1000, ok, session_id, conversation_id)
+
+
+def traced(stage: str, func, name: str = None):
+    """
+    func wrapped so that every call is a span.
+    """
+    def wrapper(*args, **kwargs):
+        with span(stage, name or func.__name__):
+            return func(*args, **kwargs)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def flush_spans():
+    """
+    Queues the recorded spans for writing, one save_spans call per turn they belong to.
+    """
+    with _lock:
+        pending = list(_pending)
+        _pending.clear()
+    groups = {}
+    for session_id, conversation_id, values in pending:
+        groups.setdefault((session_id, conversation_id), []).append(values)
+    for (session_id, conversation_id), spans in groups.items():
+        db_writer.submit(save_spans, spans, session_id, conversation_id)